@@ -0,0 +1,198 @@
+"""Submit archived interview transcripts to the designer_agent graph in parallel.
+
+Usage:
+    python scripts/backfill_designs.py data/transcriptions --concurrency 8 --rate 2
+
+Transcripts already designed are tracked by content hash in a manifest
+(JSONL, one line per finished transcript), so re-running after a crash or
+with new files only submits what is missing. Use --force to regenerate
+everything, e.g. after a prompt change.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import glob
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from designer_client import DesignerClient, DesignRequest
+from metrics import Histogram
+
+logger = logging.getLogger("backfill-designs")
+
+
+@dataclass
+class TranscriptFile:
+    path: str
+    content_hash: str
+    request: DesignRequest
+
+
+def load_transcript(path: str) -> TranscriptFile:
+    with open(path, "rb") as f:
+        raw = f.read()
+    saved = json.loads(raw)
+    request = DesignRequest(
+        company_name=saved.get("companyName", ""),
+        owner_name=saved.get("ownerName", ""),
+        transcript=saved.get("transcript", ""),
+    )
+    # Hash what the designer sees, so re-saved copies of the same interview match
+    content_hash = hashlib.sha256(
+        json.dumps(
+            [request.company_name, request.owner_name, request.transcript],
+            ensure_ascii=False,
+        ).encode("utf-8")
+    ).hexdigest()
+    return TranscriptFile(path=path, content_hash=content_hash, request=request)
+
+
+class Manifest:
+    """Append-only record of finished transcripts, keyed by content hash."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done: Dict[str, dict] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A crash can leave a partial last line behind
+                        continue
+                    self.done[entry["hash"]] = entry
+        self._file = open(path, "a", encoding="utf-8")
+
+    def __contains__(self, content_hash: str) -> bool:
+        return content_hash in self.done
+
+    def record(self, transcript: TranscriptFile, thread_id: str, seconds: float) -> None:
+        entry = {
+            "hash": transcript.content_hash,
+            "path": transcript.path,
+            "thread_id": thread_id,
+            "seconds": round(seconds, 3),
+            "finished_at": time.time(),
+        }
+        self.done[transcript.content_hash] = entry
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class RateLimiter:
+    """Spaces out submissions to at most `rate` per second."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            if self._next > now:
+                await asyncio.sleep(self._next - now)
+            self._next = max(now, self._next) + self.interval
+
+
+async def backfill(
+    directory: str,
+    manifest_path: str,
+    concurrency: int,
+    rate: float,
+    force: bool = False,
+    url: Optional[str] = None,
+) -> int:
+    transcripts: List[TranscriptFile] = []
+    seen = set()
+    manifest = Manifest(manifest_path)
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        try:
+            transcript = load_transcript(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"skipping {path}: {e}")
+            continue
+        if transcript.content_hash in seen:
+            continue
+        seen.add(transcript.content_hash)
+        if not force and transcript.content_hash in manifest:
+            continue
+        transcripts.append(transcript)
+
+    logger.info(
+        f"{len(transcripts)} transcripts to design, {len(seen) - len(transcripts)} already done"
+    )
+
+    # Limit inside the concurrency slot, or designs queued on it go out in bursts
+    limiter = RateLimiter(rate)
+    client = DesignerClient(url=url, max_concurrency=concurrency, throttle=limiter.wait)
+    latency = Histogram(buckets_ms=(1000, 5000, 10000, 30000, 60000, 120000, 300000, 600000))
+    failures = 0
+
+    async def run(transcript: TranscriptFile) -> None:
+        nonlocal failures
+        started = time.perf_counter()
+        try:
+            result = await client.design(transcript.request)
+        except Exception as e:
+            failures += 1
+            logger.error(f"{transcript.path} failed: {e}")
+            return
+        seconds = time.perf_counter() - started
+        latency.observe(seconds * 1000)
+        manifest.record(transcript, result.thread_id, seconds)
+        logger.info(f"{transcript.path} -> thread {result.thread_id} in {seconds:.1f}s")
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(run(transcript) for transcript in transcripts))
+    finally:
+        manifest.close()
+    elapsed = time.perf_counter() - started
+
+    done = latency.count
+    summary = latency.summary()
+    print(f"designed {done} transcripts, {failures} failed, in {elapsed:.1f}s")
+    if done:
+        print(
+            f"throughput: {done / elapsed * 60:.1f} designs/min, "
+            f"latency mean {summary['mean_ms'] / 1000:.1f}s, "
+            f"p50 <= {summary['p50_ms'] / 1000:.0f}s, p99 <= {summary['p99_ms'] / 1000:.0f}s"
+        )
+    return 1 if failures else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("directory", nargs="?", default="data/transcriptions")
+    parser.add_argument("--manifest", default=None, help="defaults to <directory>/.designs.jsonl")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=1.0, help="max submissions per second, 0 to disable")
+    parser.add_argument("--force", action="store_true", help="design transcripts already in the manifest")
+    parser.add_argument("--url", default=None, help="LangGraph URL, defaults to LANGGRAPH_URL")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    manifest = args.manifest or os.path.join(args.directory, ".designs.jsonl")
+    return asyncio.run(
+        backfill(args.directory, manifest, args.concurrency, args.rate, args.force, args.url)
+    )
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
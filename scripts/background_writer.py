@@ -0,0 +1,311 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import asdict, dataclass
+from typing import IO, Any, Callable, Dict, List, Literal, Optional, Tuple
+
+logger = logging.getLogger("background-writer")
+
+FsyncPolicy = Literal["never", "batch", "always"]
+
+_STOP = object()
+
+
+@dataclass
+class WriterStats:
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    batches: int = 0
+    fsyncs: int = 0
+    queue_depth: int = 0
+    max_queue_depth: int = 0
+    # Submissions from other threads that found the queue full and had to wait for space
+    blocked_submits: int = 0
+    blocked_seconds: float = 0.0
+    # Submissions from the event loop that found the queue full and were held in the overflow
+    overflowed_submits: int = 0
+    overflow_depth: int = 0
+    max_overflow_depth: int = 0
+    # Time from submission until the operation finished on the writer thread
+    last_latency_ms: float = 0.0
+    max_latency_ms: float = 0.0
+
+    def to_dict(self):
+        return asdict(self)
+
+
+class BackgroundWriter:
+    """Shared off-loop file writer for agent-side persistence.
+
+    Operations are queued on a bounded queue and executed in order by a
+    single daemon thread. The thread drains up to `max_batch` operations at a
+    time and flushes the files it touched once per batch. `fsync_policy`
+    controls durability: "never" only flushes, "batch" fsyncs each touched
+    file once per batch and "always" fsyncs after every write.
+
+    Work is never dropped. When the queue is full, a submission from a
+    thread running an event loop goes to an unbounded overflow list instead
+    of waiting, so a disk stall can't stall the loop; other threads wait for
+    space.
+    """
+
+    def __init__(
+        self,
+        max_queue: int = 10000,
+        max_batch: int = 256,
+        fsync_policy: FsyncPolicy = "batch",
+    ):
+        self.max_batch = max_batch
+        self.fsync_policy = fsync_policy
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        # Everything in the overflow was submitted after everything in the queue
+        self._overflow: deque = deque()
+        self._overflow_lock = threading.Lock()
+        self._files: Dict[str, IO[str]] = {}
+        self._stats = WriterStats()
+        self._stats_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    # Public API, safe to call from the event loop
+
+    def append(self, path: str, data: str) -> Future:
+        """Append `data` to `path`, keeping the file open until `close`."""
+        return self.submit(self._append, path, data)
+
+    def close(self, path: str) -> Future:
+        """Flush and close a file previously written with `append`."""
+        return self.submit(self._close, path)
+
+    def write(self, path: str, data: str) -> Future:
+        """Atomically replace the contents of `path`."""
+        return self.submit(self._write, path, data)
+
+    def rename(self, src: str, dst: str) -> Future:
+        return self.submit(os.replace, src, dst)
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        """Queue `fn(*args)` on the writer thread and return its future.
+
+        Never drops work and never blocks an event loop: if the queue is full,
+        a call from the loop is held in the overflow and a call from another
+        thread waits for space. Both are recorded in the backpressure stats.
+        """
+        self._ensure_started()
+        future: Future = Future()
+        item = (fn, args, future, time.perf_counter())
+        if not self._enqueue(item):
+            blocked_at = time.perf_counter()
+            self._queue.put(item)
+            with self._stats_lock:
+                self._stats.blocked_submits += 1
+                self._stats.blocked_seconds += time.perf_counter() - blocked_at
+        with self._stats_lock:
+            self._stats.submitted += 1
+            depth = self._queue.qsize()
+            self._stats.queue_depth = depth
+            self._stats.max_queue_depth = max(self._stats.max_queue_depth, depth)
+        return future
+
+    def _enqueue(self, item: Tuple) -> bool:
+        """Queue `item` without blocking; False if the caller has to wait for space."""
+        with self._overflow_lock:
+            if not self._overflow:
+                try:
+                    self._queue.put_nowait(item)
+                    return True
+                except queue.Full:
+                    pass
+            if not self._overflow and not _on_event_loop():
+                return False
+            # Once anything overflows, later items follow it to keep the order
+            self._overflow.append(item)
+            depth = len(self._overflow)
+        with self._stats_lock:
+            self._stats.overflowed_submits += 1
+            self._stats.overflow_depth = depth
+            self._stats.max_overflow_depth = max(self._stats.max_overflow_depth, depth)
+        return True
+
+    def _take_overflow(self) -> List[Tuple]:
+        """Overflowed items, oldest first, once the queue ahead of them is empty."""
+        with self._overflow_lock:
+            if not self._overflow or not self._queue.empty():
+                return []
+            count = min(self.max_batch, len(self._overflow))
+            items = [self._overflow.popleft() for _ in range(count)]
+            depth = len(self._overflow)
+        with self._stats_lock:
+            self._stats.overflow_depth = depth
+        return items
+
+    async def submit_async(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Like `submit`, but waits for queue space without blocking the loop."""
+        if self._queue.full():
+            loop = asyncio.get_running_loop()
+            return await asyncio.wrap_future(
+                await loop.run_in_executor(None, self.submit, fn, *args)
+            )
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    async def drain(self) -> None:
+        """Wait until every operation queued so far has completed."""
+        await asyncio.wrap_future(self.submit(lambda: None))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            self._stats.queue_depth = self._queue.qsize()
+            self._stats.overflow_depth = len(self._overflow)
+            return self._stats.to_dict()
+
+    def shutdown(self, timeout: Optional[float] = None) -> None:
+        """Finish queued work, close every open file and stop the thread."""
+        if self._thread is None:
+            return
+        item = (_STOP, (), None, time.perf_counter())
+        if not self._enqueue(item):
+            self._queue.put(item)
+        self._thread.join(timeout)
+        self._thread = None
+
+    # Writer thread
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="background-writer", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            batch: List[Tuple] = self._take_overflow() or [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            touched: set = set()
+            done: List[Tuple[Future, float, Any, Optional[Exception]]] = []
+            stop = False
+            for fn, args, future, submitted_at in batch:
+                if fn is _STOP:
+                    stop = True
+                    continue
+                try:
+                    result = fn(*args)
+                    if fn == self._append:
+                        touched.add(args[0])
+                    done.append((future, submitted_at, result, None))
+                except Exception as e:
+                    logger.error(f"Background write failed: {e}")
+                    done.append((future, submitted_at, None, e))
+
+            # Futures resolve only once the batch has been flushed
+            self._flush(touched)
+            with self._stats_lock:
+                self._stats.batches += 1
+            for future, submitted_at, result, error in done:
+                self._record(submitted_at, failed=error is not None)
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+
+            if stop:
+                for path in list(self._files):
+                    self._close(path)
+                return
+
+    def _record(self, submitted_at: float, failed: bool) -> None:
+        latency_ms = (time.perf_counter() - submitted_at) * 1000
+        with self._stats_lock:
+            if failed:
+                self._stats.failed += 1
+            else:
+                self._stats.completed += 1
+            self._stats.last_latency_ms = latency_ms
+            self._stats.max_latency_ms = max(self._stats.max_latency_ms, latency_ms)
+
+    def _fsync(self, f: IO[str]) -> None:
+        os.fsync(f.fileno())
+        with self._stats_lock:
+            self._stats.fsyncs += 1
+
+    def _flush(self, paths: set) -> None:
+        for path in paths:
+            f = self._files.get(path)
+            if f is None:
+                continue
+            try:
+                f.flush()
+                if self.fsync_policy == "batch":
+                    self._fsync(f)
+            except Exception as e:
+                logger.error(f"Error flushing {path}: {e}")
+
+    def _append(self, path: str, data: str) -> None:
+        f = self._files.get(path)
+        if f is None:
+            f = open(path, "a", encoding="utf-8")
+            self._files[path] = f
+        f.write(data)
+        if self.fsync_policy == "always":
+            f.flush()
+            self._fsync(f)
+
+    def _close(self, path: str) -> None:
+        f = self._files.pop(path, None)
+        if f is None:
+            return
+        f.flush()
+        if self.fsync_policy != "never":
+            self._fsync(f)
+        f.close()
+
+    def _write(self, path: str, data: str) -> None:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+            f.flush()
+            if self.fsync_policy != "never":
+                self._fsync(f)
+        os.replace(tmp_path, path)
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+_writer: Optional[BackgroundWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> BackgroundWriter:
+    """Process-wide writer shared by every room the worker hosts."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = BackgroundWriter(
+                    max_queue=int(os.environ.get("AGENT_WRITER_MAX_QUEUE", 10000)),
+                    max_batch=int(os.environ.get("AGENT_WRITER_MAX_BATCH", 256)),
+                    fsync_policy=os.environ.get("AGENT_WRITER_FSYNC", "batch"),
+                )
+    return _writer
@@ -0,0 +1,325 @@
+"""Offline benchmark for the agent event handlers, no LiveKit server or OpenAI key needed.
+
+Usage:
+    python scripts/bench_agent.py build-trace data/transcriptions data/traces.jsonl
+    python scripts/bench_agent.py run data/traces.jsonl --rooms 50 --speed 0
+    python scripts/bench_agent.py run data/traces.jsonl --agent erp --rooms 20 --speed 10 --memory
+
+`build-trace` turns saved transcripts into event streams: speech start and
+stop, transcription completed, response created and done, agent speech, and
+a config update RPC. `run` replays them against the real handlers of
+main.py or erp_agent.py, wired to the stand-ins in replay_fakes, in many rooms
+at once. `--speed` is a multiple of real time; 0 replays as fast as
+possible. It reports handler CPU time per event, event-loop lag, transcription
+publish throughput and, with `--memory`, traced memory per room (tracemalloc
+slows everything down, so compare CPU numbers from runs without it).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime
+import glob
+import json
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+from contextlib import ExitStack
+from types import SimpleNamespace
+from typing import Any, Dict, List
+from unittest import mock
+
+from metrics import Histogram
+from replay_fakes import (
+    FakeAssistant,
+    FakeJobContext,
+    FakePrewarmedAgent,
+    FakeRealtimeModel,
+    FakeRemoteParticipant,
+    FakeRoom,
+    ReplayStats,
+)
+from transcript_compaction import parse_transcript_text
+
+# Rough speaking rate, used to derive speech durations from the text
+CHARS_PER_SECOND = 15.0
+LAG_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500)
+
+
+def build_trace(transcript: str, incomplete_every: int = 2) -> List[Dict[str, Any]]:
+    """Event stream for one saved transcript, with offsets in seconds from its start."""
+    utterances = parse_transcript_text(transcript)
+    if not utterances:
+        return []
+
+    def offset(timestamp: str) -> float:
+        return datetime.datetime.fromisoformat(timestamp.replace("Z", "+00:00")).timestamp()
+
+    start = offset(utterances[0].timestamp)
+    events: List[Dict[str, Any]] = []
+    responses = 0
+    for utterance in utterances:
+        at = offset(utterance.timestamp) - start
+        spoken = max(len(utterance.text) / CHARS_PER_SECOND, 0.5)
+        if utterance.speaker == "User":
+            events += [
+                {"t": max(at - spoken, 0.0), "source": "session", "event": "input_speech_started"},
+                {"t": at, "source": "session", "event": "input_speech_stopped"},
+                {"t": at + 0.3, "source": "session", "event": "input_speech_transcription_completed", "text": utterance.text},
+                {"t": at + 0.3, "source": "assistant", "event": "user_speech_committed", "text": utterance.text},
+            ]
+        else:
+            responses += 1
+            status = "incomplete" if incomplete_every and responses % incomplete_every == 0 else "completed"
+            events += [
+                {"t": at, "source": "session", "event": "response_created"},
+                {"t": at + 0.3, "source": "assistant", "event": "agent_started_speaking"},
+                {"t": at + 0.3 + spoken, "source": "session", "event": "response_done", "text": utterance.text, "status": status},
+                {"t": at + 0.3 + spoken, "source": "assistant", "event": "agent_speech_committed", "text": utterance.text},
+            ]
+
+    # One mid-session config change from the frontend
+    middle = events[len(events) // 2]["t"]
+    events.append({"t": middle, "source": "rpc", "event": "pg.updateConfig", "payload": {"temperature": 0.7}})
+    events.sort(key=lambda event: event["t"])
+    return events
+
+
+def build_traces(directory: str, output: str, incomplete_every: int = 2) -> int:
+    count = 0
+    with open(output, "w", encoding="utf-8") as f:
+        for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+            with open(path, encoding="utf-8") as saved_file:
+                saved = json.load(saved_file)
+            events = build_trace(saved.get("transcript", ""), incomplete_every)
+            if events:
+                f.write(json.dumps({"name": os.path.basename(path), "events": events}, ensure_ascii=False) + "\n")
+                count += 1
+    return count
+
+
+def load_traces(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _payload(event: Dict[str, Any]) -> Any:
+    name = event["event"]
+    text = event.get("text", "")
+    if name == "input_speech_transcription_completed":
+        return SimpleNamespace(item_id="item", transcript=text, text=text)
+    if name == "response_done":
+        status = event.get("status", "completed")
+        details = {"reason": "max_output_tokens"} if status == "incomplete" else None
+        return SimpleNamespace(id="resp", status=status, status_details=details, output=[], transcript=text)
+    if name in ("user_speech_committed", "agent_speech_committed"):
+        return SimpleNamespace(role="user" if name == "user_speech_committed" else "assistant", content=text)
+    return None
+
+
+class AgentUnderTest:
+    """Starts rooms on the real handlers of main.py or erp_agent.py.
+
+    main.py gets the fake model and agent through its `prewarmed` argument.
+    """
+
+    def __init__(self, agent: str, stats: ReplayStats, workdir: str):
+        self.agent = agent
+        self.stats = stats
+        self.workdir = workdir
+        self.metadata = json.dumps({"openai_api_key": "bench"})
+        if agent == "erp":
+            import erp_agent
+
+            self.module = erp_agent
+        else:
+            import main
+
+            self.module = main
+
+    def start(self, ctx: FakeJobContext, participant: FakeRemoteParticipant):
+        """Returns the realtime session and assistant the handlers were attached to."""
+        if self.agent == "erp":
+            from transcript_writer import TranscriptWriter, transcript_filename
+
+            self.module.transcripts.open(
+                ctx.room.name,
+                TranscriptWriter(
+                    os.path.join(self.workdir, transcript_filename(ctx.room.name, "jsonl")),
+                    ctx.room.name,
+                    format="jsonl",
+                ),
+            )
+            # erp_agent builds its own model and agent, so hand it the fakes instead
+            models: List[FakeRealtimeModel] = []
+            assistants: List[FakeAssistant] = []
+
+            def make_model(*args: Any, **kwargs: Any) -> FakeRealtimeModel:
+                models.append(FakeRealtimeModel(self.stats))
+                return models[-1]
+
+            def make_assistant(*args: Any, **kwargs: Any) -> FakeAssistant:
+                assistants.append(FakeAssistant(self.stats))
+                return assistants[-1]
+
+            from livekit.agents import multimodal
+            from livekit.plugins import openai
+
+            with mock.patch.object(openai.realtime, "RealtimeModel", make_model), mock.patch.object(
+                multimodal, "MultimodalAgent", make_assistant
+            ):
+                self.module.run_multimodal_agent(ctx, participant)
+            return models[0].sessions[0], assistants[0]
+
+        self.module.transcripts.open(ctx.room.name)
+        fnc_ctx = self.module.ERPDesignerFunctions(ctx)
+        fnc_ctx.set_participant(participant)
+        prewarmed = FakePrewarmedAgent(self.stats)
+        self.module.run_multimodal_agent(ctx, participant, fnc_ctx, prewarmed)
+
+        async def release_transcript():
+            from transcript_index import index_finished_session
+
+            index_finished_session(ctx.room.name, self.module.transcripts.release(ctx.room.name))
+
+        ctx.add_shutdown_callback(release_transcript)
+        return prewarmed.model.sessions[0], prewarmed.assistant
+
+
+async def replay_room(
+    agent: AgentUnderTest, trace: Dict[str, Any], name: str, speed: float, rpc_latency: float
+) -> None:
+    room = FakeRoom(name, agent.stats, rpc_latency=rpc_latency)
+    participant = FakeRemoteParticipant(f"user-{name}", agent.metadata)
+    room.join(participant)
+    ctx = FakeJobContext(room)
+    session, assistant = agent.start(ctx, participant)
+
+    started = time.perf_counter()
+    for event in trace["events"]:
+        if speed:
+            delay = event["t"] / speed - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        else:
+            # Let the publisher and RPC tasks run between events
+            await asyncio.sleep(0)
+
+        if event["source"] == "rpc":
+            handler = room.local_participant.rpc_methods.get(event["event"])
+            if handler is not None:
+                await handler(
+                    SimpleNamespace(
+                        caller_identity=participant.identity,
+                        payload=json.dumps(event.get("payload", {})),
+                        request_id="bench",
+                    )
+                )
+            continue
+        emitter = session if event["source"] == "session" else assistant
+        payload = _payload(event)
+        if payload is None:
+            emitter.emit(event["event"])
+        else:
+            emitter.emit(event["event"], payload)
+
+    # Let queued notifications go out before the room shuts down and cancels them
+    await asyncio.sleep(rpc_latency * 2)
+    await ctx.shutdown()
+
+
+async def probe_loop_lag(histogram: Histogram, interval: float = 0.01) -> None:
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        histogram.observe(max(time.perf_counter() - started - interval, 0.0) * 1000)
+
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    traces = load_traces(args.trace)
+    stats = ReplayStats()
+    lag = Histogram(LAG_BUCKETS_MS)
+
+    with tempfile.TemporaryDirectory() as workdir, ExitStack() as stack:
+        # Keep the session index and transcript files out of the working tree
+        stack.enter_context(
+            mock.patch.dict(os.environ, {"TRANSCRIPT_INDEX_DB": os.path.join(workdir, "index.sqlite3")})
+        )
+        agent = AgentUnderTest(args.agent, stats, workdir)
+        if args.memory:
+            tracemalloc.start()
+        probe = asyncio.create_task(probe_loop_lag(lag))
+        cpu_started = time.process_time()
+        started = time.perf_counter()
+
+        await asyncio.gather(
+            *(
+                replay_room(agent, traces[index % len(traces)], f"bench-{index}", args.speed, args.rpc_latency)
+                for index in range(args.rooms)
+            )
+        )
+
+        elapsed = time.perf_counter() - started
+        cpu = time.process_time() - cpu_started
+        probe.cancel()
+        peak = 0
+        if args.memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        from background_writer import get_writer
+
+        await get_writer().drain()
+
+    return {
+        "agent": args.agent,
+        "rooms": args.rooms,
+        "speed": args.speed,
+        "wall_seconds": round(elapsed, 3),
+        "cpu_seconds": round(cpu, 3),
+        "events": stats.events,
+        "events_per_second": round(stats.events / elapsed, 1) if elapsed else 0.0,
+        "publishes": stats.publishes,
+        "segments": stats.segments,
+        "publishes_per_second": round(stats.publishes / elapsed, 1) if elapsed else 0.0,
+        "rpcs": stats.rpcs,
+        "loop_lag_ms": lag.summary(),
+        "handler_cpu_ms": stats.handler_cpu.summary(),
+        "peak_traced_kb_per_room": round(peak / 1024 / args.rooms, 1) if args.memory else None,
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build-trace", help="build event traces from saved transcripts")
+    build.add_argument("directory", nargs="?", default="data/transcriptions")
+    build.add_argument("output", nargs="?", default="data/traces.jsonl")
+    build.add_argument(
+        "--incomplete-every", type=int, default=2, help="mark every Nth response incomplete, which sends a toast RPC"
+    )
+
+    run = commands.add_parser("run", help="replay traces against the agent handlers")
+    run.add_argument("trace", nargs="?", default="data/traces.jsonl")
+    run.add_argument("--agent", choices=("main", "erp"), default="main")
+    run.add_argument("--rooms", type=int, default=10)
+    run.add_argument("--speed", type=float, default=0.0, help="multiple of real time, 0 for as fast as possible")
+    run.add_argument("--rpc-latency", type=float, default=0.02, help="seconds per fake RPC round trip")
+    run.add_argument("--memory", action="store_true", help="trace memory allocations (slow)")
+    args = parser.parse_args()
+
+    if args.command == "build-trace":
+        count = build_traces(args.directory, args.output, args.incomplete_every)
+        print(f"wrote {count} traces to {args.output}")
+        return 0
+
+    print(json.dumps(asyncio.run(run_benchmark(args)), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
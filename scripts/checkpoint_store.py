@@ -0,0 +1,328 @@
+"""Local archive of designer thread checkpoints with content-addressed dedup.
+
+Usage:
+    python scripts/checkpoint_store.py import exports/ --zstd
+    python scripts/checkpoint_store.py get 1f01e3b6-1d0c-6f4c-8002-0d4a1b2f7f1c
+    python scripts/checkpoint_store.py history 3b5b4f5e-...
+    python scripts/checkpoint_store.py stats
+
+Every checkpoint of a thread repeats the system prompt, the earlier messages
+and the whole erp_design. States are split bottom-up: any value that
+serializes to CHUNK_MIN_BYTES or more (each message, each table, the design
+itself) is stored once in a blob named by its hash, and its parent keeps a
+reference instead. Checkpoints sharing a prompt or unchanged tables share
+those blobs, and reassembly fetches a checkpoint's blobs level by level in
+a few queries. Blobs can be compressed with zstd when the zstandard package
+is installed.
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger("checkpoint-store")
+
+# Values smaller than this stay inline in their parent
+CHUNK_MIN_BYTES = 256
+# Only blobs at least this large are worth compressing
+COMPRESS_MIN_BYTES = 512
+REF_KEY = "\x00blob"
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def blob_hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _is_ref(value: Any) -> bool:
+    return isinstance(value, dict) and len(value) == 1 and REF_KEY in value
+
+
+def checkpoint_ids(state: Dict[str, Any]) -> Tuple[str, str, Optional[str]]:
+    """(checkpoint_id, thread_id, parent_checkpoint_id) of a thread state export."""
+    checkpoint = state.get("checkpoint") or {}
+    checkpoint_id = state.get("checkpoint_id") or checkpoint.get("checkpoint_id")
+    if not checkpoint_id:
+        raise ValueError("state has no checkpoint_id")
+    thread_id = checkpoint.get("thread_id") or (state.get("metadata") or {}).get("thread_id") or ""
+    parent_id = state.get("parent_checkpoint_id") or (state.get("parent_checkpoint") or {}).get("checkpoint_id")
+    return checkpoint_id, thread_id, parent_id
+
+
+class CheckpointStore:
+    """SQLite file of blobs and the checkpoints whose root blob they hang from."""
+
+    def __init__(self, path: str, compress: bool = False, cache_entries: int = 4096):
+        self.path = path
+        self.compress = compress
+        self.cache_entries = cache_entries
+        self._conn: Optional[sqlite3.Connection] = None
+        self._compressor = None
+        self._decompressor = None
+        # Decoded blob text by hash, so a thread's shared prompt is decompressed once
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS blobs (
+                    hash TEXT PRIMARY KEY,
+                    codec TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    data BLOB NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    checkpoint_id TEXT PRIMARY KEY,
+                    thread_id TEXT NOT NULL,
+                    parent_id TEXT,
+                    created_at TEXT NOT NULL,
+                    root TEXT NOT NULL,
+                    size INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS checkpoints_thread ON checkpoints (thread_id, created_at);
+                """
+            )
+        return self._conn
+
+    def _zstd(self):
+        if self._compressor is None:
+            try:
+                import zstandard
+            except ImportError:
+                raise RuntimeError("zstd compression needs the zstandard package (pip install zstandard)")
+            self._compressor = zstandard.ZstdCompressor(level=10)
+            self._decompressor = zstandard.ZstdDecompressor()
+        return self._compressor, self._decompressor
+
+    def put(self, state: Dict[str, Any]) -> str:
+        """Archive a thread state export and return its checkpoint id.
+
+        Storing a checkpoint that is already archived replaces its record;
+        blobs are never rewritten.
+        """
+        checkpoint_id, thread_id, parent_id = checkpoint_ids(state)
+        blobs: Dict[str, bytes] = {}
+        root = self._chunk(state, blobs, force=True)[REF_KEY]
+
+        existing = set()
+        hashes = list(blobs)
+        for start in range(0, len(hashes), 500):
+            batch = hashes[start:start + 500]
+            existing.update(
+                row[0]
+                for row in self.conn.execute(
+                    f"SELECT hash FROM blobs WHERE hash IN ({','.join('?' * len(batch))})", batch
+                )
+            )
+
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO blobs VALUES (?, ?, ?, ?)",
+                (self._encode(digest, data) for digest, data in blobs.items() if digest not in existing),
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    checkpoint_id,
+                    thread_id,
+                    parent_id,
+                    state.get("created_at") or "",
+                    root,
+                    len(_dumps(state).encode("utf-8")),
+                ),
+            )
+        return checkpoint_id
+
+    def _chunk(self, value: Any, blobs: Dict[str, bytes], force: bool = False) -> Any:
+        """`value` with large children replaced by refs, itself a ref if large enough."""
+        if isinstance(value, dict):
+            value = {key: self._chunk(child, blobs) for key, child in value.items()}
+        elif isinstance(value, list):
+            value = [self._chunk(child, blobs) for child in value]
+        elif not isinstance(value, str):
+            return value
+
+        data = _dumps(value).encode("utf-8")
+        if not force and len(data) < CHUNK_MIN_BYTES:
+            return value
+        digest = blob_hash(data)
+        blobs[digest] = data
+        return {REF_KEY: digest}
+
+    def _encode(self, digest: str, data: bytes) -> Tuple[str, str, int, bytes]:
+        if self.compress and len(data) >= COMPRESS_MIN_BYTES:
+            compressor, _ = self._zstd()
+            packed = compressor.compress(data)
+            if len(packed) < len(data):
+                return digest, "zstd", len(data), packed
+        return digest, "raw", len(data), data
+
+    def _decode(self, codec: str, data: bytes) -> str:
+        if codec == "zstd":
+            _, decompressor = self._zstd()
+            data = decompressor.decompress(data)
+        return data.decode("utf-8")
+
+    def _load_blobs(self, hashes: Iterable[str]) -> Dict[str, str]:
+        found: Dict[str, str] = {}
+        missing = []
+        for digest in hashes:
+            text = self._cache.get(digest)
+            if text is None:
+                missing.append(digest)
+            else:
+                self._cache.move_to_end(digest)
+                found[digest] = text
+        for start in range(0, len(missing), 500):
+            batch = missing[start:start + 500]
+            for digest, codec, data in self.conn.execute(
+                f"SELECT hash, codec, data FROM blobs WHERE hash IN ({','.join('?' * len(batch))})", batch
+            ):
+                text = found[digest] = self._decode(codec, data)
+                self._cache[digest] = text
+                if len(self._cache) > self.cache_entries:
+                    self._cache.popitem(last=False)
+        return found
+
+    def get(self, checkpoint_id: str) -> Dict[str, Any]:
+        row = self.conn.execute(
+            "SELECT root FROM checkpoints WHERE checkpoint_id = ?", (checkpoint_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(checkpoint_id)
+        return self._assemble(row[0])
+
+    def _assemble(self, root: str) -> Any:
+        # One query per level of nesting rather than one per blob
+        texts: Dict[str, str] = {}
+        pending = {root}
+        while pending:
+            loaded = self._load_blobs(pending)
+            lost = pending - loaded.keys()
+            if lost:
+                raise KeyError(f"missing blobs {sorted(lost)}")
+            texts.update(loaded)
+            pending = set()
+            for text in loaded.values():
+                pending.update(_refs(json.loads(text)))
+            pending -= texts.keys()
+
+        def resolve(value: Any) -> Any:
+            if _is_ref(value):
+                return resolve(json.loads(texts[value[REF_KEY]]))
+            if isinstance(value, dict):
+                return {key: resolve(child) for key, child in value.items()}
+            if isinstance(value, list):
+                return [resolve(child) for child in value]
+            return value
+
+        return resolve({REF_KEY: root})
+
+    def history(self, thread_id: str) -> List[Tuple[str, Optional[str], str]]:
+        """(checkpoint_id, parent_id, created_at) of a thread, oldest first."""
+        return self.conn.execute(
+            "SELECT checkpoint_id, parent_id, created_at FROM checkpoints "
+            "WHERE thread_id = ? ORDER BY created_at, checkpoint_id",
+            (thread_id,),
+        ).fetchall()
+
+    def import_directory(self, directory: str) -> int:
+        """Archive every state in the *.json exports of a directory; a file may hold a list of states."""
+        stored = 0
+        for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+                for state in data if isinstance(data, list) else [data]:
+                    self.put(state)
+                    stored += 1
+            except (OSError, ValueError) as e:
+                logger.warning(f"skipping {path}: {e}")
+        return stored
+
+    def stats(self) -> Dict[str, Any]:
+        checkpoints, logical = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM checkpoints"
+        ).fetchone()
+        blobs, unpacked, stored = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(data)), 0) FROM blobs"
+        ).fetchone()
+        return {
+            "checkpoints": checkpoints,
+            "blobs": blobs,
+            "logical_bytes": logical,
+            "blob_bytes": unpacked,
+            "stored_bytes": stored,
+            "ratio": round(logical / stored, 1) if stored else 0.0,
+        }
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def _refs(value: Any) -> Iterable[str]:
+    if _is_ref(value):
+        yield value[REF_KEY]
+    elif isinstance(value, dict):
+        for child in value.values():
+            yield from _refs(child)
+    elif isinstance(value, list):
+        for child in value:
+            yield from _refs(child)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=os.environ.get("CHECKPOINT_STORE_DB", "checkpoints.sqlite3"))
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    store_cmd = commands.add_parser("import", help="archive thread state exports")
+    store_cmd.add_argument("directory")
+    store_cmd.add_argument("--zstd", action="store_true", help="compress new blobs with zstd")
+
+    get = commands.add_parser("get", help="print a checkpoint's state")
+    get.add_argument("checkpoint_id")
+
+    history = commands.add_parser("history", help="list a thread's checkpoints")
+    history.add_argument("thread_id")
+
+    commands.add_parser("stats", help="print storage totals")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    store = CheckpointStore(args.db, compress=getattr(args, "zstd", False))
+    started = time.perf_counter()
+    if args.command == "import":
+        stored = store.import_directory(args.directory)
+        print(f"stored {stored} checkpoints in {time.perf_counter() - started:.2f}s")
+        print(json.dumps(store.stats()))
+    elif args.command == "get":
+        print(json.dumps(store.get(args.checkpoint_id), ensure_ascii=False, indent=2))
+    elif args.command == "history":
+        for checkpoint_id, parent_id, created_at in store.history(args.thread_id):
+            print(f"{created_at} {checkpoint_id} <- {parent_id or '-'}")
+    else:
+        print(json.dumps(store.stats(), indent=2))
+    store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,486 @@
+"""SQL schemas and migrations for erp_design revisions.
+
+Usage:
+    python scripts/design_ddl.py ddl system_design_example.json --dialect postgres
+    python scripts/design_ddl.py migrate old.json new.json --dialect sqlite
+    python scripts/design_ddl.py check designs/*.json
+
+`ddl` renders CREATE TABLE statements, with primary keys on the leading id
+column and foreign keys as inferred by erp_design. `migrate` turns the ops of
+a design_diff patch into ALTER statements. Foreign keys are compared table
+by table: Postgres drops and adds the changed constraints, and tables are
+dropped only after the keys pointing at them. SQLite can't change a
+column's type, drop key columns or change a table's keys in place, so
+those tables are rebuilt. Rendered
+tables are cached by a hash of everything that goes into them, so after a
+small feedback change only the touched tables are rendered again. `check`
+runs the schema, and the migration from the previous file, against an
+in-memory SQLite database.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Literal, Optional, Set, Tuple
+
+from design_diff import diff_designs
+from erp_design import Column, ERPDesign, ForeignKey, Table, load_design
+
+Dialect = Literal["sqlite", "postgres"]
+
+TYPES: Dict[str, Dict[str, str]] = {
+    "sqlite": {
+        "INT": "INTEGER",
+        "INTEGER": "INTEGER",
+        "BIGINT": "INTEGER",
+        "VARCHAR": "TEXT",
+        "TEXT": "TEXT",
+        "DATE": "DATE",
+        "DATETIME": "DATETIME",
+        "TIMESTAMP": "DATETIME",
+        "DECIMAL": "NUMERIC",
+        "FLOAT": "REAL",
+        "BOOLEAN": "INTEGER",
+    },
+    "postgres": {
+        "INT": "INTEGER",
+        "INTEGER": "INTEGER",
+        "BIGINT": "BIGINT",
+        "VARCHAR": "VARCHAR(255)",
+        "TEXT": "TEXT",
+        "DATE": "DATE",
+        "DATETIME": "TIMESTAMP",
+        "TIMESTAMP": "TIMESTAMP",
+        "DECIMAL": "NUMERIC(12, 2)",
+        "FLOAT": "DOUBLE PRECISION",
+        "BOOLEAN": "BOOLEAN",
+    },
+}
+TYPE_PATTERN = re.compile(r"^([A-Z ]+?)\s*(\(.*\))?$")
+
+
+def quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def column_type(column: Column, dialect: Dialect) -> str:
+    """SQL type for a design column; unknown or missing types become TEXT."""
+    match = TYPE_PATTERN.match(column.type or "")
+    if not match:
+        return "TEXT"
+    base, size = match.groups()
+    mapped = TYPES[dialect].get(base)
+    if mapped is None:
+        return "TEXT"
+    if size and dialect == "postgres" and base in ("VARCHAR", "DECIMAL"):
+        # Keep an explicit size such as VARCHAR(100)
+        return mapped.split("(")[0] + size
+    return mapped
+
+
+class DDLGenerator:
+    """Renders tables for one dialect, caching each by a hash of its inputs."""
+
+    def __init__(self, dialect: Dialect = "sqlite", max_entries: int = 4096):
+        if dialect not in TYPES:
+            raise ValueError(f"unknown dialect {dialect!r}")
+        self.dialect = dialect
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+
+    def create_table(self, table: Table, foreign_keys: List[ForeignKey]) -> str:
+        key = self._key(table, foreign_keys)
+        statement = self._cache.get(key)
+        if statement is not None:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return statement
+
+        self.misses += 1
+        statement = self._render(table, table.name, foreign_keys)
+        self._cache[key] = statement
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return statement
+
+    def _key(self, table: Table, foreign_keys: List[ForeignKey]) -> str:
+        content = [
+            self.dialect,
+            table.name,
+            [column.to_raw() for column in table.columns],
+            [(fk.column, fk.ref_table, fk.ref_column) for fk in foreign_keys],
+        ]
+        return hashlib.blake2b(json.dumps(content).encode("utf-8"), digest_size=16).hexdigest()
+
+    def _render(self, table: Table, name: str, foreign_keys: List[ForeignKey]) -> str:
+        key = table.primary_key
+        lines = []
+        seen = set()
+        for column in table.columns:
+            # The model keeps duplicate column names; the schema can't
+            if column.name in seen:
+                continue
+            seen.add(column.name)
+            line = f"    {quote(column.name)} {column_type(column, self.dialect)}"
+            if column is key:
+                line += " PRIMARY KEY"
+            lines.append(line)
+        # Duplicate columns infer the same key twice
+        for fk in dict.fromkeys(foreign_keys):
+            # Postgres constraints are named so a migration can drop them again
+            prefix = f"CONSTRAINT {quote(constraint_name(fk))} " if self.dialect == "postgres" else ""
+            lines.append(
+                f"    {prefix}FOREIGN KEY ({quote(fk.column)}) REFERENCES {quote(fk.ref_table)} ({quote(fk.ref_column)})"
+            )
+        return f"CREATE TABLE {quote(name)} (\n" + ",\n".join(lines) + "\n);"
+
+    def schema(self, design: ERPDesign) -> List[str]:
+        """CREATE TABLE statements, referenced tables first."""
+        if self.dialect == "sqlite":
+            # SQLite resolves references when rows are written, so every key can be inline
+            return [
+                self.create_table(table, design.references_from(table.name))
+                for table in _creation_order(design)
+            ]
+
+        statements = []
+        deferred: List[ForeignKey] = []
+        created: Set[str] = set()
+        for table in _creation_order(design):
+            inline = []
+            for fk in design.references_from(table.name):
+                if fk.ref_table in created or fk.ref_table == table.name:
+                    inline.append(fk)
+                else:
+                    deferred.append(fk)
+            statements.append(self.create_table(table, inline))
+            created.add(table.name)
+        statements.extend(_add_constraint(fk) for fk in dict.fromkeys(deferred))
+        return statements
+
+    def migration(self, old: ERPDesign, new: ERPDesign) -> List[str]:
+        """Statements that take a database created from `old` to the schema of `new`."""
+        patch = diff_designs(old, new)
+        old_names = {after: before for before, after in patch.renamed_tables.items()}
+        # Type changes that map to the same SQL type in this dialect need no statement
+        ops = [
+            op
+            for op in patch.ops
+            if op["op"] != "alter_column" or self._type_changes(old.table(old_names.get(op["table"], op["table"])), op)
+        ]
+        renamed_columns: Dict[str, Dict[str, str]] = {}
+        for op in ops:
+            if op["op"] == "rename_column":
+                renamed_columns.setdefault(op["table"], {})[op["to"]] = op["column"]
+
+        # Foreign keys each kept table has once renames are applied, and the ones `new` infers for it
+        renamed_keys = _renamed_foreign_keys(old, new, patch.renamed_tables, renamed_columns)
+        current = {name: set(keys) for name, keys in renamed_keys.items()}
+        wanted = {
+            table.name: set(new.references_from(table.name))
+            for table in new.tables
+            if table.name not in patch.added_tables
+        }
+
+        rebuild: List[str] = []
+        if self.dialect == "sqlite":
+            # Tables whose columns change type or lose a column are copied into a new table
+            for op in ops:
+                if op["op"] in ("alter_column", "remove_column") and op["table"] not in rebuild:
+                    rebuild.append(op["table"])
+            # SQLite adds a new column's reference inline; any other key change needs a rebuild too
+            for op in ops:
+                if op["op"] == "add_column":
+                    name = Column.parse(op["column"]).name
+                    current.setdefault(op["table"], set()).update(
+                        fk for fk in new.references_from(op["table"]) if fk.column == name
+                    )
+            for name, keys in wanted.items():
+                if current.get(name, set()) != keys and name not in rebuild:
+                    rebuild.append(name)
+
+        statements: List[str] = []
+        added: List[Table] = []
+        column_ops: List[Dict[str, Any]] = []
+        dropped: List[str] = []
+        for op in ops:
+            kind = op["op"]
+            if kind == "remove_table":
+                dropped.append(op["table"])
+            elif kind == "rename_table":
+                statements.append(f"ALTER TABLE {quote(op['table'])} RENAME TO {quote(op['to'])};")
+            elif kind == "add_table":
+                added.append(new.table(op["value"]["name"]))
+            elif kind == "rename_column":
+                if op["table"] not in rebuild:
+                    statements.append(
+                        f"ALTER TABLE {quote(op['table'])} RENAME COLUMN {quote(op['column'])} TO {quote(op['to'])};"
+                    )
+            elif kind in ("add_column", "remove_column", "alter_column") and op["table"] not in rebuild:
+                column_ops.append(op)
+
+        if self.dialect == "sqlite":
+            statements.extend(self.create_table(table, new.references_from(table.name)) for table in added)
+            for op in column_ops:
+                statements.extend(self._column_op(new, op))
+            for name in rebuild:
+                statements.extend(self._rebuild(old, new, name, patch.renamed_tables, renamed_columns.get(name, {})))
+        else:
+            removed_keys: List[ForeignKey] = []
+            for name, keys in renamed_keys.items():
+                for fk, before in keys.items():
+                    if fk not in wanted.get(name, ()):
+                        removed_keys.append(fk)
+                    elif constraint_name(fk) != constraint_name(before):
+                        statements.append(
+                            f"ALTER TABLE {quote(name)} RENAME CONSTRAINT {quote(constraint_name(before))} "
+                            f"TO {quote(constraint_name(fk))};"
+                        )
+            # Keys go before the columns and tables they point at
+            statements.extend(
+                f"ALTER TABLE {quote(fk.table)} DROP CONSTRAINT {quote(constraint_name(fk))};" for fk in removed_keys
+            )
+            existing = set(wanted)
+            deferred: List[ForeignKey] = []
+            for table in added:
+                inline = []
+                for fk in new.references_from(table.name):
+                    if fk.ref_table in existing or fk.ref_table == table.name:
+                        inline.append(fk)
+                    else:
+                        deferred.append(fk)
+                statements.append(self.create_table(table, inline))
+                existing.add(table.name)
+            for op in column_ops:
+                statements.extend(self._column_op(new, op))
+            for name in wanted:
+                deferred.extend(fk for fk in new.references_from(name) if fk not in current.get(name, ()))
+            statements.extend(_add_constraint(fk) for fk in dict.fromkeys(deferred))
+
+        # A table is dropped only once nothing left references it
+        statements.extend(f"DROP TABLE {quote(name)};" for name in dropped)
+        if rebuild:
+            # Dropping a referenced table during a rebuild must not touch the rows pointing at it
+            statements = ["PRAGMA foreign_keys = OFF;"] + statements + ["PRAGMA foreign_keys = ON;"]
+        return statements
+
+    def _type_changes(self, old_table: Optional[Table], op: Dict[str, Any]) -> bool:
+        column = old_table.column(op["column"]) if old_table is not None else None
+        if column is None:
+            return True
+        return column_type(column, self.dialect) != column_type(Column(column.name, op["type"]), self.dialect)
+
+    def _column_op(self, new: ERPDesign, op: Dict[str, Any]) -> List[str]:
+        kind, table = op["op"], quote(op["table"])
+        if kind == "remove_column":
+            return [f"ALTER TABLE {table} DROP COLUMN {quote(op['column'])};"]
+        if kind == "alter_column":
+            column = Column(op["column"], op["type"])
+            sql_type = column_type(column, self.dialect)
+            return [
+                f"ALTER TABLE {table} ALTER COLUMN {quote(column.name)} TYPE {sql_type} "
+                f"USING {quote(column.name)}::{sql_type};"
+            ]
+        if kind == "add_column":
+            column = Column.parse(op["column"])
+            line = f"ALTER TABLE {table} ADD COLUMN {quote(column.name)} {column_type(column, self.dialect)}"
+            if self.dialect == "sqlite":
+                # Postgres gets the key as a named constraint once every column exists
+                for fk in new.references_from(op["table"]):
+                    if fk.column == column.name:
+                        line += f" REFERENCES {quote(fk.ref_table)} ({quote(fk.ref_column)})"
+            return [line + ";"]
+        return []
+
+    def _rebuild(
+        self,
+        old: ERPDesign,
+        new: ERPDesign,
+        name: str,
+        renamed_tables: Dict[str, str],
+        renamed_columns: Dict[str, str],
+    ) -> List[str]:
+        table = new.table(name)
+        old_name = next((before for before, after in renamed_tables.items() if after == name), name)
+        old_table = old.table(old_name)
+        old_columns = {column.name for column in old_table.columns} if old_table else set()
+        copied: List[Tuple[str, str]] = []
+        for column in table.columns:
+            source = renamed_columns.get(column.name, column.name)
+            if source in old_columns and (column.name, source) not in copied:
+                copied.append((column.name, source))
+
+        temporary = f"{name}__rebuild"
+        statements = [self._render(table, temporary, new.references_from(name))]
+        if copied:
+            statements.append(
+                f"INSERT INTO {quote(temporary)} ({', '.join(quote(target) for target, _ in copied)}) "
+                f"SELECT {', '.join(quote(source) for _, source in copied)} FROM {quote(name)};"
+            )
+        statements += [f"DROP TABLE {quote(name)};", f"ALTER TABLE {quote(temporary)} RENAME TO {quote(name)};"]
+        return statements
+
+
+def constraint_name(fk: ForeignKey) -> str:
+    """Name of a foreign key constraint, the one Postgres would pick for it."""
+    return f"{fk.table}_{fk.column}_fkey"
+
+
+def _add_constraint(fk: ForeignKey) -> str:
+    return (
+        f"ALTER TABLE {quote(fk.table)} ADD CONSTRAINT {quote(constraint_name(fk))} "
+        f"FOREIGN KEY ({quote(fk.column)}) REFERENCES {quote(fk.ref_table)} ({quote(fk.ref_column)});"
+    )
+
+
+def _renamed_foreign_keys(
+    old: ERPDesign,
+    new: ERPDesign,
+    renamed_tables: Dict[str, str],
+    renamed_columns: Dict[str, Dict[str, str]],
+) -> Dict[str, Dict[ForeignKey, ForeignKey]]:
+    """Keys of `old` on tables kept in `new`, after renames, mapped to the key they were.
+
+    Keys on dropped columns are left out, but keys pointing at a dropped table
+    are kept: the database still has them until they are removed.
+    """
+    column_names = {
+        table: {before: after for after, before in columns.items()} for table, columns in renamed_columns.items()
+    }
+    keys: Dict[str, Dict[ForeignKey, ForeignKey]] = {}
+    for fk in old.foreign_keys:
+        table = renamed_tables.get(fk.table, fk.table)
+        kept = new.table(table)
+        column = column_names.get(table, {}).get(fk.column, fk.column)
+        if kept is None or kept.name != table or kept.column(column) is None:
+            continue
+        ref_table = renamed_tables.get(fk.ref_table, fk.ref_table)
+        ref_column = column_names.get(ref_table, {}).get(fk.ref_column, fk.ref_column)
+        keys.setdefault(table, {})[ForeignKey(table, column, ref_table, ref_column)] = fk
+    return keys
+
+
+def _creation_order(design: ERPDesign) -> List[Table]:
+    """Tables with the ones they reference first; cycles keep the design's order."""
+    ordered: List[Table] = []
+    state: Dict[str, int] = {}
+
+    def visit(table: Table) -> None:
+        if state.get(table.name):
+            return
+        state[table.name] = 1
+        for fk in design.references_from(table.name):
+            target = design.table(fk.ref_table)
+            if target is not None and not state.get(target.name):
+                visit(target)
+        state[table.name] = 2
+        ordered.append(table)
+
+    for table in design.tables:
+        visit(table)
+    return ordered
+
+
+_generators: Dict[str, DDLGenerator] = {}
+
+
+def get_ddl_generator(dialect: Dialect = "sqlite") -> DDLGenerator:
+    """Process-wide generator per dialect, so the table cache is shared."""
+    generator = _generators.get(dialect)
+    if generator is None:
+        generator = _generators[dialect] = DDLGenerator(dialect)
+    return generator
+
+
+def sqlite_tables(conn: sqlite3.Connection) -> Dict[str, Tuple[List[Tuple[str, str]], List[Tuple[str, str, str]]]]:
+    """Table name to its (column, declared type) pairs and (column, table, column) keys, for comparing schemas."""
+    tables = {}
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name"):
+        columns = conn.execute(f"PRAGMA table_info({quote(name)})").fetchall()
+        keys = conn.execute(f"PRAGMA foreign_key_list({quote(name)})").fetchall()
+        tables[name] = (
+            sorted((column[1], column[2]) for column in columns),
+            sorted((key[3], key[2], key[4]) for key in keys),
+        )
+    return tables
+
+
+def validate_sqlite(design: ERPDesign, previous: Optional[ERPDesign] = None) -> List[str]:
+    """Problems found running the schema (and the migration from `previous`) in SQLite."""
+    generator = get_ddl_generator("sqlite")
+    errors = []
+    expected = sqlite3.connect(":memory:")
+    try:
+        expected.execute("PRAGMA foreign_keys = ON")
+        for statement in generator.schema(design):
+            expected.execute(statement)
+        if expected.execute("PRAGMA foreign_key_check").fetchall():
+            errors.append("schema: foreign key check failed")
+    except sqlite3.Error as e:
+        return [f"schema: {e}"]
+
+    if previous is not None:
+        migrated = sqlite3.connect(":memory:")
+        statement = ""
+        try:
+            for statement in generator.schema(previous) + generator.migration(previous, design):
+                migrated.execute(statement)
+            if sqlite_tables(migrated) != sqlite_tables(expected):
+                errors.append("migration: resulting schema differs from the new design")
+        except sqlite3.Error as e:
+            errors.append(f"migration: {e} in {statement.splitlines()[0]}")
+        finally:
+            migrated.close()
+    expected.close()
+    return errors
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dialect", choices=tuple(TYPES), default="sqlite")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ddl = commands.add_parser("ddl", help="print the schema for a design")
+    ddl.add_argument("path")
+
+    migrate = commands.add_parser("migrate", help="print the migration between two designs")
+    migrate.add_argument("old")
+    migrate.add_argument("new")
+
+    check = commands.add_parser("check", help="run designs, in order, against SQLite")
+    check.add_argument("paths", nargs="+")
+    args = parser.parse_args()
+
+    generator = get_ddl_generator(args.dialect)
+    if args.command == "ddl":
+        print("\n\n".join(generator.schema(load_design(args.path))))
+        return 0
+    if args.command == "migrate":
+        print("\n".join(generator.migration(load_design(args.old), load_design(args.new))))
+        return 0
+
+    started = time.perf_counter()
+    failed = 0
+    previous = None
+    for path in args.paths:
+        design = load_design(path)
+        for error in validate_sqlite(design, previous):
+            failed += 1
+            print(f"{path}: {error}")
+        previous = design
+    print(
+        f"checked {len(args.paths)} designs in {time.perf_counter() - started:.2f}s, {failed} problems "
+        f"(cache {get_ddl_generator('sqlite').hits} hits, {get_ddl_generator('sqlite').misses} misses)"
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
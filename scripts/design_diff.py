@@ -0,0 +1,323 @@
+"""Structural diff and compact patches between two erp_design revisions.
+
+Usage:
+    python scripts/design_diff.py old.json new.json
+    python scripts/design_diff.py old.json new.json --summary
+
+Tables and columns are matched by name first. Only what is left unmatched
+on both sides goes through rename detection, and candidates come from an
+inverted index of shared column names rather than from comparing every
+pair, so a diff stays close to linear in the size of the designs. Actions,
+views and modules are matched by name. The patch is a list of small JSON
+ops; `apply_patch(old, patch)` rebuilds the new design, so a client holding
+the previous revision only needs the ops.
+"""
+from __future__ import annotations
+
+import argparse
+import copy
+import difflib
+import json
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from erp_design import Column, ERPDesign, Table, load_design
+
+# Sections of an erp_design whose items are identified by their "name"
+NAMED_SECTIONS = ("actions", "views", "modules")
+RENAME_THRESHOLD = 0.6
+# Columns shared by more unmatched tables than this (e.g. "nombre") don't propose candidates
+MAX_COLUMN_FANOUT = 8
+
+Op = Dict[str, Any]
+
+
+def _name_similarity(a: str, b: str) -> float:
+    return difflib.SequenceMatcher(None, a.casefold(), b.casefold()).ratio()
+
+
+def _match_tables(old: List[Table], new: List[Table], threshold: float) -> List[Tuple[Table, Table]]:
+    """Rename pairs among tables that did not match by name."""
+    by_column: Dict[str, List[int]] = {}
+    for index, table in enumerate(old):
+        for column in table.columns:
+            by_column.setdefault(column.name, []).append(index)
+
+    scored = []
+    for new_index, table in enumerate(new):
+        names = {column.name for column in table.columns}
+        candidates = set()
+        for name in names:
+            owners = by_column.get(name, ())
+            if len(owners) <= MAX_COLUMN_FANOUT:
+                candidates.update(owners)
+        for old_index in candidates:
+            candidate = old[old_index]
+            candidate_names = {column.name for column in candidate.columns}
+            overlap = len(names & candidate_names) / len(names | candidate_names)
+            score = 0.7 * overlap + 0.3 * _name_similarity(candidate.name, table.name)
+            if score >= threshold:
+                scored.append((score, old_index, new_index))
+    return _greedy_pairs(scored, old, new)
+
+
+def _match_columns(old: List[Column], new: List[Column], threshold: float) -> List[Tuple[Column, Column]]:
+    """Rename pairs among columns of one table that did not match by name."""
+    scored = []
+    for old_index, column in enumerate(old):
+        for new_index, candidate in enumerate(new):
+            # Leftover columns in one table are few; a rename keeps the type
+            if column.type != candidate.type:
+                continue
+            score = _name_similarity(column.name, candidate.name)
+            if score >= threshold:
+                scored.append((score, old_index, new_index))
+    return _greedy_pairs(scored, old, new)
+
+
+def _greedy_pairs(scored: List[Tuple[float, int, int]], old: Sequence[Any], new: Sequence[Any]) -> List[Tuple[Any, Any]]:
+    pairs = []
+    used_old, used_new = set(), set()
+    for _, old_index, new_index in sorted(scored, key=lambda item: -item[0]):
+        if old_index in used_old or new_index in used_new:
+            continue
+        used_old.add(old_index)
+        used_new.add(new_index)
+        pairs.append((old[old_index], new[new_index]))
+    return pairs
+
+
+class DesignPatch:
+    """Ops turning one erp_design into another, plus the sets a UI needs to highlight."""
+
+    __slots__ = ("ops", "added_tables", "removed_tables", "renamed_tables", "changed_tables")
+
+    def __init__(self):
+        self.ops: List[Op] = []
+        self.added_tables: List[str] = []
+        self.removed_tables: List[str] = []
+        self.renamed_tables: Dict[str, str] = {}
+        self.changed_tables: List[str] = []
+
+    def __bool__(self) -> bool:
+        return bool(self.ops)
+
+    def __len__(self) -> int:
+        return len(self.ops)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "ops": len(self.ops),
+            "added_tables": self.added_tables,
+            "removed_tables": self.removed_tables,
+            "renamed_tables": self.renamed_tables,
+            "changed_tables": self.changed_tables,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.ops, ensure_ascii=False, separators=(",", ":"))
+
+
+def diff_designs(old: ERPDesign, new: ERPDesign, threshold: float = RENAME_THRESHOLD) -> DesignPatch:
+    patch = DesignPatch()
+    old_tables = [table for table in old.tables if table.module is None]
+    new_tables = [table for table in new.tables if table.module is None]
+    old_by_name = {table.name: table for table in old_tables}
+    new_names = {table.name for table in new_tables}
+
+    pairs = [(old_by_name[table.name], table) for table in new_tables if table.name in old_by_name]
+    removed = [table for table in old_tables if table.name not in new_names]
+    added = [table for table in new_tables if table.name not in old_by_name]
+    renames = _match_tables(removed, added, threshold) if removed and added else []
+    renamed_old = {id(old_table) for old_table, _ in renames}
+    renamed_new = {id(new_table) for _, new_table in renames}
+
+    for table in removed:
+        if id(table) not in renamed_old:
+            patch.ops.append({"op": "remove_table", "table": table.name})
+            patch.removed_tables.append(table.name)
+    for old_table, new_table in renames:
+        patch.ops.append({"op": "rename_table", "table": old_table.name, "to": new_table.name})
+        patch.renamed_tables[old_table.name] = new_table.name
+    for old_table, new_table in renames + pairs:
+        if _diff_table(patch.ops, old_table, new_table, threshold):
+            patch.changed_tables.append(new_table.name)
+    for index, table in enumerate(new_tables):
+        if id(table) in renamed_new or table.name in old_by_name:
+            continue
+        patch.ops.append({"op": "add_table", "index": index, "value": table.to_dict()})
+        patch.added_tables.append(table.name)
+
+    # Whatever order the ops above leave, the new order wins
+    expected = [patch.renamed_tables.get(table.name, table.name) for table in old_tables
+                if table.name in new_names or table.name in patch.renamed_tables]
+    if _insert_added(expected, new_tables, set(patch.added_tables)) != [table.name for table in new_tables]:
+        patch.ops.append({"op": "order_tables", "names": [table.name for table in new_tables]})
+
+    for section in NAMED_SECTIONS:
+        _diff_named(patch.ops, section, getattr(old, section), getattr(new, section))
+    for key in old.extra.keys() | new.extra.keys():
+        if key not in new.extra:
+            patch.ops.append({"op": "unset", "key": key})
+        elif old.extra.get(key) != new.extra[key]:
+            patch.ops.append({"op": "set", "key": key, "value": new.extra[key]})
+    return patch
+
+
+def _insert_added(names: List[str], new_tables: List[Table], added: set) -> List[str]:
+    result = list(names)
+    for index, table in enumerate(new_tables):
+        if table.name in added:
+            result.insert(index, table.name)
+    return result
+
+
+def _diff_table(ops: List[Op], old: Table, new: Table, threshold: float) -> bool:
+    name = new.name
+    before = len(ops)
+    old_names = {column.name for column in old.columns}
+    new_names = {column.name for column in new.columns}
+    removed = [column for column in old.columns if column.name not in new_names]
+    added = [column for column in new.columns if column.name not in old_names]
+    renames = _match_columns(removed, added, threshold) if removed and added else []
+    renamed = {column.name: candidate.name for column, candidate in renames}
+    renamed_to = set(renamed.values())
+
+    for column in removed:
+        if column.name not in renamed:
+            ops.append({"op": "remove_column", "table": name, "column": column.name})
+    for old_name, new_name in renamed.items():
+        ops.append({"op": "rename_column", "table": name, "column": old_name, "to": new_name})
+    for column in old.columns:
+        candidate = new.column(column.name)
+        if candidate is not None and candidate.type != column.type:
+            ops.append({"op": "alter_column", "table": name, "column": column.name, "type": candidate.type})
+
+    current = [renamed.get(column.name, column.name) for column in old.columns
+               if column.name in new_names or column.name in renamed]
+    for index, column in enumerate(new.columns):
+        if column.name not in old_names and column.name not in renamed_to:
+            ops.append({"op": "add_column", "table": name, "index": index, "column": column.to_raw()})
+            current.insert(index, column.name)
+    if current != [column.name for column in new.columns]:
+        ops.append({"op": "order_columns", "table": name, "names": [column.name for column in new.columns]})
+
+    if old.description != new.description:
+        ops.append({"op": "set_table", "table": name, "key": "description", "value": new.description})
+    for key in old.extra.keys() | new.extra.keys():
+        if old.extra.get(key) != new.extra.get(key):
+            ops.append({"op": "set_table", "table": name, "key": key, "value": new.extra.get(key)})
+    return len(ops) > before
+
+
+def _diff_named(ops: List[Op], section: str, old: Optional[List[Any]], new: Optional[List[Any]]) -> None:
+    if old is None or new is None:
+        if old != new:
+            ops.append({"op": "set", "key": section, "value": new})
+        return
+    old_by_name = {item.get("name"): item for item in old if isinstance(item, dict)}
+    new_by_name = {item.get("name"): item for item in new if isinstance(item, dict)}
+    if len(old_by_name) != len(old) or len(new_by_name) != len(new):
+        # Unnamed or duplicate items can't be addressed, send the section whole
+        if old != new:
+            ops.append({"op": "set", "key": section, "value": new})
+        return
+
+    for name in old_by_name.keys() - new_by_name.keys():
+        ops.append({"op": "remove_item", "section": section, "name": name})
+    for index, (name, item) in enumerate(new_by_name.items()):
+        if old_by_name.get(name) != item:
+            ops.append({"op": "put_item", "section": section, "index": index, "value": item})
+    kept = [name for name in old_by_name if name in new_by_name]
+    if kept != [name for name in new_by_name if name in old_by_name]:
+        ops.append({"op": "order_items", "section": section, "names": list(new_by_name)})
+
+
+def apply_patch(design: Dict[str, Any], ops: Iterable[Op]) -> Dict[str, Any]:
+    """New erp_design dict from `design` and the ops of a patch. `design` is not modified."""
+    result = copy.deepcopy(design)
+    tables: List[Dict[str, Any]] = result.setdefault("tables", [])
+    by_name = {table["name"]: table for table in tables}
+
+    for op in ops:
+        kind = op["op"]
+        if kind == "remove_table":
+            tables.remove(by_name.pop(op["table"]))
+        elif kind == "rename_table":
+            table = by_name.pop(op["table"])
+            table["name"] = op["to"]
+            by_name[op["to"]] = table
+        elif kind == "add_table":
+            table = copy.deepcopy(op["value"])
+            tables.insert(op["index"], table)
+            by_name[table["name"]] = table
+        elif kind == "order_tables":
+            tables[:] = [by_name[name] for name in op["names"]]
+        elif kind == "set_table":
+            by_name[op["table"]][op["key"]] = op["value"]
+        elif kind in ("remove_column", "rename_column", "alter_column", "add_column", "order_columns"):
+            _apply_column_op(by_name[op["table"]], op)
+        elif kind == "put_item":
+            items = result.setdefault(op["section"], [])
+            for position, item in enumerate(items):
+                if item.get("name") == op["value"].get("name"):
+                    items[position] = copy.deepcopy(op["value"])
+                    break
+            else:
+                items.insert(op["index"], copy.deepcopy(op["value"]))
+        elif kind == "remove_item":
+            result[op["section"]] = [item for item in result[op["section"]] if item.get("name") != op["name"]]
+        elif kind == "order_items":
+            items = {item.get("name"): item for item in result[op["section"]]}
+            result[op["section"]] = [items[name] for name in op["names"]]
+        elif kind == "set":
+            result[op["key"]] = copy.deepcopy(op["value"])
+        elif kind == "unset":
+            result.pop(op["key"], None)
+        else:
+            raise ValueError(f"unknown patch op {kind!r}")
+
+    if not tables and "tables" not in design:
+        del result["tables"]
+    return result
+
+
+def _apply_column_op(table: Dict[str, Any], op: Op) -> None:
+    columns = [Column.parse(raw) for raw in table.get("columns", ())]
+    kind = op["op"]
+    if kind == "add_column":
+        columns.insert(op["index"], Column.parse(op["column"]))
+    elif kind == "order_columns":
+        by_name = {column.name: column for column in columns}
+        columns = [by_name[name] for name in op["names"]]
+    else:
+        column = next(column for column in columns if column.name == op["column"])
+        if kind == "remove_column":
+            columns.remove(column)
+        elif kind == "rename_column":
+            column.name = op["to"]
+        else:
+            column.type = op["type"]
+    table["columns"] = [column.to_raw() for column in columns]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--summary", action="store_true", help="print what changed instead of the ops")
+    parser.add_argument("--threshold", type=float, default=RENAME_THRESHOLD, help="rename similarity, 0-1")
+    args = parser.parse_args()
+
+    old, new = load_design(args.old), load_design(args.new)
+    patch = diff_designs(old, new, args.threshold)
+    if args.summary:
+        print(json.dumps(patch.summary(), indent=2, ensure_ascii=False))
+    else:
+        print(patch.to_json())
+    full = len(new.to_json(separators=(",", ":")).encode("utf-8"))
+    print(f"{len(patch)} ops, {len(patch.to_json().encode('utf-8'))} bytes (full design {full} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
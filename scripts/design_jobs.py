@@ -0,0 +1,393 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Protocol
+
+from designer_client import DesignerClient, DesignRequest
+
+logger = logging.getLogger("design-jobs")
+
+JobHandler = Callable[["DesignJob"], Awaitable[str]]
+JobCallback = Callable[["DesignJob"], None]
+
+
+@dataclass
+class DesignJob:
+    company_name: str
+    owner_name: str
+    transcript: str
+    room: str = ""
+    job_id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    # queued | running | done | failed
+    status: str = "queued"
+    thread_id: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+class JobQueueBackend(Protocol):
+    """Storage for design jobs. Only the runner thread calls these methods."""
+
+    def enqueue(self, job: DesignJob) -> None: ...
+
+    def claim(self) -> Optional[DesignJob]: ...
+
+    def update(self, job: DesignJob) -> None: ...
+
+    def get(self, job_id: str) -> Optional[DesignJob]: ...
+
+    def requeue_running(self) -> int: ...
+
+    def renew(self) -> None: ...
+
+
+class MemoryJobQueue:
+    """Non-durable backend, for development."""
+
+    def __init__(self):
+        self._jobs: Dict[str, DesignJob] = {}
+
+    def enqueue(self, job: DesignJob) -> None:
+        self._jobs[job.job_id] = job
+
+    def claim(self) -> Optional[DesignJob]:
+        for job in self._jobs.values():
+            if job.status == "queued":
+                job.status = "running"
+                job.updated_at = time.time()
+                return job
+        return None
+
+    def update(self, job: DesignJob) -> None:
+        job.updated_at = time.time()
+        self._jobs[job.job_id] = job
+
+    def get(self, job_id: str) -> Optional[DesignJob]:
+        return self._jobs.get(job_id)
+
+    def requeue_running(self) -> int:
+        return 0
+
+    def renew(self) -> None:
+        pass
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SqliteJobQueue:
+    """Durable backend: jobs survive a worker restart and are picked up again.
+
+    Several workers may share the database. A claimed job records its owner
+    ("host:pid:id") and a lease that `renew` keeps extending; it is requeued
+    only once its owner process is gone or the lease has run out.
+    """
+
+    _COLUMNS = [name for name in DesignJob.__dataclass_fields__]
+
+    def __init__(self, path: str, lease: float = 300.0):
+        self.path = path
+        self.lease = lease
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # Opened lazily so the connection belongs to the runner thread
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS design_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    company_name TEXT NOT NULL,
+                    owner_name TEXT NOT NULL,
+                    transcript TEXT NOT NULL,
+                    room TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    thread_id TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    owner TEXT,
+                    lease_until REAL
+                )"""
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(design_jobs)")}
+            # Databases created before jobs had owners
+            for column, sql_type in (("owner", "TEXT"), ("lease_until", "REAL")):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE design_jobs ADD COLUMN {column} {sql_type}")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS design_jobs_status ON design_jobs (status, created_at)"
+            )
+        return self._conn
+
+    def enqueue(self, job: DesignJob) -> None:
+        with self.conn:
+            self.conn.execute(
+                f"INSERT INTO design_jobs ({', '.join(self._COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in self._COLUMNS)})",
+                [getattr(job, name) for name in self._COLUMNS],
+            )
+
+    def claim(self) -> Optional[DesignJob]:
+        while True:
+            row = self.conn.execute(
+                f"SELECT {', '.join(self._COLUMNS)} FROM design_jobs "
+                "WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            job = DesignJob(**dict(zip(self._COLUMNS, row)))
+            job.status = "running"
+            job.updated_at = time.time()
+            with self.conn:
+                # Another worker may claim the same row between the select and here
+                claimed = self.conn.execute(
+                    "UPDATE design_jobs SET status = ?, updated_at = ?, owner = ?, lease_until = ? "
+                    "WHERE job_id = ? AND status = 'queued'",
+                    (job.status, job.updated_at, self.owner, job.updated_at + self.lease, job.job_id),
+                ).rowcount
+            if claimed:
+                return job
+
+    def update(self, job: DesignJob) -> None:
+        job.updated_at = time.time()
+        with self.conn:
+            updated = self.conn.execute(
+                "UPDATE design_jobs SET status = ?, thread_id = ?, error = ?, updated_at = ?, "
+                "owner = NULL, lease_until = NULL WHERE job_id = ? AND owner = ?",
+                (job.status, job.thread_id, job.error, job.updated_at, job.job_id, self.owner),
+            ).rowcount
+        if not updated:
+            logger.warning(f"design job {job.job_id} was requeued after its lease ran out, result dropped")
+
+    def get(self, job_id: str) -> Optional[DesignJob]:
+        row = self.conn.execute(
+            f"SELECT {', '.join(self._COLUMNS)} FROM design_jobs WHERE job_id = ?",
+            (job_id,),
+        ).fetchone()
+        return DesignJob(**dict(zip(self._COLUMNS, row))) if row else None
+
+    def requeue_running(self) -> int:
+        """Jobs left running by a crashed worker go back to the queue.
+
+        A job is requeued when its lease has expired, or when its owner ran
+        on this host and the process is gone. Jobs of live workers stay put.
+        """
+        host = socket.gethostname()
+        gone = []
+        for (owner,) in self.conn.execute(
+            "SELECT DISTINCT owner FROM design_jobs WHERE status = 'running' AND owner IS NOT NULL"
+        ):
+            owner_host, pid, _ = owner.rsplit(":", 2)
+            if owner != self.owner and owner_host == host and pid.isdigit() and not _pid_alive(int(pid)):
+                gone.append(owner)
+
+        with self.conn:
+            return self.conn.execute(
+                "UPDATE design_jobs SET status = 'queued', owner = NULL, lease_until = NULL "
+                "WHERE status = 'running' AND (lease_until IS NULL OR lease_until < ? "
+                f"OR owner IN ({', '.join('?' * len(gone))}))",
+                [time.time(), *gone],
+            ).rowcount
+
+    def renew(self) -> None:
+        """Extend the lease on every job this worker is running."""
+        with self.conn:
+            self.conn.execute(
+                "UPDATE design_jobs SET lease_until = ? WHERE status = 'running' AND owner = ?",
+                (time.time() + self.lease, self.owner),
+            )
+
+
+class DesignJobRunner:
+    """Runs design generation jobs on a dedicated thread and event loop.
+
+    Rooms hand jobs off with `submit` and get the job id back immediately.
+    Jobs keep running after the room that submitted them disconnects.
+    `on_update` callbacks are called from the runner thread on every status
+    change. Every `heartbeat` seconds the runner renews the leases on its
+    jobs and requeues jobs that other workers abandoned.
+    """
+
+    def __init__(
+        self, backend: JobQueueBackend, handler: JobHandler, concurrency: int = 2, heartbeat: float = 60.0
+    ):
+        self.backend = backend
+        self.handler = handler
+        self.concurrency = concurrency
+        self.heartbeat = heartbeat
+        self._callbacks: Dict[str, JobCallback] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._ready = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    async def submit(self, job: DesignJob, on_update: Optional[JobCallback] = None) -> str:
+        """Store `job` and return its id; errors storing it are raised here."""
+        await self._ensure_started()
+        if on_update is not None:
+            self._callbacks[job.job_id] = on_update
+        try:
+            # The backend belongs to the runner thread, wait there for the row to be written
+            await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._enqueue(job), self._loop))
+        except Exception:
+            self._callbacks.pop(job.job_id, None)
+            raise
+        return job.job_id
+
+    async def _ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run_thread, name="design-jobs", daemon=True
+                )
+                self._thread.start()
+        if not self._ready.is_set():
+            await asyncio.get_running_loop().run_in_executor(None, self._ready.wait)
+
+    def _run_thread(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        self._wakeup = asyncio.Event()
+        self._ready.set()
+        self._loop.run_until_complete(self._run())
+
+    async def _enqueue(self, job: DesignJob) -> None:
+        self.backend.enqueue(job)
+        logger.info(f"queued design job {job.job_id} for {job.company_name}")
+        self._notify(job)
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        try:
+            self._requeue()
+        except sqlite3.Error as e:
+            logger.error(f"error requeueing interrupted design jobs: {e}")
+        # Kept referenced so the heartbeat task isn't garbage collected
+        self._heartbeat = asyncio.create_task(self._keep_leases())
+
+        running: List[asyncio.Task] = []
+        while True:
+            running = [task for task in running if not task.done()]
+            try:
+                job = self.backend.claim() if len(running) < self.concurrency else None
+            except sqlite3.Error as e:
+                logger.error(f"error claiming a design job, retrying in {self.heartbeat:g}s: {e}")
+                # Retried on the next submit, finished job or heartbeat
+                self._wakeup.clear()
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), self.heartbeat)
+                continue
+            if job is None:
+                # Set again by submit and whenever a job finishes
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            running.append(asyncio.create_task(self._process(job)))
+
+    def _requeue(self) -> None:
+        requeued = self.backend.requeue_running()
+        if requeued:
+            logger.info(f"requeued {requeued} interrupted design jobs")
+            self._wakeup.set()
+
+    async def _keep_leases(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            try:
+                self.backend.renew()
+                self._requeue()
+            except sqlite3.Error as e:
+                logger.error(f"error renewing design job leases: {e}")
+
+    async def _process(self, job: DesignJob) -> None:
+        self._notify(job)
+        started = time.perf_counter()
+        try:
+            job.thread_id = await self.handler(job)
+            job.status = "done"
+            logger.info(
+                f"design job {job.job_id} done in {time.perf_counter() - started:.1f}s, thread {job.thread_id}"
+            )
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            logger.error(f"design job {job.job_id} failed: {e}")
+        try:
+            self.backend.update(job)
+        except sqlite3.Error as e:
+            # The lease runs out and the job is requeued
+            logger.error(f"error saving design job {job.job_id}: {e}")
+        self._notify(job)
+        self._wakeup.set()
+
+    def _notify(self, job: DesignJob) -> None:
+        callback = self._callbacks.get(job.job_id)
+        if callback is None:
+            return
+        if job.status in ("done", "failed"):
+            self._callbacks.pop(job.job_id, None)
+        try:
+            callback(job)
+        except Exception as e:
+            logger.error(f"error in design job callback: {e}")
+
+
+_designer: Optional[DesignerClient] = None
+
+
+async def run_designer(job: DesignJob) -> str:
+    """Run the designer_agent graph for a job and return the LangGraph thread id."""
+    global _designer
+    if _designer is None:
+        _designer = DesignerClient(max_concurrency=int(os.environ.get("DESIGN_JOBS_CONCURRENCY", 2)))
+    result = await _designer.design(
+        DesignRequest(job.company_name, job.owner_name, job.transcript)
+    )
+    return result.thread_id
+
+
+_runner: Optional[DesignJobRunner] = None
+_runner_lock = threading.Lock()
+
+
+def get_design_runner() -> DesignJobRunner:
+    """Process-wide runner, backed by SQLite at DESIGN_JOBS_DB."""
+    global _runner
+    if _runner is None:
+        # Rooms on several threads must not start two runners
+        with _runner_lock:
+            if _runner is None:
+                _runner = DesignJobRunner(
+                    SqliteJobQueue(
+                        os.environ.get("DESIGN_JOBS_DB", "design_jobs.sqlite3"),
+                        lease=float(os.environ.get("DESIGN_JOBS_LEASE", 300)),
+                    ),
+                    run_designer,
+                    concurrency=int(os.environ.get("DESIGN_JOBS_CONCURRENCY", 2)),
+                )
+    return _runner
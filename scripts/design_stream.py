@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+# erp_design keys holding lists of named items, e.g. {"name": "Empleados", ...}
+NAMED_LIST_KEYS = ("tables", "views", "actions", "modules")
+
+
+@dataclass
+class DesignUpdate:
+    """What one streamed chunk changed in the assembled design."""
+
+    design: Dict[str, Any]
+    node: str
+    added: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+    changed: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+    removed: Dict[str, List[str]] = field(default_factory=dict)
+    fields: List[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.changed or self.removed or self.fields)
+
+
+def _all_named(value: Any) -> bool:
+    return isinstance(value, list) and all(
+        isinstance(item, dict) and item.get("name") is not None for item in value
+    )
+
+
+class DesignAssembler:
+    """Builds an erp_design in memory from `stream_mode="updates"` chunks.
+
+    Each `erp_design` a graph node writes is authoritative for the keys it
+    carries. Named items are matched by name, so only items that actually
+    appeared, changed or disappeared are reported, and the assembled design
+    is updated in place instead of being rebuilt.
+    """
+
+    def __init__(self):
+        self.design: Dict[str, Any] = {}
+        self._positions: Dict[str, Dict[str, int]] = {}
+
+    def apply(self, data: Any) -> Optional[DesignUpdate]:
+        """Apply one chunk's data, returning the changes if it touched the design."""
+        if not isinstance(data, dict):
+            return None
+
+        update = None
+        for node, node_update in data.items():
+            if not isinstance(node_update, dict):
+                continue
+            erp_design = node_update.get("erp_design")
+            if not isinstance(erp_design, dict):
+                continue
+            if update is None:
+                update = DesignUpdate(design=self.design, node=node)
+            for key, value in erp_design.items():
+                if key in NAMED_LIST_KEYS and _all_named(value):
+                    self._merge_named(key, value, update)
+                elif self.design.get(key) != value:
+                    self._positions.pop(key, None)
+                    self.design[key] = value
+                    update.fields.append(key)
+        return update
+
+    def _merge_named(self, key: str, items: List[Any], update: DesignUpdate) -> None:
+        positions = self._positions.get(key)
+        if positions is None:
+            positions = self._positions[key] = {}
+            self.design[key] = []
+        current: List[Dict[str, Any]] = self.design[key]
+
+        incoming = set()
+        for item in items:
+            name = item["name"]
+            incoming.add(name)
+            index = positions.get(name)
+            if index is None:
+                positions[name] = len(current)
+                current.append(item)
+                update.added.setdefault(key, []).append(item)
+            elif current[index] != item:
+                current[index] = item
+                update.changed.setdefault(key, []).append(item)
+
+        removed = [name for name in positions if name not in incoming]
+        if removed:
+            update.removed[key] = removed
+            removed_set = set(removed)
+            current[:] = [item for item in current if item["name"] not in removed_set]
+            positions.clear()
+            for index, item in enumerate(current):
+                positions[item["name"]] = index
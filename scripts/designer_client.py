@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from design_stream import DesignAssembler, DesignUpdate
+
+logger = logging.getLogger("designer-client")
+
+UpdateCallback = Callable[[str, Any], None]
+
+
+@dataclass
+class DesignRequest:
+    company_name: str
+    owner_name: str
+    transcript: str
+
+
+@dataclass
+class DesignResult:
+    thread_id: str
+    erp_design: Optional[Dict[str, Any]]
+
+
+def format_design_input(request: DesignRequest) -> str:
+    """Designer input, in the same format the frontend uses."""
+    return (
+        f"# Información de la entrevista de diseño ERP\n\n"
+        f"Empresa: {request.company_name}\nPropietario: {request.owner_name}\n\n"
+        f"## Transcripción de la conversación:\n\n{request.transcript}"
+    )
+
+
+class DesignerClient:
+    """Async client for the LangGraph `designer_agent` graph.
+
+    Wraps the whole flow: create a thread, stream the interview input, mark
+    the interview as finished and stream the design run. Every call shares one
+    `langgraph_sdk` client (and its HTTP connection pool), and at most
+    `max_concurrency` designs run at the same time. `throttle`, if given, is
+    awaited once a design holds a concurrency slot and right before it is
+    submitted, so a rate limit applies to what actually reaches LangGraph.
+    """
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        assistant_id: str = "designer_agent",
+        max_concurrency: int = 4,
+        debug: bool = False,
+        throttle: Optional[Callable[[], Awaitable[None]]] = None,
+    ):
+        self.url = url or os.environ.get("LANGGRAPH_URL", "http://localhost:8123")
+        self.assistant_id = assistant_id
+        self.debug = debug
+        self.throttle = throttle
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from langgraph_sdk import get_client
+
+            self._client = get_client(url=self.url)
+        return self._client
+
+    async def design(
+        self, request: DesignRequest, on_update: Optional[UpdateCallback] = None
+    ) -> DesignResult:
+        thread_id = None
+        erp_design = None
+        async for update in self.stream_design(request, on_update):
+            if isinstance(update, str):
+                thread_id = update
+            else:
+                erp_design = update.design
+
+        if not erp_design:
+            # Only when no update carried the design
+            state = await self.client.threads.get_state(thread_id)
+            erp_design = state["values"].get("erp_design")
+        return DesignResult(thread_id=thread_id, erp_design=erp_design)
+
+    async def stream_design(
+        self, request: DesignRequest, on_update: Optional[UpdateCallback] = None
+    ) -> AsyncIterator[str | DesignUpdate]:
+        """Run a design, yielding the thread id first and then every design change.
+
+        Each DesignUpdate carries the tables, views, actions and modules that
+        appeared or changed in one streamed chunk, plus the design assembled
+        so far, so callers can render it progressively.
+        """
+        async with self._semaphore:
+            if self.throttle is not None:
+                await self.throttle()
+            thread = await self.client.threads.create()
+            thread_id = thread["thread_id"]
+            logger.info(f"designing {request.company_name} in thread {thread_id}")
+            yield thread_id
+
+            assembler = DesignAssembler()
+            input_dict = {
+                "messages": [{"content": format_design_input(request), "type": "human"}]
+            }
+            async for update in self._stream(thread_id, input_dict, assembler, on_update):
+                yield update
+
+            await self.client.threads.update_state(
+                thread_id, {"is_finished": True}, as_node="interview_user"
+            )
+            async for update in self._stream(thread_id, None, assembler, on_update):
+                yield update
+
+    async def design_many(
+        self, requests: Iterable[DesignRequest]
+    ) -> List[DesignResult | BaseException]:
+        """Run many designs concurrently, bounded by `max_concurrency`.
+
+        Results are in request order, failed designs are returned as exceptions.
+        """
+        return await asyncio.gather(
+            *(self.design(request) for request in requests), return_exceptions=True
+        )
+
+    async def _stream(
+        self,
+        thread_id: str,
+        input_dict: Optional[Dict[str, Any]],
+        assembler: DesignAssembler,
+        on_update: Optional[UpdateCallback],
+    ) -> AsyncIterator[DesignUpdate]:
+        async for chunk in self.client.runs.stream(
+            thread_id,
+            assistant_id=self.assistant_id,
+            input=input_dict,
+            stream_mode="updates",
+        ):
+            if self.debug:
+                # debug=True is an explicit opt-in, so show chunks at the default INFO level
+                logger.info(f"{chunk.event}: {json.dumps(chunk.data, indent=4)}")
+            if on_update is not None:
+                on_update(chunk.event, chunk.data)
+            update = assembler.apply(chunk.data)
+            if update:
+                yield update
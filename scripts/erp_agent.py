@@ -2,144 +2,68 @@ from __future__ import annotations
 
 import asyncio
 import datetime
-import json
 import logging
 import os
 import uuid
-from dataclasses import asdict, dataclass
-from typing import Any, Dict, List, Literal, Optional
+from typing import List, Literal, Optional
 
 from livekit import rtc
 from livekit.agents import (
     AutoSubscribe,
     JobContext,
-    WorkerOptions,
-    WorkerType,
     cli,
     llm,
 )
-from livekit.agents.multimodal import MultimodalAgent
+# Plugins register themselves on import, which livekit-agents only allows on the main thread
 from livekit.plugins import openai
 
-from dotenv import load_dotenv
-
-load_dotenv()
+from background_writer import get_writer
+from session_config import MODALITIES, SessionConfig, SessionConfigParser
+from startup import load_instructions, prewarm_hook
+from transcript_store import TranscriptStore
+from turn_latency import start_metrics_export, track_turns
+from transcript_writer import TranscriptWriter, transcript_filename
+from worker_load import get_worker_load, worker_options
 
 logger = logging.getLogger("erp-agent")
 logger.setLevel(logging.INFO)
 
-# Store conversation history
-conversation_history = []
+# Store conversation history per room, released when the room disconnects
+transcripts = TranscriptStore()
 
 # Helper function to record speech
-def record_speech(speaker: str, text: str) -> None:
-    """Record a speech event in the conversation history."""
+def record_speech(session_id: str, speaker: str, text: str) -> None:
+    """Record a speech event in the conversation history of a session."""
     if not text.strip():
         return  # Skip empty messages
     
     logger.info(f"RECORDING {speaker} SPEECH: {text}")
-    conversation_history.append({
-        "timestamp": datetime.datetime.now().isoformat(),
-        "speaker": speaker,
-        "text": text
-    })
-
-@dataclass
-class SessionConfig:
-    openai_api_key: str
-    instructions: str
-    voice: openai.realtime.api_proto.Voice
-    temperature: float
-    max_response_output_tokens: str | int
-    modalities: list[openai.realtime.api_proto.Modality]
-    turn_detection: openai.realtime.ServerVadOptions
-
-    def __post_init__(self):
-        if self.modalities is None:
-            self.modalities = self._modalities_from_string("text_and_audio")
-
-    def to_dict(self):
-        return {k: v for k, v in asdict(self).items() if k != "openai_api_key"}
-
-    @staticmethod
-    def _modalities_from_string(modalities: str) -> list[str]:
-        modalities_map = {
-            "text_and_audio": ["text", "audio"],
-            "text_only": ["text"],
-        }
-        return modalities_map.get(modalities, ["text", "audio"])
-
-    def __eq__(self, other: SessionConfig) -> bool:
-        return self.to_dict() == other.to_dict()
-
-
-def parse_session_config(data: Dict[str, Any]) -> SessionConfig:
-    # Use default config settings if no metadata provided
-    if not data:
-        logger.info("No session config provided, using defaults")
-        return SessionConfig(
-            openai_api_key=os.environ.get("OPENAI_API_KEY", ""),
-            instructions=ERP_CONSULTANT_INSTRUCTIONS,
-            voice="nova",
-            temperature=0.85,
-            max_response_output_tokens="inf",
-            modalities=["text", "audio"],
-            turn_detection=openai.realtime.ServerVadOptions(
-                threshold=0.4,
-                prefix_padding_ms=200,
-                silence_duration_ms=500,
+    transcripts.append(session_id, speaker, text)
+
+
+_config_parser: Optional[SessionConfigParser] = None
+
+
+def get_config_parser() -> SessionConfigParser:
+    """Session config parser with the ERP consultant defaults, built on first use."""
+    global _config_parser
+    if _config_parser is None:
+        _config_parser = SessionConfigParser(
+            SessionConfig(
+                openai_api_key=os.environ.get("OPENAI_API_KEY", ""),
+                instructions=load_instructions("erp_consultant"),
+                voice="nova",
+                temperature=0.85,
+                max_response_output_tokens="inf",
+                modalities=MODALITIES["text_and_audio"],
+                turn_detection=openai.realtime.ServerVadOptions(
+                    threshold=0.4,
+                    prefix_padding_ms=200,
+                    silence_duration_ms=500,
+                ),
             )
         )
-
-    turn_detection = None
-    if data.get("turn_detection"):
-        turn_detection_json = json.loads(data.get("turn_detection"))
-        turn_detection = openai.realtime.ServerVadOptions(
-            threshold=turn_detection_json.get("threshold", 0.4),
-            prefix_padding_ms=turn_detection_json.get("prefix_padding_ms", 200),
-            silence_duration_ms=turn_detection_json.get("silence_duration_ms", 500),
-        )
-    else:
-        turn_detection = openai.realtime.ServerVadOptions(
-            threshold=0.4,
-            prefix_padding_ms=200,
-            silence_duration_ms=500,
-        )
-
-    config = SessionConfig(
-        openai_api_key=data.get("openai_api_key", os.environ.get("OPENAI_API_KEY", "")),
-        instructions=data.get("instructions", ERP_CONSULTANT_INSTRUCTIONS),
-        voice=data.get("voice", "nova"),
-        temperature=float(data.get("temperature", 0.85)),
-        max_response_output_tokens=data.get("max_output_tokens")
-        if data.get("max_output_tokens") == "inf"
-        else int(data.get("max_output_tokens") or "inf"),
-        modalities=SessionConfig._modalities_from_string(
-            data.get("modalities", "text_and_audio")
-        ),
-        turn_detection=turn_detection,
-    )
-    return config
-
-
-# ERP consultant instructions
-ERP_CONSULTANT_INSTRUCTIONS = """You are a technology consultant specializing in ERP system design. Your task is
-to have a friendly conversation with the client, with the overall goal of
-gathering all necessary information. You must obtain information about the
-following points, but it's very important that the conversation feels natural,
-and that you answer any question the customer has about how we work (you can
-make up the details) and recommendations about the system.
-
-When the user asks you to save a title for the conversation, use the saveTitle
-tool to store their preferred title. For example, if they say "Please save this
-conversation with the title 'ERP Planning for Acme Corp'", you should use the
-tool to save that title.
-
-When the user wants to end the conversation, use the finishConversation tool to
-save the transcript and conclude the session. The user might say something like
-"Let's finish our conversation" or "Please save our conversation".
-
-Use un lenguaje y acento bien argentinos, con expresiones típicas locales."""
+    return _config_parser
 
 
 async def save_title(title: str) -> str:
@@ -152,36 +76,23 @@ async def save_title(title: str) -> str:
     return f"Title '{title}' has been saved successfully for future reference."
 
 
-async def finish_conversation(filename: Optional[str] = None) -> str:
-    """Save the conversation transcript to a file and end the conversation."""
+async def finish_conversation(session_id: str, filename: Optional[str] = None) -> str:
+    """Close the streamed conversation transcript and end the conversation."""
     logger.info(f"\n=== TOOL CALLED: finishConversation ===")
-    
-    # Create a default filename if not provided
-    actual_filename = filename if filename else f"conversation-transcript-{int(datetime.datetime.now().timestamp()*1000)}.txt"
-    file_path = os.path.join(os.getcwd(), actual_filename)
-    
-    # Format the transcript
-    transcript = "CONVERSATION TRANSCRIPT\n"
-    transcript += "=======================\n\n"
-    transcript += f"Date: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-    transcript += f"Total exchanges: {len(conversation_history)}\n\n"
-    
-    # Add conversation content
-    for i, entry in enumerate(conversation_history):
-        transcript += f"[{entry['timestamp']}] {entry['speaker']}: {entry['text']}\n"
-        
-        # Add a blank line between exchanges for readability
-        if i < len(conversation_history) - 1 and entry['speaker'] != conversation_history[i+1]['speaker']:
-            transcript += "\n"
-    
-    # Save the file
+
+    writer = transcripts.writer(session_id)
+    if writer is None or writer.closed:
+        logger.error(f"No open transcript for session: {session_id}")
+        return "There was an error saving the transcript."
+
+    # Utterances are already on disk, we only need to write the footer and close the file
+    rename_to = os.path.join(os.getcwd(), filename) if filename else None
     try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(transcript)
+        file_path = await asyncio.wrap_future(writer.close(rename_to=rename_to))
         logger.info(f"Saved conversation transcript to: {file_path}")
         logger.info("===============================\n")
         
-        return f"Conversation transcript has been saved to {actual_filename}. Thank you for using our ERP consultation service!"
+        return f"Conversation transcript has been saved to {os.path.basename(file_path)}. Thank you for using our ERP consultation service!"
     except Exception as e:
         logger.error(f"Error saving transcript: {e}")
         return "There was an error saving the transcript."
@@ -190,6 +101,33 @@ async def finish_conversation(filename: Optional[str] = None) -> str:
 async def entrypoint(ctx: JobContext):
     logger.info(f"connecting to room {ctx.room.name}")
     await ctx.connect(auto_subscribe=AutoSubscribe.AUDIO_ONLY)
+    get_worker_load().track_session(ctx)
+    start_metrics_export()
+    # Structured rows by default, AGENT_TRANSCRIPT_FORMAT=text for the old text file
+    transcript_format = os.environ.get("AGENT_TRANSCRIPT_FORMAT", "jsonl")
+    transcripts.open(
+        ctx.room.name,
+        TranscriptWriter(
+            os.path.join(os.getcwd(), transcript_filename(ctx.room.name, transcript_format)),
+            ctx.room.name,
+            format=transcript_format,
+        ),
+    )
+
+    # Auto-save the transcript when the job ends, also if nobody ever joined
+    async def release_transcript():
+        from transcript_index import index_finished_session
+
+        logger.info(f"Job for room {ctx.room.name} ending, releasing its transcript")
+        writer = transcripts.writer(ctx.room.name)
+        index_finished_session(ctx.room.name, transcripts.release(ctx.room.name))
+
+        # Close the transcript if it has content and was not finished explicitly
+        if writer and writer.exchanges and not writer.closed:
+            footer = f"AUTO-SAVED ON DISCONNECT ({datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')})"
+            writer.close(footer=footer).add_done_callback(on_auto_saved)
+
+    ctx.add_shutdown_callback(release_transcript)
 
     # Wait for the user to join
     participant = await ctx.wait_for_participant()
@@ -202,17 +140,30 @@ async def entrypoint(ctx: JobContext):
     
     # Stay alive until disconnected
     exit_event = asyncio.Event()
+    ctx.room.on("disconnected", lambda *_: exit_event.set())
     await exit_event.wait()
 
 
+def on_auto_saved(future):
+    if future.exception() is None:
+        logger.info(f"Auto-saved conversation transcript to: {future.result()}")
+    logger.info(f"Background writer stats: {get_writer().stats()}")
+
+
 def run_multimodal_agent(ctx: JobContext, participant: rtc.Participant):
+    from livekit.agents.multimodal import MultimodalAgent
+
+    config_parser = get_config_parser()
     # Parse metadata for configuration or use defaults
     try:
-        metadata = json.loads(participant.metadata) if participant.metadata else {}
-    except:
-        metadata = {}
+        config = config_parser.parse(participant.metadata)
+    except ValueError as e:
+        logger.warning(f"Invalid session config in metadata, using defaults: {e}")
+        config = config_parser.defaults
+    if config is config_parser.defaults:
+        logger.info("No session config provided, using defaults")
     
-    config = parse_session_config(metadata)
+    session_id = ctx.room.name
     logger.info(f"starting MultimodalAgent with config: {config.to_dict()}")
 
     if not config.openai_api_key:
@@ -228,7 +179,7 @@ def run_multimodal_agent(ctx: JobContext, participant: rtc.Participant):
         voice=config.voice,
         temperature=config.temperature,
         max_response_output_tokens=config.max_response_output_tokens,
-        modalities=config.modalities,
+        modalities=list(config.modalities),
         turn_detection=config.turn_detection,
         input_audio_transcription={
             "model": "whisper-1"
@@ -269,6 +220,7 @@ def run_multimodal_agent(ctx: JobContext, participant: rtc.Participant):
     assistant = MultimodalAgent(model=model)
     assistant.start(ctx.room)
     session = model.sessions[0]
+    track_turns(session_id, session, assistant)
 
     # Register function handlers
     @session.on("function_call.saveTitle")
@@ -281,10 +233,10 @@ def run_multimodal_agent(ctx: JobContext, participant: rtc.Participant):
     async def on_finish_conversation(params):
         logger.info(f"Function call finishConversation with params: {params}")
         filename = params.get("filename")
-        return await finish_conversation(filename)
+        return await finish_conversation(session_id, filename)
 
     # Initial prompt to start the conversation
-    if config.modalities == ["text", "audio"]:
+    if config.modalities == MODALITIES["text_and_audio"]:
         session.conversation.item.create(
             llm.ChatMessage(
                 role="user",
@@ -297,13 +249,13 @@ def run_multimodal_agent(ctx: JobContext, participant: rtc.Participant):
     @session.on("input_speech_transcription_completed")
     def on_input_speech_transcription_completed(event: openai.realtime.InputTranscriptionCompleted):
         logger.info(f"User speech transcribed: {event.text}")
-        record_speech("User", event.text)
+        record_speech(session_id, "User", event.text)
 
     @session.on("response.content.text")
     def on_response_text(content):
         if hasattr(content, 'text') and content.text:
             logger.info(f"AI response text: {content.text}")
-            record_speech("AI", content.text)
+            record_speech(session_id, "AI", content.text)
 
     @session.on("response_done")
     def on_response_done(response: openai.realtime.RealtimeResponse):
@@ -311,38 +263,17 @@ def run_multimodal_agent(ctx: JobContext, participant: rtc.Participant):
         try:
             if hasattr(response, 'transcript') and response.transcript:
                 logger.info(f"Response transcript: {response.transcript}")
-                record_speech("AI", response.transcript)
+                record_speech(session_id, "AI", response.transcript)
         except Exception as e:
             logger.error(f"Error processing response transcript: {e}")
 
-    # Auto-save the transcript on room disconnection
-    @ctx.room.on("disconnected")
-    def on_disconnected():
-        logger.info("Room disconnected")
-        
-        # Save transcript if we have content
-        if conversation_history:
-            filename = f"auto-saved-transcript-{int(datetime.datetime.now().timestamp()*1000)}.txt"
-            file_path = os.path.join(os.getcwd(), filename)
-            
-            transcript = "AUTO-SAVED CONVERSATION TRANSCRIPT\n"
-            transcript += "=================================\n\n"
-            transcript += f"Date: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-            transcript += f"Room: {ctx.room.name}\n"
-            transcript += f"Total exchanges: {len(conversation_history)}\n\n"
-            
-            for entry in conversation_history:
-                transcript += f"[{entry['timestamp']}] {entry['speaker']}: {entry['text']}\n\n"
-            
-            try:
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(transcript)
-                logger.info(f"Auto-saved conversation transcript to: {file_path}")
-            except Exception as e:
-                logger.error(f"Error auto-saving transcript: {e}")
-
 
 if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    # Job processes inherit the environment, only the worker needs to load .env
+    load_dotenv()
+
     # Configure logging to display more information
     logging.basicConfig(
         level=logging.INFO,
@@ -355,9 +286,9 @@ if __name__ == "__main__":
         logger.warning("OPENAI_API_KEY environment variable not set")
         
     # Configure worker options
-    options = WorkerOptions(
+    options = worker_options(
         entrypoint_fnc=entrypoint, 
-        worker_type=WorkerType.ROOM,
+        prewarm_fnc=prewarm_hook(get_config_parser),
         api_key=os.environ.get("LIVEKIT_API_KEY", "devkey"),
         api_secret=os.environ.get("LIVEKIT_API_SECRET", "devsecret"),
         ws_url=os.environ.get("LIVEKIT_URL", "ws://localhost:7880"),
@@ -0,0 +1,346 @@
+"""Typed, indexed view of an `erp_design` produced by the designer graph.
+
+Usage:
+    python scripts/erp_design.py system_design_example.json
+    python scripts/erp_design.py system_design_example.json --column id_empleado
+
+Column strings like "id_empleado (INT)" and module table strings like
+"InventoryItems: { id, name, quantity }" are parsed once when the design is
+loaded. Tables are indexed by name, columns by name across tables, and
+foreign keys are inferred from key column names, so lookups such as "which
+tables reference id_empleado" are dictionary hits. `to_dict` gives back the
+original structure.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from state_export import StateExport
+
+# "name (TYPE)", where TYPE may carry one parenthesised group: "precio (DECIMAL(10,2))"
+COLUMN_PATTERN = re.compile(r"^\s*(.+?)\s*\(\s*([^()]*?(?:\([^()]*\))?)\s*\)\s*$")
+TABLE_SPEC_PATTERN = re.compile(r"^\s*([^:{]+?)\s*:\s*\{(.*)\}\s*$", re.S)
+
+
+class Column:
+    __slots__ = ("name", "type")
+
+    def __init__(self, name: str, type: Optional[str] = None):
+        self.name = name
+        self.type = type
+
+    @classmethod
+    def parse(cls, raw: str) -> "Column":
+        match = COLUMN_PATTERN.match(raw)
+        if match:
+            return cls(match.group(1), match.group(2).upper() or None)
+        return cls(raw.strip())
+
+    def to_raw(self) -> str:
+        return f"{self.name} ({self.type})" if self.type else self.name
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Column) and (self.name, self.type) == (other.name, other.type)
+
+    def __hash__(self) -> int:
+        return hash((self.name, self.type))
+
+    def __repr__(self) -> str:
+        return f"Column({self.to_raw()!r})"
+
+
+class Table:
+    """A table and its columns. `module` is set for tables only listed in a module."""
+
+    __slots__ = ("name", "columns", "description", "module", "extra", "_by_name")
+
+    def __init__(
+        self,
+        name: str,
+        columns: Iterable[Column] = (),
+        description: str = "",
+        module: Optional[str] = None,
+        extra: Optional[Dict[str, Any]] = None,
+    ):
+        self.name = name
+        self.columns: List[Column] = list(columns)
+        self.description = description
+        self.module = module
+        self.extra = extra or {}
+        self._by_name = {column.name: column for column in self.columns}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Table":
+        extra = {key: value for key, value in data.items() if key not in ("name", "columns", "description")}
+        return cls(
+            data.get("name", ""),
+            (Column.parse(raw) for raw in data.get("columns", ()) if isinstance(raw, str)),
+            data.get("description", ""),
+            extra=extra,
+        )
+
+    @classmethod
+    def parse_spec(cls, spec: str, module: Optional[str] = None) -> Optional["Table"]:
+        """Table from a module's "Name: { col, col }" string, or None if it isn't one."""
+        match = TABLE_SPEC_PATTERN.match(spec)
+        if not match:
+            return None
+        columns = (Column.parse(raw) for raw in match.group(2).split(",") if raw.strip())
+        return cls(match.group(1), columns, module=module)
+
+    def column(self, name: str) -> Optional[Column]:
+        return self._by_name.get(name)
+
+    @property
+    def primary_key(self) -> Optional[Column]:
+        """The first column, when it looks like an id ("id", "id_x" or "x_id")."""
+        if self.columns and _is_id_name(self.columns[0].name):
+            return self.columns[0]
+        return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {"name": self.name, "columns": [column.to_raw() for column in self.columns]}
+        if self.description:
+            data["description"] = self.description
+        data.update(self.extra)
+        return data
+
+    def __repr__(self) -> str:
+        return f"Table({self.name!r}, {len(self.columns)} columns)"
+
+
+class ForeignKey:
+    __slots__ = ("table", "column", "ref_table", "ref_column")
+
+    def __init__(self, table: str, column: str, ref_table: str, ref_column: str):
+        self.table = table
+        self.column = column
+        self.ref_table = ref_table
+        self.ref_column = ref_column
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, ForeignKey) and self._key() == other._key()
+
+    def __hash__(self) -> int:
+        return hash(self._key())
+
+    def _key(self) -> Tuple[str, str, str, str]:
+        return (self.table, self.column, self.ref_table, self.ref_column)
+
+    def __repr__(self) -> str:
+        return f"ForeignKey({self.table}.{self.column} -> {self.ref_table}.{self.ref_column})"
+
+
+def _is_id_name(name: str) -> bool:
+    name = name.lower()
+    return name == "id" or name.startswith("id_") or name.endswith("_id")
+
+
+def _snake(name: str) -> str:
+    name = re.sub(r"(?<=[a-z0-9])(?=[A-Z])", "_", name.strip())
+    return re.sub(r"[^0-9a-zA-Z_]+", "_", name).strip("_").lower()
+
+
+def _singulars(word: str) -> List[str]:
+    forms = [word]
+    if word.endswith("es"):
+        forms.append(word[:-2])
+    if word.endswith("s"):
+        forms.append(word[:-1])
+    return forms
+
+
+def _table_aliases(table_name: str) -> List[str]:
+    """Names other tables may use for this one in "id_<alias>" / "<alias>_id" columns."""
+    snake = _snake(table_name)
+    aliases = _singulars(snake)
+    words = snake.split("_")
+    if len(words) > 1:
+        aliases += _singulars(words[-1])
+    return aliases
+
+
+class ERPDesign:
+    """Parsed erp_design with indexes by table, column and foreign key."""
+
+    __slots__ = (
+        "tables",
+        "actions",
+        "views",
+        "modules",
+        "extra",
+        "_tables",
+        "_tables_folded",
+        "_columns",
+        "_foreign_keys",
+        "_references_from",
+        "_references_to",
+    )
+
+    def __init__(
+        self,
+        tables: Iterable[Table] = (),
+        actions: Optional[List[Dict[str, Any]]] = None,
+        views: Optional[List[Dict[str, Any]]] = None,
+        modules: Optional[List[Dict[str, Any]]] = None,
+        extra: Optional[Dict[str, Any]] = None,
+    ):
+        self.tables: List[Table] = list(tables)
+        self.actions = actions
+        self.views = views
+        self.modules = modules
+        self.extra = extra or {}
+        self._index()
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ERPDesign":
+        tables = [Table.from_dict(item) for item in data.get("tables") or () if isinstance(item, dict)]
+        known = {table.name for table in tables}
+        for module in data.get("modules") or ():
+            if not isinstance(module, dict):
+                continue
+            for spec in module.get("tables_and_columns") or ():
+                table = Table.parse_spec(spec, module.get("name")) if isinstance(spec, str) else None
+                if table is not None and table.name not in known:
+                    known.add(table.name)
+                    tables.append(table)
+
+        extra = {
+            key: value
+            for key, value in data.items()
+            if key not in ("tables", "actions", "views", "modules")
+        }
+        return cls(tables, data.get("actions"), data.get("views"), data.get("modules"), extra)
+
+    @classmethod
+    def from_json(cls, text: str | bytes) -> "ERPDesign":
+        return cls.from_dict(json.loads(text))
+
+    def to_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {}
+        declared = [table.to_dict() for table in self.tables if table.module is None]
+        if declared:
+            data["tables"] = declared
+        for key in ("actions", "views", "modules"):
+            value = getattr(self, key)
+            if value is not None:
+                data[key] = value
+        data.update(self.extra)
+        return data
+
+    def to_json(self, **kwargs: Any) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, **kwargs)
+
+    def _index(self) -> None:
+        self._tables: Dict[str, Table] = {}
+        self._tables_folded: Dict[str, Table] = {}
+        self._columns: Dict[str, List[Table]] = {}
+        for table in self.tables:
+            self._tables.setdefault(table.name, table)
+            self._tables_folded.setdefault(table.name.casefold(), table)
+            for column in table.columns:
+                self._columns.setdefault(column.name, []).append(table)
+
+        self._foreign_keys = self._infer_foreign_keys()
+        self._references_from: Dict[str, List[ForeignKey]] = {}
+        self._references_to: Dict[str, List[ForeignKey]] = {}
+        for fk in self._foreign_keys:
+            self._references_from.setdefault(fk.table, []).append(fk)
+            self._references_to.setdefault(fk.ref_table, []).append(fk)
+
+    def _infer_foreign_keys(self) -> List[ForeignKey]:
+        # Named keys ("id_empleado") are matched by exact column name
+        owners: Dict[str, Table] = {}
+        # Plain "id" keys are matched through aliases of the table name ("item_id")
+        aliases: Dict[str, Optional[Table]] = {}
+        for table in self.tables:
+            key = table.primary_key
+            if key is None:
+                continue
+            if key.name.lower() == "id":
+                for alias in _table_aliases(table.name):
+                    # An alias shared by two tables is ambiguous, drop it
+                    aliases[alias] = table if aliases.get(alias, table) is table else None
+            else:
+                owners.setdefault(key.name, table)
+
+        foreign_keys = []
+        for table in self.tables:
+            key = table.primary_key
+            for column in table.columns:
+                if column is key or not _is_id_name(column.name):
+                    continue
+                target = owners.get(column.name)
+                if target is None:
+                    lowered = column.name.lower()
+                    stem = lowered[3:] if lowered.startswith("id_") else lowered[:-3]
+                    target = aliases.get(stem)
+                if target is not None and target is not table:
+                    foreign_keys.append(
+                        ForeignKey(table.name, column.name, target.name, target.primary_key.name)
+                    )
+        return foreign_keys
+
+    def table(self, name: str) -> Optional[Table]:
+        """Table by name, falling back to a case-insensitive match."""
+        return self._tables.get(name) or self._tables_folded.get(name.casefold())
+
+    def tables_with_column(self, name: str) -> List[Table]:
+        return list(self._columns.get(name, ()))
+
+    @property
+    def foreign_keys(self) -> List[ForeignKey]:
+        return list(self._foreign_keys)
+
+    def references_from(self, table: str) -> List[ForeignKey]:
+        """Foreign keys declared by `table`."""
+        return list(self._references_from.get(table, ()))
+
+    def references_to(self, table: str) -> List[ForeignKey]:
+        """Foreign keys in other tables that point at `table`."""
+        return list(self._references_to.get(table, ()))
+
+    def __iter__(self) -> Iterator[Table]:
+        return iter(self.tables)
+
+    def __len__(self) -> int:
+        return len(self.tables)
+
+    def __contains__(self, name: str) -> bool:
+        return self.table(name) is not None
+
+
+def load_design(path: str) -> ERPDesign:
+    """Design from a file holding either an erp_design or a thread state with values.erp_design."""
+    # Thread exports carry the whole conversation; parse only the design
+    with StateExport(path) as export:
+        if "values.erp_design" in export:
+            return ERPDesign.from_dict(export.get("values.erp_design"))
+        return ERPDesign.from_dict(export.load())
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--column", help="list the tables with this column instead")
+    args = parser.parse_args()
+
+    design = load_design(args.path)
+    if args.column:
+        for table in design.tables_with_column(args.column):
+            print(f"{table.name}.{table.column(args.column).to_raw()}")
+        return 0
+
+    for table in design:
+        print(f"{table.name} ({len(table.columns)} columns)")
+        for fk in design.references_from(table.name):
+            print(f"  {fk.column} -> {fk.ref_table}.{fk.ref_column}")
+    print(f"{len(design)} tables, {len(design.foreign_keys)} foreign keys")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
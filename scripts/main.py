@@ -3,35 +3,63 @@ from __future__ import annotations
 import asyncio
 import json
 import logging
+import os
+import time
 import uuid
-from dataclasses import asdict, dataclass
-from typing import Any, Dict, Literal, Annotated, Optional
+from typing import TYPE_CHECKING, Literal, Annotated, Optional
 
 from livekit import rtc
 from livekit.agents import (
     AutoSubscribe,
     JobContext,
-    WorkerOptions,
-    WorkerType,
     cli,
     llm,
 )
-from livekit.agents.multimodal import MultimodalAgent
+# Plugins register themselves on import, which livekit-agents only allows on the main thread
 from livekit.plugins import openai
 
-from dotenv import load_dotenv
-
-load_dotenv()
+from realtime_prewarm import (
+    PrewarmedAgent,
+    measure_time_to_first_audio,
+    prewarm_agent,
+    prewarm_enabled,
+)
+from room_index import RoomIndex
+from rpc_client import RoomRpcClient
+from session_config import MODALITIES, SessionConfig, SessionConfigParser
+from session_updater import SessionUpdater
+from startup import prewarm_hook
+from transcript_store import TranscriptStore, render_transcript
+from transcription_publisher import TranscriptionPublisher
+from turn_latency import start_metrics_export, track_turns
+from worker_load import get_worker_load, worker_options
+
+if TYPE_CHECKING:
+    from design_jobs import DesignJob
 
 logger = logging.getLogger("my-worker")
 logger.setLevel(logging.INFO)
 
+# Conversation history per room, handed to the designer when the conversation finishes
+transcripts = TranscriptStore()
+
+
+def design_handoff_enabled() -> bool:
+    return os.environ.get("AGENT_DESIGN_HANDOFF", "0") == "1"
+
 # Define function context for our ERP designer agent
 class ERPDesignerFunctions(llm.FunctionContext):
     def __init__(self, job_context: JobContext = None):
         super().__init__()
         self.job_context = job_context
         self.participant = None
+        self.company_name = ""
+        self.owner_name = ""
+        self.rpc = (
+            RoomRpcClient(job_context.room.local_participant, room=job_context.room.name)
+            if job_context
+            else None
+        )
         self.logger = logging.getLogger("erp-functions")
         self.logger.setLevel(logging.INFO)
 
@@ -50,23 +78,31 @@ class ERPDesignerFunctions(llm.FunctionContext):
         ],
     ) -> str:
         """Finalizar la conversación y comenzar el proceso de diseño del sistema ERP con el nombre de la empresa y el dueño."""
-        if not self.participant or not self.job_context:
+        if not self.participant or not self.rpc:
             self.logger.error("No participant or job context available for RPC")
             return "Error: No se pudo finalizar la conversación. Falta información del participante."
         
         self.logger.info(f"Finishing conversation with company: {companyName}, owner: {ownerName}")
+        self.company_name = companyName
+        self.owner_name = ownerName
+
+        if design_handoff_enabled():
+            return await self._hand_off_design(companyName, ownerName)
         
         try:
             # Forward the function call to the frontend via RPC
             self.logger.info(f"Forwarding function call to frontend for participant: {self.participant.identity}")
-            response = await self.job_context.room.local_participant.perform_rpc(
+            response = await self.rpc.call(
                 destination_identity=self.participant.identity,
                 method="function_call.finishConversation",
                 payload=json.dumps({
                     "companyName": companyName,
                     "ownerName": ownerName
                 }),
-                response_timeout=90.0  # Give it plenty of time since design generation might take time
+                # Give it plenty of time since design generation might take time
+                timeout=float(os.environ.get("AGENT_FINISH_RPC_TIMEOUT", 90.0)),
+                # A timed out request may still have started design generation
+                idempotent=False,
             )
             
             self.logger.info(f"RPC response received: {response}")
@@ -75,6 +111,43 @@ class ERPDesignerFunctions(llm.FunctionContext):
             self.logger.error(f"Error in finishConversation: {str(e)}")
             return "Ha ocurrido un error al intentar finalizar la conversación. Por favor intente nuevamente."
 
+    async def _hand_off_design(self, companyName: str, ownerName: str) -> str:
+        """Queue design generation and return right away, updates reach the frontend later."""
+        from design_jobs import DesignJob, get_design_runner
+
+        room = self.job_context.room.name
+        job = DesignJob(
+            company_name=companyName,
+            owner_name=ownerName,
+            transcript=render_transcript(transcripts.get(room)),
+            room=room,
+        )
+        loop = asyncio.get_running_loop()
+        try:
+            job_id = await get_design_runner().submit(
+                job, on_update=lambda job: loop.call_soon_threadsafe(self._send_job_update, job)
+            )
+        except Exception as e:
+            self.logger.error(f"Error queueing design job: {str(e)}")
+            return "Ha ocurrido un error al intentar finalizar la conversación. Por favor intente nuevamente."
+        self.logger.info(f"Queued design job {job_id} for {companyName}")
+        return f"He finalizado la conversación y he comenzado el proceso de diseño para {companyName} (trabajo {job_id}). Gracias por su tiempo, {ownerName}."
+
+    def _send_job_update(self, job: DesignJob):
+        self.rpc.notify(
+            destination_identity=self.participant.identity,
+            method="designer.jobUpdate",
+            payload=json.dumps({
+                "jobId": job.job_id,
+                "status": job.status,
+                "threadId": job.thread_id,
+                "companyName": job.company_name,
+                "ownerName": job.owner_name,
+                "error": job.error,
+            }),
+            timeout=5.0,
+        )
+
     """ @llm.ai_callable()
     async def debug(
         self,
@@ -85,7 +158,7 @@ class ERPDesignerFunctions(llm.FunctionContext):
         """
     #Enviar información de depuración al sistema para diagnóstico.
     """
-        if not self.participant or not self.job_context:
+        if not self.participant or not self.rpc:
             return "Error: No se pudo enviar información de depuración."
         
         try:
@@ -103,114 +176,134 @@ class ERPDesignerFunctions(llm.FunctionContext):
             self.logger.error(f"Error in debug function: {str(e)}")
             return "Error al enviar información de depuración."
  """
-@dataclass
-class SessionConfig:
-    openai_api_key: str
-    instructions: str
-    voice: openai.realtime.api_proto.Voice
-    temperature: float
-    max_response_output_tokens: str | int
-    modalities: list[openai.realtime.api_proto.Modality]
-    turn_detection: openai.realtime.ServerVadOptions
-
-    def __post_init__(self):
-        if self.modalities is None:
-            self.modalities = self._modalities_from_string("text_and_audio")
-
-    def to_dict(self):
-        return {k: v for k, v in asdict(self).items() if k != "openai_api_key"}
-
-    @staticmethod
-    def _modalities_from_string(modalities: str) -> list[str]:
-        modalities_map = {
-            "text_and_audio": ["text", "audio"],
-            "text_only": ["text"],
-        }
-        return modalities_map.get(modalities, ["text", "audio"])
-
-    def __eq__(self, other: SessionConfig) -> bool:
-        return self.to_dict() == other.to_dict()
-
-
-def parse_session_config(data: Dict[str, Any]) -> SessionConfig:
-    turn_detection = None
-
-    if data.get("turn_detection"):
-        turn_detection_json = json.loads(data.get("turn_detection"))
-        turn_detection = openai.realtime.ServerVadOptions(
-            threshold=turn_detection_json.get("threshold", 0.5),
-            prefix_padding_ms=turn_detection_json.get("prefix_padding_ms", 200),
-            silence_duration_ms=turn_detection_json.get("silence_duration_ms", 300),
+_config_parser: Optional[SessionConfigParser] = None
+
+
+def get_config_parser() -> SessionConfigParser:
+    """Session config parser with the playground defaults, built on first use."""
+    global _config_parser
+    if _config_parser is None:
+        _config_parser = SessionConfigParser(
+            SessionConfig(
+                openai_api_key="",
+                instructions="",
+                voice="alloy",
+                temperature=0.8,
+                max_response_output_tokens=2048,
+                modalities=MODALITIES["text_and_audio"],
+                turn_detection=openai.realtime.DEFAULT_SERVER_VAD_OPTIONS,
+            )
         )
-    else:
-        turn_detection = openai.realtime.DEFAULT_SERVER_VAD_OPTIONS
-
-    config = SessionConfig(
-        openai_api_key=data.get("openai_api_key", ""),
-        instructions=data.get("instructions", ""),
-        voice=data.get("voice", "alloy"),
-        temperature=float(data.get("temperature", 0.8)),
-        max_response_output_tokens=data.get("max_output_tokens")
-        if data.get("max_output_tokens") == "inf"
-        else int(data.get("max_output_tokens") or 2048),
-        modalities=SessionConfig._modalities_from_string(
-            data.get("modalities", "text_and_audio")
-        ),
-        turn_detection=turn_detection,
-    )
-    return config
+    return _config_parser
 
 
 async def entrypoint(ctx: JobContext):
     logger.info(f"connecting to room {ctx.room.name}")
     await ctx.connect(auto_subscribe=AutoSubscribe.AUDIO_ONLY)
-
-    participant = await ctx.wait_for_participant()
+    get_worker_load().track_session(ctx)
+    start_metrics_export()
+    transcripts.open(ctx.room.name)
 
     # Create function context with job context
     fnc_ctx = ERPDesignerFunctions(ctx)
+
+    async def release_transcript():
+        from transcript_index import index_finished_session
+
+        index_finished_session(
+            ctx.room.name,
+            transcripts.release(ctx.room.name),
+            company_name=fnc_ctx.company_name,
+            owner_name=fnc_ctx.owner_name,
+        )
+
+    ctx.add_shutdown_callback(release_transcript)
+
+    # Open the realtime session with the default config while we wait for the user
+    prewarmed = None
+    if prewarm_enabled():
+        prewarmed = prewarm_agent(
+            ctx,
+            get_config_parser().defaults.with_api_key(os.environ.get("OPENAI_API_KEY", "")),
+            fnc_ctx,
+            build_model,
+        )
+        # Covers rooms that end before anyone joins; the session dies with the room anyway
+        ctx.add_shutdown_callback(prewarmed.aclose)
+
+    participant = await ctx.wait_for_participant()
     
     # Set participant in function context
     fnc_ctx.set_participant(participant)
     
     # Run agent with function context
-    run_multimodal_agent(ctx, participant, fnc_ctx)
+    run_multimodal_agent(ctx, participant, fnc_ctx, prewarmed)
 
     logger.info("agent started")
 
 
-def run_multimodal_agent(ctx: JobContext, participant: rtc.Participant, fnc_ctx: ERPDesignerFunctions):
-    metadata = json.loads(participant.metadata)
-    config = parse_session_config(metadata)
+def build_model(config: SessionConfig) -> openai.realtime.RealtimeModel:
+    return openai.realtime.RealtimeModel(
+        api_key=config.openai_api_key,
+        instructions=config.instructions,
+        voice=config.voice,
+        temperature=config.temperature,
+        max_response_output_tokens=config.max_response_output_tokens,
+        modalities=list(config.modalities),
+        turn_detection=config.turn_detection,
+    )
+
+
+def run_multimodal_agent(
+    ctx: JobContext,
+    participant: rtc.Participant,
+    fnc_ctx: ERPDesignerFunctions,
+    prewarmed: Optional[PrewarmedAgent] = None,
+):
+    from livekit.agents.multimodal import MultimodalAgent
+
+    joined_at = time.perf_counter()
+    config_parser = get_config_parser()
+    config = config_parser.parse(participant.metadata)
 
     logger.info(f"starting MultimodalAgent with config: {config.to_dict()}")
 
     if not config.openai_api_key:
+        if prewarmed:
+            prewarmed.close()
         raise Exception("OpenAI API Key is required")
     
-    # Get instructions from metadata
-    instructions = metadata.get("instructions", "")
-    
     # Log available functions without calling list_functions()
     logger.info("Function context initialized with AI callable functions")
     logger.info("Available functions: finishConversation, debug")
     
-    model = openai.realtime.RealtimeModel(
-        api_key=config.openai_api_key,
-        instructions=instructions,
-        voice=config.voice,
-        temperature=config.temperature,
-        max_response_output_tokens=config.max_response_output_tokens,
-        modalities=config.modalities,
-        turn_detection=config.turn_detection,
-    )
-    
-    # Pass function context to MultimodalAgent as per documentation
-    assistant = MultimodalAgent(model=model, fnc_ctx=fnc_ctx)
-    assistant.start(ctx.room)
+    if prewarmed and prewarmed.adopt(config):
+        logger.info(
+            f"using prewarmed session, ready {(joined_at - prewarmed.started_at) * 1000:.0f}ms before the participant joined"
+        )
+        model = prewarmed.model
+        assistant = prewarmed.start(ctx.room)
+    else:
+        model = build_model(config)
+
+        # Pass function context to MultimodalAgent as per documentation
+        assistant = MultimodalAgent(model=model, fnc_ctx=fnc_ctx)
+        assistant.start(ctx.room)
     session = model.sessions[0]
+    measure_time_to_first_audio(assistant, joined_at, ctx.room.name)
+    track_turns(ctx.room.name, session, assistant)
 
-    if config.modalities == ["text", "audio"]:
+    @assistant.on("user_speech_committed")
+    def on_user_speech_committed(msg: llm.ChatMessage):
+        if isinstance(msg.content, str) and msg.content.strip():
+            transcripts.append(ctx.room.name, "User", msg.content)
+
+    @assistant.on("agent_speech_committed")
+    def on_agent_speech_committed(msg: llm.ChatMessage):
+        if isinstance(msg.content, str) and msg.content.strip():
+            transcripts.append(ctx.room.name, "AI", msg.content)
+
+    if config.modalities == MODALITIES["text_and_audio"]:
         session.conversation.item.create(
             llm.ChatMessage(
                 role="user",
@@ -221,6 +314,8 @@ def run_multimodal_agent(ctx: JobContext, participant: rtc.Participant, fnc_ctx:
 
     # Note: We don't need to manually register function handlers here
     # The llm.ai_callable decorator takes care of registering them
+
+    updater = SessionUpdater(session, config)
     
     @ctx.room.local_participant.register_rpc_method("pg.updateConfig")
     async def update_config(
@@ -229,19 +324,11 @@ def run_multimodal_agent(ctx: JobContext, participant: rtc.Participant, fnc_ctx:
         if data.caller_identity != participant.identity:
             return
 
-        new_config = parse_session_config(json.loads(data.payload))
-        if config != new_config:
+        new_config = config_parser.parse(data.payload)
+        changes = updater.request(new_config)
+        if changes:
             logger.info(
-                f"config changed: {new_config.to_dict()}, participant: {participant.identity}"
-            )
-            session = model.sessions[0]
-            session.session_update(
-                instructions=new_config.instructions,
-                voice=new_config.voice,
-                temperature=new_config.temperature,
-                max_response_output_tokens=new_config.max_response_output_tokens,
-                turn_detection=new_config.turn_detection,
-                modalities=new_config.modalities,
+                f"config changed: {sorted(changes)}, participant: {participant.identity}"
             )
             return json.dumps({"changed": True})
         else:
@@ -287,76 +374,48 @@ def run_multimodal_agent(ctx: JobContext, participant: rtc.Participant, fnc_ctx:
         else:
             return
 
-        asyncio.create_task(show_toast(title, description, variant))
+        show_toast(title, description, variant)
 
-    async def send_transcription(
-        ctx: JobContext,
-        participant: rtc.Participant,
-        track_sid: str,
-        segment_id: str,
-        text: str,
-        is_final: bool = True,
-    ):
-        transcription = rtc.Transcription(
-            participant_identity=participant.identity,
-            track_sid=track_sid,
-            segments=[
-                rtc.TranscriptionSegment(
-                    id=segment_id,
-                    text=text,
-                    start_time=0,
-                    end_time=0,
-                    language="en",
-                    final=is_final,
-                )
-            ],
-        )
-        await ctx.room.local_participant.publish_transcription(transcription)
-
-    async def show_toast(
+    def show_toast(
         title: str,
         description: str | None,
         variant: Literal["default", "success", "warning", "destructive"],
     ):
-        await ctx.room.local_participant.perform_rpc(
+        fnc_ctx.rpc.notify(
             destination_identity=participant.identity,
             method="pg.toast",
             payload=json.dumps(
                 {"title": title, "description": description, "variant": variant}
             ),
+            timeout=5.0,
         )
 
+    ctx.add_shutdown_callback(fnc_ctx.rpc.aclose)
+
+    room_index = RoomIndex(ctx.room)
+    publisher = TranscriptionPublisher(ctx.room)
+    ctx.add_shutdown_callback(publisher.aclose)
+
     last_transcript_id = None
 
     # send three dots when the user starts talking. will be cleared later when a real transcription is sent.
     @session.on("input_speech_started")
     def on_input_speech_started():
         nonlocal last_transcript_id
-        remote_participant = next(iter(ctx.room.remote_participants.values()), None)
+        remote_participant = room_index.current_participant()
         if not remote_participant:
             return
 
-        track_sid = next(
-            (
-                track.sid
-                for track in remote_participant.track_publications.values()
-                if track.source == rtc.TrackSource.SOURCE_MICROPHONE
-            ),
-            None,
-        )
+        track_sid = room_index.mic_track_sid(remote_participant.identity)
         if last_transcript_id:
-            asyncio.create_task(
-                send_transcription(
-                    ctx, remote_participant, track_sid, last_transcript_id, ""
-                )
+            publisher.update(
+                remote_participant.identity, track_sid, last_transcript_id, ""
             )
 
         new_id = str(uuid.uuid4())
         last_transcript_id = new_id
-        asyncio.create_task(
-            send_transcription(
-                ctx, remote_participant, track_sid, new_id, "…", is_final=False
-            )
+        publisher.update(
+            remote_participant.identity, track_sid, new_id, "…", is_final=False
         )
 
     @session.on("input_speech_transcription_completed")
@@ -365,22 +424,13 @@ def run_multimodal_agent(ctx: JobContext, participant: rtc.Participant, fnc_ctx:
     ):
         nonlocal last_transcript_id
         if last_transcript_id:
-            remote_participant = next(iter(ctx.room.remote_participants.values()), None)
+            remote_participant = room_index.current_participant()
             if not remote_participant:
                 return
 
-            track_sid = next(
-                (
-                    track.sid
-                    for track in remote_participant.track_publications.values()
-                    if track.source == rtc.TrackSource.SOURCE_MICROPHONE
-                ),
-                None,
-            )
-            asyncio.create_task(
-                send_transcription(
-                    ctx, remote_participant, track_sid, last_transcript_id, ""
-                )
+            track_sid = room_index.mic_track_sid(remote_participant.identity)
+            publisher.update(
+                remote_participant.identity, track_sid, last_transcript_id, ""
             )
             last_transcript_id = None
 
@@ -390,37 +440,34 @@ def run_multimodal_agent(ctx: JobContext, participant: rtc.Participant, fnc_ctx:
     ):
         nonlocal last_transcript_id
         if last_transcript_id:
-            remote_participant = next(iter(ctx.room.remote_participants.values()), None)
+            remote_participant = room_index.current_participant()
             if not remote_participant:
                 return
 
-            track_sid = next(
-                (
-                    track.sid
-                    for track in remote_participant.track_publications.values()
-                    if track.source == rtc.TrackSource.SOURCE_MICROPHONE
-                ),
-                None,
-            )
+            track_sid = room_index.mic_track_sid(remote_participant.identity)
 
             error_message = "⚠️ Transcription failed"
-            asyncio.create_task(
-                send_transcription(
-                    ctx,
-                    remote_participant,
-                    track_sid,
-                    last_transcript_id,
-                    error_message,
-                )
+            publisher.update(
+                remote_participant.identity,
+                track_sid,
+                last_transcript_id,
+                error_message,
             )
             last_transcript_id = None
 
 
 if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    # Job processes inherit the environment, only the worker needs to load .env
+    load_dotenv()
+
     # Configure logging to better debug function calls
     logging.basicConfig(
         level=logging.INFO,
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     )
     
-    cli.run_app(WorkerOptions(entrypoint_fnc=entrypoint, worker_type=WorkerType.ROOM))
\ No newline at end of file
+    cli.run_app(
+        worker_options(entrypoint_fnc=entrypoint, prewarm_fnc=prewarm_hook(get_config_parser))
+    )
\ No newline at end of file
@@ -4,8 +4,7 @@ import asyncio
 import json
 import logging
 import uuid
-from dataclasses import asdict, dataclass
-from typing import Any, Dict, Literal
+from typing import Literal
 
 from livekit import rtc
 from livekit.agents import (
@@ -21,67 +20,24 @@ from livekit.plugins import openai
 
 from dotenv import load_dotenv
 
+from session_config import MODALITIES, SessionConfig, SessionConfigParser
+
 load_dotenv()
 
 logger = logging.getLogger("my-worker")
 logger.setLevel(logging.INFO)
 
-@dataclass
-class SessionConfig:
-    openai_api_key: str
-    instructions: str
-    voice: openai.realtime.api_proto.Voice
-    temperature: float
-    max_response_output_tokens: str | int
-    modalities: list[openai.realtime.api_proto.Modality]
-    turn_detection: openai.realtime.ServerVadOptions
-
-    def __post_init__(self):
-        if self.modalities is None:
-            self.modalities = self._modalities_from_string("text_and_audio")
-
-    def to_dict(self):
-        return {k: v for k, v in asdict(self).items() if k != "openai_api_key"}
-
-    @staticmethod
-    def _modalities_from_string(modalities: str) -> list[str]:
-        modalities_map = {
-            "text_and_audio": ["text", "audio"],
-            "text_only": ["text"],
-        }
-        return modalities_map.get(modalities, ["text", "audio"])
-
-    def __eq__(self, other: SessionConfig) -> bool:
-        return self.to_dict() == other.to_dict()
-
-
-def parse_session_config(data: Dict[str, Any]) -> SessionConfig:
-    turn_detection = None
-
-    if data.get("turn_detection"):
-        turn_detection_json = json.loads(data.get("turn_detection"))
-        turn_detection = openai.realtime.ServerVadOptions(
-            threshold=turn_detection_json.get("threshold", 0.5),
-            prefix_padding_ms=turn_detection_json.get("prefix_padding_ms", 200),
-            silence_duration_ms=turn_detection_json.get("silence_duration_ms", 300),
-        )
-    else:
-        turn_detection = openai.realtime.DEFAULT_SERVER_VAD_OPTIONS
-
-    config = SessionConfig(
-        openai_api_key=data.get("openai_api_key", ""),
-        instructions=data.get("instructions", ""),
-        voice=data.get("voice", "alloy"),
-        temperature=float(data.get("temperature", 0.8)),
-        max_response_output_tokens=data.get("max_output_tokens")
-        if data.get("max_output_tokens") == "inf"
-        else int(data.get("max_output_tokens") or 2048),
-        modalities=SessionConfig._modalities_from_string(
-            data.get("modalities", "text_and_audio")
-        ),
-        turn_detection=turn_detection,
+config_parser = SessionConfigParser(
+    SessionConfig(
+        openai_api_key="",
+        instructions="",
+        voice="alloy",
+        temperature=0.8,
+        max_response_output_tokens=2048,
+        modalities=MODALITIES["text_and_audio"],
+        turn_detection=openai.realtime.DEFAULT_SERVER_VAD_OPTIONS,
     )
-    return config
+)
 
 
 async def entrypoint(ctx: JobContext):
@@ -96,8 +52,7 @@ async def entrypoint(ctx: JobContext):
 
 
 def run_multimodal_agent(ctx: JobContext, participant: rtc.Participant):
-    metadata = json.loads(participant.metadata)
-    config = parse_session_config(metadata)
+    config = config_parser.parse(participant.metadata)
 
     logger.info(f"starting MultimodalAgent with config: {config.to_dict()}")
 
@@ -110,14 +65,14 @@ def run_multimodal_agent(ctx: JobContext, participant: rtc.Participant):
         voice=config.voice,
         temperature=config.temperature,
         max_response_output_tokens=config.max_response_output_tokens,
-        modalities=config.modalities,
+        modalities=list(config.modalities),
         turn_detection=config.turn_detection,
     )
     assistant = MultimodalAgent(model=model)
     assistant.start(ctx.room)
     session = model.sessions[0]
 
-    if config.modalities == ["text", "audio"]:
+    if config.modalities == MODALITIES["text_and_audio"]:
         session.conversation.item.create(
             llm.ChatMessage(
                 role="user",
@@ -133,7 +88,7 @@ def run_multimodal_agent(ctx: JobContext, participant: rtc.Participant):
         if data.caller_identity != participant.identity:
             return
 
-        new_config = parse_session_config(json.loads(data.payload))
+        new_config = config_parser.parse(data.payload)
         if config != new_config:
             logger.info(
                 f"config changed: {new_config.to_dict()}, participant: {participant.identity}"
@@ -145,7 +100,7 @@ def run_multimodal_agent(ctx: JobContext, participant: rtc.Participant):
                 temperature=new_config.temperature,
                 max_response_output_tokens=new_config.max_response_output_tokens,
                 turn_detection=new_config.turn_detection,
-                modalities=new_config.modalities,
+                modalities=list(new_config.modalities),
             )
             return json.dumps({"changed": True})
         else:
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import bisect
+import threading
+from typing import Any, Dict, List, Sequence, Tuple
+
+# Upper bounds in milliseconds, roughly logarithmic from 5ms to 60s
+DEFAULT_BUCKETS_MS = (
+    5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000,
+)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram. Recording is a bisect and two adds."""
+
+    def __init__(self, buckets_ms: Sequence[float] = DEFAULT_BUCKETS_MS):
+        self.buckets_ms = tuple(buckets_ms)
+        # One extra bucket for values above the last bound
+        self.counts: List[int] = [0] * (len(self.buckets_ms) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value_ms: float) -> None:
+        index = bisect.bisect_left(self.buckets_ms, value_ms)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum_ms += value_ms
+
+    def percentile(self, p: float) -> float:
+        """Upper bound of the bucket holding the p-th percentile (0-100)."""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = p / 100 * self.count
+            seen = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank and count:
+                    if index < len(self.buckets_ms):
+                        return float(self.buckets_ms[index])
+                    return float("inf")
+        return float("inf")
+
+    def cumulative(self) -> Tuple[List[Tuple[float, int]], int, float]:
+        """`(upper bound, count <= bound)` pairs, plus total count and sum."""
+        with self._lock:
+            counts = list(self.counts)
+            count, sum_ms = self.count, self.sum_ms
+        buckets = []
+        seen = 0
+        for bound, bucket_count in zip(self.buckets_ms + (float("inf"),), counts):
+            seen += bucket_count
+            buckets.append((bound, seen))
+        return buckets, count, sum_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Raw counts, for `merge` in another process."""
+        with self._lock:
+            return {"buckets_ms": list(self.buckets_ms), "counts": list(self.counts), "sum_ms": self.sum_ms}
+
+    def merge(self, data: Dict[str, Any]) -> None:
+        """Add the counts of another histogram's `to_dict`; its buckets must match."""
+        if tuple(data["buckets_ms"]) != self.buckets_ms:
+            raise ValueError("can't merge histograms with different buckets")
+        with self._lock:
+            for index, count in enumerate(data["counts"]):
+                self.counts[index] += count
+            self.count += sum(data["counts"])
+            self.sum_ms += data["sum_ms"]
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean_ms": self.sum_ms / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(50),
+            "p90_ms": self.percentile(90),
+            "p99_ms": self.percentile(99),
+        }
+
+
+class HistogramSet:
+    """Histograms created on first use, keyed by name."""
+
+    def __init__(self, buckets_ms: Sequence[float] = DEFAULT_BUCKETS_MS):
+        self.buckets_ms = buckets_ms
+        self._histograms: Dict[str, Histogram] = {}
+
+    def observe(self, name: str, value_ms: float) -> None:
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = self._histograms.setdefault(name, Histogram(self.buckets_ms))
+        histogram.observe(value_ms)
+
+    def get(self, name: str) -> Histogram:
+        return self._histograms.setdefault(name, Histogram(self.buckets_ms))
+
+    def items(self):
+        return list(self._histograms.items())
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        return {name: histogram.to_dict() for name, histogram in self.items()}
+
+    def merge(self, data: Dict[str, Dict[str, Any]]) -> None:
+        for name, histogram in data.items():
+            self.get(name).merge(histogram)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {name: histogram.summary() for name, histogram in self.items()}
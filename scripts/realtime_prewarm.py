@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from typing import TYPE_CHECKING, Any, Callable
+
+from turn_latency import get_latency_registry
+
+if TYPE_CHECKING:
+    from livekit import rtc
+    from livekit.agents import JobContext, llm
+    from livekit.agents.multimodal import MultimodalAgent
+    from livekit.plugins import openai
+
+logger = logging.getLogger("realtime-prewarm")
+
+
+def prewarm_enabled() -> bool:
+    return os.environ.get("AGENT_PREWARM", "0") == "1"
+
+
+class _PrewarmedModel:
+    """The realtime model as MultimodalAgent sees it: its first session is the prewarmed one."""
+
+    def __init__(self, model: openai.realtime.RealtimeModel, session: openai.realtime.RealtimeSession):
+        self._model = model
+        self._session = session
+
+    def session(self, **kwargs: Any) -> openai.realtime.RealtimeSession:
+        session, self._session = self._session, None
+        return session if session is not None else self._model.session(**kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._model, name)
+
+
+class PrewarmedAgent:
+    """A realtime session opened with the default config before the participant joins.
+
+    The realtime connection and session setup happen while we wait for the
+    participant, and `adopt` only sends the fields that differ from the
+    defaults once the participant's config is known. Nothing is attached to
+    the room until `start`, so a session that isn't adopted is just closed.
+    """
+
+    def __init__(
+        self,
+        config: Any,
+        model: openai.realtime.RealtimeModel,
+        session: openai.realtime.RealtimeSession,
+        fnc_ctx: llm.FunctionContext,
+    ):
+        self.config = config
+        self.model = model
+        self.session = session
+        self.fnc_ctx = fnc_ctx
+        self.started_at = time.perf_counter()
+        self._closed = False
+
+    def adopt(self, config: Any) -> bool:
+        """Reconfigure the session for `config`. Returns False if it can't be reused."""
+        if config.openai_api_key != self.config.openai_api_key:
+            # Never serve a participant with a key they didn't provide
+            logger.info("participant uses a different API key, discarding prewarmed session")
+            get_latency_registry().increment("prewarm.rejected_api_key")
+            self.close()
+            return False
+
+        changes = self.config.diff(config)
+        if changes:
+            logger.info(f"applying config diff to prewarmed session: {sorted(changes)}")
+            self.session.session_update(**changes)
+        self.config = config
+        get_latency_registry().increment("prewarm.adopted")
+        return True
+
+    def start(self, room: rtc.Room) -> MultimodalAgent:
+        """Start the agent in `room` on the adopted session."""
+        from livekit.agents.multimodal import MultimodalAgent
+
+        assistant = MultimodalAgent(model=_PrewarmedModel(self.model, self.session), fnc_ctx=self.fnc_ctx)
+        assistant.start(room)
+        return assistant
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        for session in self.model.sessions:
+            asyncio.create_task(session.aclose())
+
+    async def aclose(self) -> None:
+        """Close the sessions and wait for them, e.g. from a job shutdown callback."""
+        if self._closed:
+            return
+        self._closed = True
+        await asyncio.gather(*(session.aclose() for session in self.model.sessions), return_exceptions=True)
+
+
+def prewarm_agent(
+    ctx: JobContext,
+    config: Any,
+    fnc_ctx: llm.FunctionContext,
+    model_factory: Callable[[Any], openai.realtime.RealtimeModel],
+) -> PrewarmedAgent:
+    """Open the realtime session with `config` right away, without waiting for a participant."""
+    from livekit.agents import llm
+
+    model = model_factory(config)
+    session = model.session(chat_ctx=llm.ChatContext(), fnc_ctx=fnc_ctx)
+    logger.info(f"prewarmed realtime session for room {ctx.room.name}")
+    return PrewarmedAgent(config, model, session, fnc_ctx)
+
+
+def measure_time_to_first_audio(assistant: MultimodalAgent, since: float, room_name: str) -> None:
+    """Record the time from `since` until the agent first starts speaking."""
+    measured = False
+
+    @assistant.on("agent_started_speaking")
+    def on_agent_started_speaking():
+        nonlocal measured
+        if measured:
+            return
+        measured = True
+        elapsed_ms = (time.perf_counter() - since) * 1000
+        get_latency_registry().observe(room_name, "session.first_audio", elapsed_ms)
+        logger.info(f"time to first audio in room {room_name}: {elapsed_ms:.0f}ms")
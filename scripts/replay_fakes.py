@@ -0,0 +1,182 @@
+"""In-process stand-ins for the LiveKit objects the agent handlers touch.
+
+Only what `main.py` and `erp_agent.py` use is implemented: event
+registration, RPC registration and calls, transcription publishing and
+shutdown callbacks. Every emitted event is timed so the benchmark can
+attribute handler CPU time to the event that triggered it.
+"""
+from __future__ import annotations
+
+import asyncio
+import inspect
+import time
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from livekit import rtc
+
+from metrics import HistogramSet
+
+# Handler times are in the microsecond range, finer than the latency buckets
+HANDLER_BUCKETS_MS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50)
+
+
+class ReplayStats:
+    """Counters and histograms shared by every fake in a benchmark run."""
+
+    def __init__(self):
+        self.handler_cpu = HistogramSet(HANDLER_BUCKETS_MS)
+        self.events = 0
+        self.publishes = 0
+        self.segments = 0
+        self.rpcs = 0
+
+
+class FakeEmitter:
+    """`on`/`emit` like livekit's EventEmitter, timing the handlers of each emit."""
+
+    def __init__(self, stats: ReplayStats, prefix: str):
+        self._stats = stats
+        self._prefix = prefix
+        self._handlers: Dict[str, List[Callable[..., Any]]] = {}
+
+    def on(self, event: str, callback: Optional[Callable[..., Any]] = None):
+        if callback is not None:
+            self._handlers.setdefault(event, []).append(callback)
+            return callback
+
+        def decorator(callback: Callable[..., Any]):
+            self._handlers.setdefault(event, []).append(callback)
+            return callback
+
+        return decorator
+
+    def emit(self, event: str, *args: Any) -> None:
+        handlers = self._handlers.get(event)
+        if not handlers:
+            return
+        self._stats.events += 1
+        started = time.thread_time()
+        for handler in list(handlers):
+            result = handler(*args)
+            if inspect.isawaitable(result):
+                asyncio.ensure_future(result)
+        self._stats.handler_cpu.observe(
+            f"{self._prefix}.{event}", (time.thread_time() - started) * 1000
+        )
+
+
+class FakeLocalParticipant:
+    def __init__(self, stats: ReplayStats, identity: str = "agent", rpc_latency: float = 0.0):
+        self.identity = identity
+        self.rpc_latency = rpc_latency
+        self.rpc_methods: Dict[str, Callable[[Any], Awaitable[Any]]] = {}
+        self._stats = stats
+
+    def register_rpc_method(self, method: str):
+        def decorator(handler):
+            self.rpc_methods[method] = handler
+            return handler
+
+        return decorator
+
+    async def perform_rpc(
+        self, destination_identity: str, method: str, payload: str, response_timeout: float = 10.0
+    ) -> str:
+        self._stats.rpcs += 1
+        if self.rpc_latency:
+            await asyncio.sleep(self.rpc_latency)
+        return "ok"
+
+    async def publish_transcription(self, transcription: rtc.Transcription) -> None:
+        self._stats.publishes += 1
+        self._stats.segments += len(transcription.segments)
+
+
+class FakeRemoteParticipant:
+    def __init__(self, identity: str, metadata: str = "", mic_track_sid: str = "TR_mic"):
+        self.identity = identity
+        self.metadata = metadata
+        self.track_publications = {
+            mic_track_sid: SimpleNamespace(sid=mic_track_sid, source=rtc.TrackSource.SOURCE_MICROPHONE)
+        }
+
+
+class FakeRoom(FakeEmitter):
+    def __init__(self, name: str, stats: ReplayStats, rpc_latency: float = 0.0):
+        super().__init__(stats, "room")
+        self.name = name
+        self.local_participant = FakeLocalParticipant(stats, rpc_latency=rpc_latency)
+        self.remote_participants: Dict[str, FakeRemoteParticipant] = {}
+
+    def join(self, participant: FakeRemoteParticipant) -> None:
+        self.remote_participants[participant.identity] = participant
+        self.emit("participant_connected", participant)
+
+
+class FakeJobContext:
+    def __init__(self, room: FakeRoom):
+        self.room = room
+        self._shutdown_callbacks: List[Callable[[], Awaitable[None]]] = []
+
+    async def connect(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+    async def wait_for_participant(self) -> FakeRemoteParticipant:
+        return next(iter(self.room.remote_participants.values()))
+
+    def add_shutdown_callback(self, callback: Callable[[], Awaitable[None]]) -> None:
+        self._shutdown_callbacks.append(callback)
+
+    async def shutdown(self) -> None:
+        self.room.emit("disconnected")
+        for callback in self._shutdown_callbacks:
+            await callback()
+
+
+class FakeRealtimeSession(FakeEmitter):
+    def __init__(self, stats: ReplayStats):
+        super().__init__(stats, "session")
+        self.updates: List[Dict[str, Any]] = []
+        self.conversation = SimpleNamespace(item=SimpleNamespace(create=lambda *args, **kwargs: None))
+        self.response = SimpleNamespace(create=lambda *args, **kwargs: None)
+
+    def session_update(self, **changes: Any) -> None:
+        self.updates.append(changes)
+
+    async def aclose(self) -> None:
+        pass
+
+
+class FakeRealtimeModel:
+    def __init__(self, stats: ReplayStats, *args: Any, **kwargs: Any):
+        self.sessions = [FakeRealtimeSession(stats)]
+
+
+class FakeAssistant(FakeEmitter):
+    def __init__(self, stats: ReplayStats, *args: Any, **kwargs: Any):
+        super().__init__(stats, "assistant")
+
+    def start(self, room: Any, participant: Any = None) -> None:
+        pass
+
+
+class FakePrewarmedAgent:
+    """Passed as `prewarmed` to main.run_multimodal_agent so it uses the fakes."""
+
+    def __init__(self, stats: ReplayStats):
+        self.model = FakeRealtimeModel(stats)
+        self.assistant = FakeAssistant(stats)
+        self.started_at = time.perf_counter()
+
+    def adopt(self, config: Any) -> bool:
+        return True
+
+    def start(self, room: Any) -> FakeAssistant:
+        return self.assistant
+
+    def close(self) -> None:
+        pass
+
+    async def aclose(self) -> None:
+        pass
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from livekit import rtc
+
+logger = logging.getLogger("room-index")
+
+
+class RoomIndex:
+    """Remote participants and their microphone tracks, kept up to date from room events.
+
+    Answers "current remote participant" and "mic track SID" in O(1) so the
+    speech event handlers don't have to scan the room on every utterance.
+    The current participant is the earliest joined one still in the room, and
+    a participant's mic track is the most recently published one.
+    """
+
+    def __init__(self, room: rtc.Room):
+        self._participants: OrderedDict[str, rtc.RemoteParticipant] = OrderedDict()
+        self._mic_tracks: Dict[str, OrderedDict[str, None]] = {}
+
+        for participant in room.remote_participants.values():
+            self._on_participant_connected(participant)
+
+        room.on("participant_connected", self._on_participant_connected)
+        room.on("participant_disconnected", self._on_participant_disconnected)
+        room.on("track_published", self._on_track_published)
+        room.on("track_unpublished", self._on_track_unpublished)
+
+    def current_participant(self) -> Optional[rtc.RemoteParticipant]:
+        return next(iter(self._participants.values()), None)
+
+    def mic_track_sid(self, identity: str) -> Optional[str]:
+        tracks = self._mic_tracks.get(identity)
+        if not tracks:
+            return None
+        return next(reversed(tracks))
+
+    def _on_participant_connected(self, participant: rtc.RemoteParticipant) -> None:
+        self._participants[participant.identity] = participant
+        tracks = self._mic_tracks.setdefault(participant.identity, OrderedDict())
+        for publication in participant.track_publications.values():
+            if publication.source == rtc.TrackSource.SOURCE_MICROPHONE:
+                tracks[publication.sid] = None
+
+    def _on_participant_disconnected(self, participant: rtc.RemoteParticipant) -> None:
+        self._participants.pop(participant.identity, None)
+        self._mic_tracks.pop(participant.identity, None)
+
+    def _on_track_published(
+        self, publication: rtc.RemoteTrackPublication, participant: rtc.RemoteParticipant
+    ) -> None:
+        if publication.source != rtc.TrackSource.SOURCE_MICROPHONE:
+            return
+        if participant.identity not in self._participants:
+            self._on_participant_connected(participant)
+        tracks = self._mic_tracks.setdefault(participant.identity, OrderedDict())
+        tracks.pop(publication.sid, None)
+        tracks[publication.sid] = None
+
+    def _on_track_unpublished(
+        self, publication: rtc.RemoteTrackPublication, participant: rtc.RemoteParticipant
+    ) -> None:
+        tracks = self._mic_tracks.get(participant.identity)
+        if tracks is not None:
+            tracks.pop(publication.sid, None)
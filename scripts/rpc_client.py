@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from livekit import rtc
+
+from metrics import HistogramSet
+from turn_latency import get_latency_registry
+from worker_load import get_worker_load
+
+logger = logging.getLogger("rpc-client")
+
+# Errors worth retrying. After a connection timeout the frontend may already
+# have the request, so only SEND_FAILED is retried for non-idempotent methods
+TRANSIENT_RPC_ERRORS = {
+    rtc.RpcError.ErrorCode.CONNECTION_TIMEOUT,
+    rtc.RpcError.ErrorCode.SEND_FAILED,
+}
+UNSENT_RPC_ERRORS = {rtc.RpcError.ErrorCode.SEND_FAILED}
+
+
+class RoomRpcClient:
+    """Per-room RPC client with timeouts, retries and a cap on in-flight calls.
+
+    `call` retries transient failures with jittered exponential backoff;
+    pass `idempotent=False` for methods that must not run twice.
+    `notify` is fire-and-forget: notifications are queued per method, sent
+    one at a time, and when the queue is full the oldest one is dropped, so a
+    slow frontend can't pile up coroutines in the worker. Latency of every
+    attempt is recorded per method in `latency`, and in the worker's latency
+    registry as `rpc.<method>` under `room`.
+    """
+
+    def __init__(
+        self,
+        local_participant: rtc.LocalParticipant,
+        max_in_flight: int = 4,
+        timeout: float = 10.0,
+        retries: int = 2,
+        backoff: float = 0.25,
+        max_queued_notifications: int = 3,
+        room: str = "",
+    ):
+        self._local_participant = local_participant
+        self.room = room
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_queued_notifications = max_queued_notifications
+        self.latency = HistogramSet()
+        self.dropped_notifications = 0
+        self._notifications: Dict[str, Deque[Tuple[str, str, Optional[float]]]] = {}
+        self._senders: Dict[str, asyncio.Task] = {}
+
+    async def call(
+        self,
+        destination_identity: str,
+        method: str,
+        payload: str,
+        timeout: Optional[float] = None,
+        retries: Optional[int] = None,
+        idempotent: bool = True,
+    ) -> str:
+        timeout = self.timeout if timeout is None else timeout
+        retries = self.retries if retries is None else retries
+        retryable = TRANSIENT_RPC_ERRORS if idempotent else UNSENT_RPC_ERRORS
+
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                async with self._semaphore:
+                    with get_worker_load().rpc():
+                        response = await self._local_participant.perform_rpc(
+                            destination_identity=destination_identity,
+                            method=method,
+                            payload=payload,
+                            response_timeout=timeout,
+                        )
+                self._observe(method, started)
+                return response
+            except rtc.RpcError as e:
+                self._observe(method, started)
+                if e.code not in retryable or attempt >= retries:
+                    raise
+                delay = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+                logger.warning(
+                    f"RPC {method} failed with {e.code}, retrying in {delay:.2f}s"
+                )
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    def notify(
+        self,
+        destination_identity: str,
+        method: str,
+        payload: str,
+        timeout: Optional[float] = None,
+    ) -> None:
+        """Queue a fire-and-forget RPC, dropping the oldest queued one if full."""
+        queue = self._notifications.get(method)
+        if queue is None:
+            queue = self._notifications[method] = deque(maxlen=self.max_queued_notifications)
+        if len(queue) == queue.maxlen:
+            self.dropped_notifications += 1
+        queue.append((destination_identity, payload, timeout))
+
+        if method not in self._senders:
+            self._senders[method] = asyncio.create_task(self._send_notifications(method))
+
+    async def aclose(self) -> None:
+        logger.info(f"RPC latency by method: {self.latency.summary()}")
+        for task in self._senders.values():
+            task.cancel()
+        self._senders.clear()
+
+    def _observe(self, method: str, started: float) -> None:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.latency.observe(method, elapsed_ms)
+        get_latency_registry().observe(self.room, f"rpc.{method}", elapsed_ms)
+
+    async def _send_notifications(self, method: str) -> None:
+        queue = self._notifications[method]
+        try:
+            while queue:
+                destination_identity, payload, timeout = queue.popleft()
+                try:
+                    await self.call(destination_identity, method, payload, timeout=timeout)
+                except Exception as e:
+                    logger.error(f"Error sending {method}: {e}")
+        finally:
+            self._senders.pop(method, None)
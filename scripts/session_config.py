@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+if TYPE_CHECKING:
+    from livekit.plugins import openai
+
+logger = logging.getLogger("session-config")
+
+MODALITIES = {
+    "text_and_audio": ("text", "audio"),
+    "text_only": ("text",),
+}
+
+# Fields that session_update can change, in the order they are compared
+UPDATABLE_FIELDS = (
+    "instructions",
+    "voice",
+    "temperature",
+    "max_response_output_tokens",
+    "turn_detection",
+    "modalities",
+)
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class SessionConfig:
+    """Immutable realtime session config shared by the agent scripts.
+
+    Equality and hashing use a digest of every field except the API key,
+    computed once when the config is created, and `diff` compares prompts by
+    their own digest.
+    """
+
+    openai_api_key: str
+    instructions: str
+    voice: openai.realtime.api_proto.Voice
+    temperature: float
+    max_response_output_tokens: int | str
+    modalities: Tuple[openai.realtime.api_proto.Modality, ...]
+    turn_detection: openai.realtime.ServerVadOptions
+    digest: str = field(init=False, repr=False)
+    instructions_digest: str = field(init=False, repr=False)
+
+    def __post_init__(self):
+        if not isinstance(self.temperature, (int, float)):
+            raise ValueError(f"invalid temperature: {self.temperature!r}")
+        if self.max_response_output_tokens != "inf" and (
+            not isinstance(self.max_response_output_tokens, int)
+            or self.max_response_output_tokens <= 0
+        ):
+            raise ValueError(
+                f"invalid max_response_output_tokens: {self.max_response_output_tokens!r}"
+            )
+        if not self.modalities:
+            raise ValueError("modalities must not be empty")
+
+        payload = json.dumps(
+            [
+                self.instructions,
+                self.voice,
+                self.temperature,
+                self.max_response_output_tokens,
+                [
+                    self.turn_detection.threshold,
+                    self.turn_detection.prefix_padding_ms,
+                    self.turn_detection.silence_duration_ms,
+                ],
+                self.modalities,
+            ]
+        )
+        object.__setattr__(
+            self, "digest", hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+        )
+        object.__setattr__(
+            self,
+            "instructions_digest",
+            hashlib.blake2b(self.instructions.encode("utf-8"), digest_size=16).hexdigest(),
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, SessionConfig):
+            return NotImplemented
+        return self.digest == other.digest
+
+    def __hash__(self) -> int:
+        return hash(self.digest)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in UPDATABLE_FIELDS}
+
+    def diff(self, other: SessionConfig) -> Dict[str, Any]:
+        """session_update arguments for the fields that differ in `other`."""
+        if self.digest == other.digest:
+            return {}
+
+        changes = {}
+        for name in UPDATABLE_FIELDS:
+            value = getattr(other, name)
+            current = getattr(self, name)
+            if name == "instructions":
+                # Prompts run to thousands of characters, compare the digests taken at creation
+                if self.instructions_digest != other.instructions_digest:
+                    changes[name] = value
+            elif current != value:
+                changes[name] = list(value) if name == "modalities" else value
+        return changes
+
+    def with_api_key(self, openai_api_key: str) -> SessionConfig:
+        return replace(self, openai_api_key=openai_api_key)
+
+
+def parse_max_output_tokens(value: Any, default: int | str) -> int | str:
+    """Normalize the token limit: "inf" stays "inf", empty uses the default."""
+    if value is None or value == "":
+        return default
+    if value == "inf" or value == float("inf"):
+        return "inf"
+    return int(value)
+
+
+class SessionConfigParser:
+    """Parses participant metadata / RPC payloads into SessionConfig.
+
+    Results are cached by the raw JSON string, so the same metadata is never
+    decoded twice. Missing fields fall back to `defaults`. The parser is
+    shared by the rooms of a worker, so the cache is guarded by a lock.
+    """
+
+    def __init__(self, defaults: SessionConfig, cache_size: int = 256):
+        self.defaults = defaults
+        self._cache: OrderedDict[str, SessionConfig] = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    def parse(self, raw: Optional[str]) -> SessionConfig:
+        if not raw:
+            return self.defaults
+
+        with self._lock:
+            config = self._cache.get(raw)
+            if config is not None:
+                self._cache.move_to_end(raw)
+                return config
+
+        # Parsed outside the lock; two rooms parsing the same metadata get equal configs
+        config = self.from_dict(json.loads(raw))
+        with self._lock:
+            self._cache[raw] = config
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return config
+
+    def from_dict(self, data: Dict[str, Any]) -> SessionConfig:
+        defaults = self.defaults
+        if not data:
+            return defaults
+
+        turn_detection = defaults.turn_detection
+        if data.get("turn_detection"):
+            turn_detection_json = data["turn_detection"]
+            if isinstance(turn_detection_json, str):
+                turn_detection_json = json.loads(turn_detection_json)
+            from livekit.plugins import openai
+
+            turn_detection = openai.realtime.ServerVadOptions(
+                threshold=turn_detection_json.get("threshold", turn_detection.threshold),
+                prefix_padding_ms=turn_detection_json.get(
+                    "prefix_padding_ms", turn_detection.prefix_padding_ms
+                ),
+                silence_duration_ms=turn_detection_json.get(
+                    "silence_duration_ms", turn_detection.silence_duration_ms
+                ),
+            )
+
+        return SessionConfig(
+            openai_api_key=data.get("openai_api_key", defaults.openai_api_key),
+            instructions=data.get("instructions", defaults.instructions),
+            voice=data.get("voice", defaults.voice),
+            temperature=float(data.get("temperature", defaults.temperature)),
+            max_response_output_tokens=parse_max_output_tokens(
+                data.get("max_output_tokens"), defaults.max_response_output_tokens
+            ),
+            modalities=MODALITIES.get(data.get("modalities"), defaults.modalities),
+            turn_detection=turn_detection,
+        )
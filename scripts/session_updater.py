@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger("session-updater")
+
+
+class SessionUpdater:
+    """Debounced, diff-based `session_update` for one realtime session.
+
+    Rapid successive config changes are collapsed: only the latest requested
+    config is applied once `debounce` seconds pass without a new request, and
+    only the fields that differ from what the session already has are sent.
+    There is never more than one pending update per session.
+    """
+
+    def __init__(self, session: Any, config: Any, debounce: float = 0.25):
+        self._session = session
+        self._applied = config
+        self._requested = config
+        self._debounce = debounce
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def config(self) -> Any:
+        """The most recently requested config."""
+        return self._requested
+
+    def request(self, config: Any) -> Dict[str, Any]:
+        """Schedule an update to `config`. Returns the fields it changes."""
+        changes = self._requested.diff(config)
+        if not changes:
+            return changes
+
+        self._requested = config
+        if self._task is not None:
+            self._task.cancel()
+        self._task = asyncio.create_task(self._apply_later())
+        return changes
+
+    async def _apply_later(self) -> None:
+        await asyncio.sleep(self._debounce)
+        self._task = None
+
+        changes = self._applied.diff(self._requested)
+        if not changes:
+            return
+        logger.info(f"updating session fields: {sorted(changes)}")
+        self._session.session_update(**changes)
+        self._applied = self._requested
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import functools
+import logging
+import os
+import time
+from typing import Any, Callable
+
+logger = logging.getLogger("startup")
+
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts")
+
+
+@functools.lru_cache(maxsize=None)
+def load_instructions(name: str) -> str:
+    """Agent instructions from prompts/<name>.txt, read once per process."""
+    with open(os.path.join(PROMPTS_DIR, f"{name}.txt"), encoding="utf-8") as f:
+        return f.read().rstrip("\n")
+
+
+def load_heavy_modules() -> None:
+    """Import the modules the agent scripts defer until a room needs them.
+
+    Plugins such as livekit.plugins.openai are not deferred: they register
+    on import, which livekit-agents only allows on the main thread, and with
+    the thread executor prewarm and jobs run on worker threads.
+    """
+    import livekit.agents.multimodal  # noqa: F401
+
+
+def prewarm_hook(*warmers: Callable[[], Any]) -> Callable[[Any], None]:
+    """`WorkerOptions.prewarm_fnc` that readies an idle job process.
+
+    Runs in every job process before it is offered a room: imports the
+    deferred modules and calls `warmers` (e.g. the config parser getter), so
+    the first job pays none of that cost.
+    """
+
+    def prewarm(proc: Any) -> None:
+        started = time.perf_counter()
+        load_heavy_modules()
+        for warmer in warmers:
+            warmer()
+        logger.info(f"job process warmed up in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+    return prewarm
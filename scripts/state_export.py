@@ -0,0 +1,269 @@
+"""Lazy, memory-mapped reader for exported designer thread states.
+
+Usage:
+    python scripts/state_export.py keys system_design_example.json
+    python scripts/state_export.py get values.erp_design system_design_example.json
+    python scripts/state_export.py get values.company_name exports/*.json
+
+Opening an export maps the file and records where each top-level and
+`values.*` value starts and ends; nothing is parsed. `get` parses just the
+requested value, and `item` parses one element of an array (e.g. the last
+message) after skipping over the others. Skipping searches for quotes and
+brackets with a regex over the mapped bytes, so it runs in C rather than
+one Python step per byte. Values are parsed with orjson or msgspec when
+installed, and json otherwise.
+"""
+from __future__ import annotations
+
+import argparse
+import functools
+import json
+import mmap
+import re
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+WHITESPACE = re.compile(rb"[ \t\n\r]*")
+STRING = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+# Runs of strings and other bytes up to the next bracket outside a string, so
+# skipping a container costs one Python step per bracket rather than per byte
+BRACKET = re.compile(rb'[^"{}\[\]]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"{}\[\]]*)*([{}\[\]])', re.S)
+SCALAR = re.compile(rb"[^,}\]\s]+")
+
+Span = Tuple[int, int]
+
+
+@functools.lru_cache(maxsize=None)
+def json_loads() -> Callable[[bytes], Any]:
+    """The fastest JSON parser available: orjson, then msgspec, then the standard library."""
+    try:
+        import orjson
+
+        return orjson.loads
+    except ImportError:
+        pass
+    try:
+        import msgspec
+
+        return msgspec.json.Decoder().decode
+    except ImportError:
+        return json.loads
+
+
+def _byte(buf: Any, pos: int) -> int:
+    """The byte at `pos`, or ValueError if a truncated export ends before it."""
+    if pos >= len(buf):
+        raise ValueError("unexpected end of export")
+    return buf[pos]
+
+
+def _skip_ws(buf: Any, pos: int) -> int:
+    return WHITESPACE.match(buf, pos).end()
+
+
+def _string_end(buf: Any, pos: int) -> int:
+    """End of the string whose opening quote is at `pos`."""
+    match = STRING.match(buf, pos)
+    if match is None:
+        raise ValueError(f"unterminated string at byte {pos}")
+    return match.end()
+
+
+def _value_end(buf: Any, pos: int) -> int:
+    """End of the JSON value starting at `pos`, found without building it."""
+    first = _byte(buf, pos)
+    if first == 0x22:  # "
+        return _string_end(buf, pos)
+    if first not in (0x7B, 0x5B):  # { [
+        match = SCALAR.match(buf, pos)
+        if match is None:
+            raise ValueError(f"expected a value at byte {pos}")
+        return match.end()
+
+    depth = 0
+    for match in BRACKET.finditer(buf, pos):
+        char = buf[match.start(1)]
+        if char == 0x7B or char == 0x5B:
+            depth += 1
+        elif char == 0x7D or char == 0x5D:
+            depth -= 1
+            if depth == 0:
+                return match.end()
+    raise ValueError(f"unterminated container at byte {pos}")
+
+
+def _expect(buf: Any, pos: int, char: int) -> int:
+    pos = _skip_ws(buf, pos)
+    if _byte(buf, pos) != char:
+        raise ValueError(f"expected {chr(char)!r} at byte {pos}")
+    return pos + 1
+
+
+def _members(buf: Any, start: int) -> Iterator[Tuple[str, Span]]:
+    """Keys and value spans of the object starting at `start`."""
+    pos = _expect(buf, start, 0x7B)
+    pos = _skip_ws(buf, pos)
+    if _byte(buf, pos) == 0x7D:
+        return
+    while True:
+        key_end = _string_end(buf, _expect(buf, pos, 0x22) - 1)
+        key = json.loads(buf[pos:key_end])
+        start = _skip_ws(buf, _expect(buf, key_end, 0x3A))
+        end = _value_end(buf, start)
+        yield key, (start, end)
+        pos = _skip_ws(buf, end)
+        if _byte(buf, pos) == 0x7D:
+            return
+        pos = _skip_ws(buf, _expect(buf, pos, 0x2C))
+
+
+def _items(buf: Any, start: int) -> Iterator[Span]:
+    """Value spans of the array starting at `start`."""
+    pos = _skip_ws(buf, _expect(buf, start, 0x5B))
+    if _byte(buf, pos) == 0x5D:
+        return
+    while True:
+        end = _value_end(buf, pos)
+        yield pos, end
+        pos = _skip_ws(buf, end)
+        if _byte(buf, pos) == 0x5D:
+            return
+        pos = _skip_ws(buf, _expect(buf, pos, 0x2C))
+
+
+class StateExport:
+    """A thread state export, indexed by top-level and `values.*` keys."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{path} is empty")
+        self._start = _skip_ws(self._buf, 3 if self._buf[:3] == b"\xef\xbb\xbf" else 0)
+        # Members are indexed as lookups reach them, so a key near the start skips the rest
+        self._index: Dict[str, Span] = {}
+        self._pos: Optional[int] = _expect(self._buf, self._start, 0x7B)
+
+    def _next_member(self) -> bool:
+        """Index the next top-level member; False once the object is done."""
+        if self._pos is None:
+            return False
+        buf = self._buf
+        pos = _skip_ws(buf, self._pos)
+        if _byte(buf, pos) == 0x7D:
+            self._pos = None
+            return False
+        if self._index:
+            pos = _skip_ws(buf, _expect(buf, pos, 0x2C))
+        key_end = _string_end(buf, pos)
+        key = json.loads(buf[pos:key_end])
+        start = _skip_ws(buf, _expect(buf, key_end, 0x3A))
+        if key == "values" and _byte(buf, start) == 0x7B:
+            # Indexing the children finds the end of "values" in the same pass
+            end = start + 1
+            for child, span in _members(buf, start):
+                self._index[f"values.{child}"] = span
+                end = span[1]
+            end = _expect(buf, end, 0x7D)
+        else:
+            end = _value_end(buf, start)
+        self._index[key] = (start, end)
+        self._pos = end
+        return True
+
+    def _find(self, key: str) -> Span:
+        while key not in self._index:
+            if not self._next_member():
+                raise KeyError(key)
+        return self._index[key]
+
+    def keys(self) -> List[str]:
+        while self._next_member():
+            pass
+        return list(self._index)
+
+    def __contains__(self, key: str) -> bool:
+        try:
+            self._find(key)
+        except KeyError:
+            return False
+        return True
+
+    def span(self, key: str) -> Span:
+        """Byte offsets of an indexed value in the file."""
+        return self._find(key)
+
+    def raw(self, key: str) -> bytes:
+        start, end = self._find(key)
+        return self._buf[start:end]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Parsed value of an indexed key ("values.erp_design", "checkpoint_id")."""
+        if key not in self:
+            return default
+        return json_loads()(self.raw(key))
+
+    def item(self, key: str, index: int) -> Any:
+        """One element of an indexed array, e.g. `item("values.messages", -1)`."""
+        spans = list(_items(self._buf, self._find(key)[0]))
+        start, end = spans[index]
+        return json_loads()(self._buf[start:end])
+
+    def length(self, key: str) -> int:
+        return sum(1 for _ in _items(self._buf, self._find(key)[0]))
+
+    def load(self) -> Any:
+        """The whole document, for callers that need all of it after all."""
+        return json_loads()(self._buf[self._start:_value_end(self._buf, self._start)])
+
+    def close(self) -> None:
+        if not self._buf.closed:
+            self._buf.close()
+            self._file.close()
+
+    def __enter__(self) -> "StateExport":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    keys = commands.add_parser("keys", help="list the indexed keys of an export")
+    keys.add_argument("path")
+
+    get = commands.add_parser("get", help="print one value from each export")
+    get.add_argument("key")
+    get.add_argument("paths", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "keys":
+        with StateExport(args.path) as export:
+            for key in export.keys():
+                start, end = export.span(key)
+                print(f"{key} ({end - start} bytes)")
+        return 0
+
+    started = time.perf_counter()
+    found = 0
+    for path in args.paths:
+        try:
+            with StateExport(path) as export:
+                if args.key in export:
+                    found += 1
+                    value = export.get(args.key)
+                    print(f"{path}: {json.dumps(value, ensure_ascii=False)}")
+        except (OSError, ValueError) as e:
+            print(f"{path}: {e}")
+    print(f"{found}/{len(args.paths)} exports have {args.key}, {time.perf_counter() - started:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
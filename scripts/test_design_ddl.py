@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from design_ddl import DDLGenerator, validate_sqlite
+from erp_design import ERPDesign
+
+CLIENTES = {"name": "Clientes", "columns": ["id_cliente (INT)", "nombre (VARCHAR)"]}
+PEDIDOS = {"name": "Pedidos", "columns": ["id_pedido (INT)", "id_cliente (INT)", "total (DECIMAL)"]}
+
+
+def test_dropped_table_loses_its_references_first():
+    old = ERPDesign.from_dict({"tables": [CLIENTES, PEDIDOS]})
+    new = ERPDesign.from_dict({"tables": [PEDIDOS]})
+
+    statements = DDLGenerator("postgres").migration(old, new)
+    assert statements == [
+        'ALTER TABLE "Pedidos" DROP CONSTRAINT "Pedidos_id_cliente_fkey";',
+        'DROP TABLE "Clientes";',
+    ]
+    sqlite = DDLGenerator("sqlite").migration(old, new)
+    assert sqlite[-2] == 'DROP TABLE "Clientes";'
+    assert any(statement.startswith('CREATE TABLE "Pedidos__rebuild"') for statement in sqlite)
+    assert validate_sqlite(new, old) == []
+
+
+def test_new_reference_is_added():
+    old = ERPDesign.from_dict({"tables": [CLIENTES, {**PEDIDOS, "columns": ["id_pedido (INT)", "total (DECIMAL)"]}]})
+    new = ERPDesign.from_dict({"tables": [CLIENTES, PEDIDOS]})
+
+    assert DDLGenerator("postgres").migration(old, new)[-1] == (
+        'ALTER TABLE "Pedidos" ADD CONSTRAINT "Pedidos_id_cliente_fkey" '
+        'FOREIGN KEY ("id_cliente") REFERENCES "Clientes" ("id_cliente");'
+    )
+    assert validate_sqlite(new, old) == []
+    assert validate_sqlite(old, new) == []
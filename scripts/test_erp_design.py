@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import pytest
+
+from design_ddl import DDLGenerator, column_type
+from erp_design import Column, ERPDesign
+
+
+@pytest.mark.parametrize(
+    "raw, name, type",
+    [
+        ("id_empleado (INT)", "id_empleado", "INT"),
+        ("nombre (VARCHAR(100))", "nombre", "VARCHAR(100)"),
+        ("precio (decimal(10,2))", "precio", "DECIMAL(10,2)"),
+        ("precio ( DECIMAL(10, 2) )", "precio", "DECIMAL(10, 2)"),
+        ("fecha alta (DATE)", "fecha alta", "DATE"),
+        ("nombre", "nombre", None),
+        ("nombre ()", "nombre", None),
+    ],
+)
+def test_parse_column(raw, name, type):
+    column = Column.parse(raw)
+    assert (column.name, column.type) == (name, type)
+
+
+@pytest.mark.parametrize("raw", ["nombre (VARCHAR(100))", "precio (DECIMAL(10,2))", "id (INT)"])
+def test_column_round_trip(raw):
+    assert Column.parse(raw).to_raw() == raw
+
+
+def test_sized_types_are_indexed_and_rendered():
+    design = ERPDesign.from_dict(
+        {"tables": [{"name": "Productos", "columns": ["id_producto (INT)", "nombre (VARCHAR(100))", "precio (DECIMAL(10,2))"]}]}
+    )
+    assert [table.name for table in design.tables_with_column("precio")] == ["Productos"]
+    precio = design.table("Productos").column("precio")
+    assert column_type(precio, "postgres") == "NUMERIC(10,2)"
+    assert column_type(precio, "sqlite") == "NUMERIC"
+    assert '"nombre" VARCHAR(100)' in DDLGenerator("postgres").schema(design)[0]
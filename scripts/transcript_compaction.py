@@ -0,0 +1,274 @@
+"""Merge repeated partial saves of the same interview into one record per session.
+
+Usage:
+    python scripts/transcript_compaction.py data/transcriptions --out data/compacted
+
+The frontend saves the whole transcript again every time the user hits save,
+so one interview ends up in several files seconds apart. Saves of the same
+company within `--window` seconds whose utterances extend each other are
+merged into a single session. Utterance text is kept once in a
+content-addressed store and sessions only reference it by hash.
+"""
+from __future__ import annotations
+
+import argparse
+import datetime
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from transcript_store import Utterance, render_transcript
+
+logger = logging.getLogger("transcript-compaction")
+
+UTTERANCE_LINE = re.compile(r"^\[([^\]]+)\] ([^:\n]+): (.*)$")
+
+
+@dataclass
+class SavedTranscript:
+    """One saved transcript file, as written by the frontend."""
+
+    path: str
+    company_name: str
+    owner_name: str
+    saved_at: datetime.datetime
+    utterances: List[Utterance]
+
+
+@dataclass
+class Session:
+    """Canonical record for one interview, merged from one or more saves."""
+
+    company_name: str
+    owner_name: str
+    started_at: str
+    saved_at: datetime.datetime
+    utterances: List[Utterance]
+    sources: List[str] = field(default_factory=list)
+
+    @property
+    def session_id(self) -> str:
+        slug = re.sub(r"[^a-zA-Z0-9]+", "-", self.company_name).strip("-").lower()
+        return f"{slug or 'session'}-{self.started_at}"
+
+
+def parse_transcript_text(text: str) -> List[Utterance]:
+    """Utterances in a rendered transcript. Header and footer lines are skipped."""
+    utterances: List[Utterance] = []
+    for line in text.splitlines():
+        match = UTTERANCE_LINE.match(line)
+        if match:
+            utterances.append(Utterance(*match.groups()))
+        elif line and utterances and not line.startswith("Total exchanges:"):
+            # Multi-line speech continues the previous utterance
+            utterances[-1].text += "\n" + line
+    return utterances
+
+
+def load_saved_transcript(path: str) -> SavedTranscript:
+    with open(path, encoding="utf-8") as f:
+        saved = json.load(f)
+    return SavedTranscript(
+        path=path,
+        company_name=saved.get("companyName", ""),
+        owner_name=saved.get("ownerName", ""),
+        saved_at=datetime.datetime.fromisoformat(saved["timestamp"].replace("Z", "+00:00")),
+        utterances=parse_transcript_text(saved.get("transcript", "")),
+    )
+
+
+def _same_utterance(a: Utterance, b: Utterance) -> bool:
+    return a.timestamp == b.timestamp and a.speaker == b.speaker and a.text == b.text
+
+
+def extends(longer: List[Utterance], shorter: List[Utterance]) -> bool:
+    """Whether `longer` is `shorter` with more speech appended.
+
+    The last utterance of the shorter save may itself have grown, since saves
+    can land while a transcription is still being finalized.
+    """
+    if len(shorter) > len(longer):
+        return False
+    if not shorter:
+        return True
+    for a, b in zip(shorter[:-1], longer):
+        if not _same_utterance(a, b):
+            return False
+    last, other = shorter[-1], longer[len(shorter) - 1]
+    return (
+        last.timestamp == other.timestamp
+        and last.speaker == other.speaker
+        and other.text.startswith(last.text)
+    )
+
+
+def merge_saves(
+    saves: Iterable[SavedTranscript], window: datetime.timedelta = datetime.timedelta(minutes=10)
+) -> List[Session]:
+    """Group saves by company and time, merging the ones that extend each other."""
+    by_company: Dict[str, List[SavedTranscript]] = {}
+    for saved in saves:
+        by_company.setdefault(saved.company_name.strip().casefold(), []).append(saved)
+
+    sessions: List[Session] = []
+    for company_saves in by_company.values():
+        company_saves.sort(key=lambda saved: saved.saved_at)
+        open_sessions: List[Session] = []
+        for saved in company_saves:
+            session = _find_session(open_sessions, saved, window)
+            if session is None:
+                session = Session(
+                    company_name=saved.company_name,
+                    owner_name=saved.owner_name,
+                    started_at=saved.utterances[0].timestamp if saved.utterances else saved.saved_at.isoformat(),
+                    saved_at=saved.saved_at,
+                    utterances=saved.utterances,
+                )
+                open_sessions.append(session)
+                sessions.append(session)
+            elif len(saved.utterances) >= len(session.utterances):
+                session.utterances = saved.utterances
+            # The latest save has the most up-to-date details
+            session.owner_name = saved.owner_name or session.owner_name
+            session.saved_at = saved.saved_at
+            session.sources.append(saved.path)
+    return sessions
+
+
+def _find_session(
+    sessions: List[Session], saved: SavedTranscript, window: datetime.timedelta
+) -> Optional[Session]:
+    for session in reversed(sessions):
+        if saved.saved_at - session.saved_at > window:
+            continue
+        if extends(saved.utterances, session.utterances) or extends(
+            session.utterances, saved.utterances
+        ):
+            return session
+    return None
+
+
+def utterance_hash(speaker: str, text: str) -> str:
+    return hashlib.blake2b(f"{speaker}\0{text}".encode("utf-8"), digest_size=8).hexdigest()
+
+
+class CompactedArchive:
+    """Compacted transcripts on disk.
+
+    `utterances.jsonl` holds every distinct (speaker, text) pair once, keyed
+    by hash, and is only ever appended to. `sessions.jsonl` holds one line per
+    session with its metadata and the `[timestamp, hash]` pairs of its
+    utterances, and is rewritten atomically on every save.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.utterances_path = os.path.join(directory, "utterances.jsonl")
+        self.sessions_path = os.path.join(directory, "sessions.jsonl")
+        self._texts: Dict[str, Tuple[str, str]] = {}
+        if os.path.exists(self.utterances_path):
+            with open(self.utterances_path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._texts[entry["hash"]] = (entry["speaker"], entry["text"])
+
+    def save(self, sessions: List[Session]) -> int:
+        """Store sessions, returning how many new utterances had to be written."""
+        os.makedirs(self.directory, exist_ok=True)
+        new_entries = []
+        records = []
+        for session in sessions:
+            refs = []
+            for utterance in session.utterances:
+                key = utterance_hash(utterance.speaker, utterance.text)
+                if key not in self._texts:
+                    self._texts[key] = (utterance.speaker, utterance.text)
+                    new_entries.append(
+                        {"hash": key, "speaker": utterance.speaker, "text": utterance.text}
+                    )
+                refs.append([utterance.timestamp, key])
+            records.append(
+                {
+                    "session_id": session.session_id,
+                    "company_name": session.company_name,
+                    "owner_name": session.owner_name,
+                    "started_at": session.started_at,
+                    "saved_at": session.saved_at.isoformat(),
+                    "sources": [os.path.basename(path) for path in session.sources],
+                    "utterances": refs,
+                }
+            )
+
+        # Utterances first, so sessions never reference a missing hash
+        if new_entries:
+            with open(self.utterances_path, "a", encoding="utf-8") as f:
+                for entry in new_entries:
+                    f.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+        tmp_path = self.sessions_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+        os.replace(tmp_path, self.sessions_path)
+        return len(new_entries)
+
+    def sessions(self) -> List[dict]:
+        if not os.path.exists(self.sessions_path):
+            return []
+        with open(self.sessions_path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def utterances(self, record: dict) -> List[Utterance]:
+        """Resolve a session record's utterance references."""
+        return [Utterance(timestamp, *self._texts[key]) for timestamp, key in record["utterances"]]
+
+    def render(self, record: dict) -> str:
+        return render_transcript(self.utterances(record))
+
+
+def _directory_size(paths: Iterable[str]) -> int:
+    return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("directory", nargs="?", default="data/transcriptions")
+    parser.add_argument("--out", default="data/compacted")
+    parser.add_argument("--window", type=float, default=600, help="max seconds between saves of one session")
+    parser.add_argument("--dry-run", action="store_true", help="only print how saves would be grouped")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    paths = sorted(glob.glob(os.path.join(args.directory, "*.json")))
+    saves = []
+    for path in paths:
+        try:
+            saves.append(load_saved_transcript(path))
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"skipping {path}: {e}")
+    sessions = merge_saves(saves, datetime.timedelta(seconds=args.window))
+
+    for session in sessions:
+        print(f"{session.session_id}: {len(session.utterances)} utterances from {len(session.sources)} saves")
+    if args.dry_run:
+        return 0
+
+    archive = CompactedArchive(args.out)
+    added = archive.save(sessions)
+    before = _directory_size(paths)
+    after = _directory_size([archive.sessions_path, archive.utterances_path])
+    print(
+        f"{len(saves)} saves -> {len(sessions)} sessions, {added} new utterances stored, "
+        f"{before} -> {after} bytes"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
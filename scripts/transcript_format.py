@@ -0,0 +1,221 @@
+"""Structured transcript files: one JSON row per utterance.
+
+Usage:
+    python scripts/transcript_format.py convert data/transcriptions data/transcripts.jsonl
+    python scripts/transcript_format.py render data/transcripts.jsonl --session <id>
+    python scripts/transcript_format.py convert data/transcriptions data/transcripts.parquet
+
+Rows are `(session_id, seq, ts, speaker, text, duration)`, written as JSONL
+or, when pyarrow is installed, as a Parquet table. Consumers read rows or
+columns directly instead of parsing the rendered `[timestamp] Speaker: text`
+text, which is only produced on demand with `render_rows`.
+"""
+from __future__ import annotations
+
+import argparse
+import datetime
+import glob
+import json
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from transcript_store import Utterance
+
+COLUMNS = ("session_id", "seq", "ts", "speaker", "text", "duration")
+
+
+class TranscriptRow:
+    """One utterance of a session, in file order."""
+
+    __slots__ = COLUMNS
+
+    def __init__(
+        self,
+        session_id: str,
+        seq: int,
+        ts: str,
+        speaker: str,
+        text: str,
+        duration: Optional[float] = None,
+    ):
+        self.session_id = session_id
+        self.seq = seq
+        self.ts = ts
+        self.speaker = speaker
+        self.text = text
+        self.duration = duration
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in COLUMNS}
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, separators=(",", ":"))
+
+    def to_utterance(self) -> Utterance:
+        return Utterance(self.ts, self.speaker, self.text, self.duration)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TranscriptRow":
+        return cls(
+            data["session_id"],
+            data["seq"],
+            data["ts"],
+            data["speaker"],
+            data["text"],
+            data.get("duration"),
+        )
+
+
+def rows_from_utterances(
+    session_id: str, utterances: Iterable[Utterance], start: int = 0
+) -> List[TranscriptRow]:
+    return [
+        TranscriptRow(session_id, seq, u.timestamp, u.speaker, u.text, u.duration)
+        for seq, u in enumerate(utterances, start)
+    ]
+
+
+def write_rows(path: str, rows: Iterable[TranscriptRow], append: bool = False) -> int:
+    """Write rows as JSONL, or as Parquet if `path` ends in .parquet."""
+    if path.endswith(".parquet"):
+        return _write_parquet(path, list(rows))
+    count = 0
+    with open(path, "a" if append else "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(row.to_json() + "\n")
+            count += 1
+    return count
+
+
+def read_rows(
+    paths: str | Sequence[str],
+    session_id: Optional[str] = None,
+    speaker: Optional[str] = None,
+) -> Iterator[TranscriptRow]:
+    """Rows from JSONL or Parquet files, optionally filtered."""
+    for columns in _iter_columns([paths] if isinstance(paths, str) else paths):
+        for values in zip(*(columns[name] for name in COLUMNS)):
+            row = TranscriptRow(*values)
+            if session_id is not None and row.session_id != session_id:
+                continue
+            if speaker is not None and row.speaker != speaker:
+                continue
+            yield row
+
+
+def read_columns(
+    paths: str | Sequence[str], columns: Sequence[str] = COLUMNS
+) -> Dict[str, List[Any]]:
+    """Selected columns of every row, concatenated across files."""
+    result: Dict[str, List[Any]] = {name: [] for name in columns}
+    for file_columns in _iter_columns([paths] if isinstance(paths, str) else paths, columns):
+        for name in columns:
+            result[name].extend(file_columns[name])
+    return result
+
+
+def _iter_columns(
+    paths: Sequence[str], columns: Sequence[str] = COLUMNS
+) -> Iterator[Dict[str, List[Any]]]:
+    for path in paths:
+        if path.endswith(".parquet"):
+            yield _read_parquet(path, columns)
+            continue
+        file_columns: Dict[str, List[Any]] = {name: [] for name in columns}
+        appends = [(name, file_columns[name].append) for name in columns]
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                data = json.loads(line)
+                for name, append in appends:
+                    append(data.get(name))
+        yield file_columns
+
+
+def _write_parquet(path: str, rows: List[TranscriptRow]) -> int:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Parquet transcripts need pyarrow: pip install pyarrow") from e
+
+    table = pa.table({name: [getattr(row, name) for row in rows] for name in COLUMNS})
+    pq.write_table(table, path)
+    return len(rows)
+
+
+def _read_parquet(path: str, columns: Sequence[str]) -> Dict[str, List[Any]]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Parquet transcripts need pyarrow: pip install pyarrow") from e
+
+    return pq.read_table(path, columns=list(columns)).to_pydict()
+
+
+def render_rows(rows: Iterable[TranscriptRow], footer: str = "") -> str:
+    """Human-readable view, in the format of the saved transcript text."""
+    lines: List[str] = []
+    session_id = None
+    last_speaker = None
+    for row in rows:
+        if session_id is None:
+            session_id = row.session_id
+        if last_speaker is not None and last_speaker != row.speaker:
+            lines.append("")
+        lines.append(f"[{row.ts}] {row.speaker}: {row.text}")
+        last_speaker = row.speaker
+
+    header = "CONVERSATION TRANSCRIPT\n=======================\n\n"
+    if session_id is not None:
+        header += f"Room: {session_id}\n\n"
+    body = "\n".join(lines) + "\n" if lines else ""
+    footer = f"\n{footer}" if footer else ""
+    count = sum(1 for line in lines if line)
+    return f"{header}{body}{footer}\nTotal exchanges: {count}\n"
+
+
+def convert_saved_transcripts(directory: str) -> Iterator[TranscriptRow]:
+    """Rows for every saved transcript JSON file, one session per file."""
+    from transcript_compaction import parse_transcript_text
+
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        with open(path, encoding="utf-8") as f:
+            saved = json.load(f)
+        session_id = os.path.splitext(os.path.basename(path))[0]
+        yield from rows_from_utterances(
+            session_id, parse_transcript_text(saved.get("transcript", ""))
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    convert = commands.add_parser("convert", help="convert saved transcript JSON files")
+    convert.add_argument("directory")
+    convert.add_argument("output", help=".jsonl or .parquet")
+
+    render = commands.add_parser("render", help="print the text view of a session")
+    render.add_argument("path")
+    render.add_argument("--session", default=None, help="defaults to every session in the file")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        started = datetime.datetime.now()
+        count = write_rows(args.output, convert_saved_transcripts(args.directory))
+        elapsed = (datetime.datetime.now() - started).total_seconds()
+        print(f"wrote {count} rows to {args.output} in {elapsed:.2f}s")
+        return 0
+
+    sessions: Dict[str, List[TranscriptRow]] = {}
+    for row in read_rows(args.path, session_id=args.session):
+        sessions.setdefault(row.session_id, []).append(row)
+    for rows in sessions.values():
+        print(render_rows(rows))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
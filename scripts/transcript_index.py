@@ -0,0 +1,298 @@
+"""Full-text index over finished interview transcripts.
+
+Usage:
+    python scripts/transcript_index.py update data/transcriptions
+    python scripts/transcript_index.py search "grupos electrógenos" --speaker User
+    python scripts/transcript_index.py search "stock" --company "Energía Global" --since 2025-03-14
+
+Utterances are stored in SQLite with an FTS5 index on their text, so a
+search is an index lookup rather than a scan of every saved file. Matching
+ignores case and accents. Agents add sessions as they finish, and `update`
+picks up saved transcript files, skipping sessions that did not change.
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Iterable, List, Optional
+
+from transcript_compaction import load_saved_transcript, merge_saves
+from transcript_store import Utterance, utc_timestamp
+
+logger = logging.getLogger("transcript-index")
+
+
+@dataclass
+class Match:
+    session_id: str
+    company_name: str
+    seq: int
+    timestamp: str
+    speaker: str
+    text: str
+    snippet: str
+
+
+def utterances_hash(utterances: Iterable[Utterance]) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for utterance in utterances:
+        digest.update(f"{utterance.timestamp}\0{utterance.speaker}\0{utterance.text}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class TranscriptIndex:
+    """SQLite archive of sessions and their utterances, searchable with FTS5.
+
+    The connection is opened on first use and must stay on that thread; the
+    agents only touch the index from the background writer thread.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS sessions (
+                    session_id TEXT PRIMARY KEY,
+                    company_name TEXT NOT NULL,
+                    owner_name TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    indexed_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS utterances (
+                    id INTEGER PRIMARY KEY,
+                    session_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    speaker TEXT NOT NULL,
+                    text TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS utterances_session ON utterances (session_id, seq);
+                CREATE VIRTUAL TABLE IF NOT EXISTS utterances_fts USING fts5(
+                    text, content='utterances', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                );
+                """
+            )
+        return self._conn
+
+    def add_session(
+        self,
+        session_id: str,
+        utterances: List[Utterance],
+        company_name: str = "",
+        owner_name: str = "",
+        source: str = "",
+    ) -> bool:
+        """Index a session, replacing any previous version of it.
+
+        Returns False without touching the index if the session is already
+        indexed with the same utterances.
+        """
+        content_hash = utterances_hash(utterances)
+        row = self.conn.execute(
+            "SELECT content_hash FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is not None and row[0] == content_hash:
+            return False
+
+        with self.conn:
+            if row is not None:
+                self._delete_utterances(session_id)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?, ?)",
+                (session_id, company_name, owner_name, source, content_hash, time.time()),
+            )
+            for seq, utterance in enumerate(utterances):
+                cursor = self.conn.execute(
+                    "INSERT INTO utterances (session_id, seq, timestamp, speaker, text) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (session_id, seq, utc_timestamp(utterance.timestamp), utterance.speaker, utterance.text),
+                )
+                self.conn.execute(
+                    "INSERT INTO utterances_fts (rowid, text) VALUES (?, ?)",
+                    (cursor.lastrowid, utterance.text),
+                )
+        return True
+
+    def remove_session(self, session_id: str) -> None:
+        with self.conn:
+            self._delete_utterances(session_id)
+            self.conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def _delete_utterances(self, session_id: str) -> None:
+        # External content tables need the old text to remove it from the index
+        self.conn.execute(
+            "INSERT INTO utterances_fts (utterances_fts, rowid, text) "
+            "SELECT 'delete', id, text FROM utterances WHERE session_id = ?",
+            (session_id,),
+        )
+        self.conn.execute("DELETE FROM utterances WHERE session_id = ?", (session_id,))
+
+    def update_from_directory(self, directory: str) -> int:
+        """Index saved transcript files, merging repeated saves of one session."""
+        saves = []
+        for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+            try:
+                saves.append(load_saved_transcript(path))
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"skipping {path}: {e}")
+
+        updated = 0
+        for session in merge_saves(saves):
+            if self.add_session(
+                session.session_id,
+                session.utterances,
+                company_name=session.company_name,
+                owner_name=session.owner_name,
+                source=os.path.basename(session.sources[-1]),
+            ):
+                updated += 1
+        return updated
+
+    def search(
+        self,
+        query: str,
+        speaker: Optional[str] = None,
+        company: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        limit: int = 50,
+    ) -> List[Match]:
+        """Utterances matching an FTS5 query, best matches first.
+
+        Plain words are quoted, so user input can't break the query syntax.
+        Timestamps are stored in UTC ("...Z"), and `since` and `until` are
+        compared against them as strings, so pass them in UTC too. A query
+        with no words matches nothing.
+        """
+        match = _fts_query(query)
+        if not match:
+            # FTS5 rejects an empty MATCH expression as a syntax error
+            return []
+        sql = (
+            "SELECT u.session_id, s.company_name, u.seq, u.timestamp, u.speaker, u.text, "
+            "snippet(utterances_fts, 0, '[', ']', '…', 12) "
+            "FROM utterances_fts JOIN utterances u ON u.id = utterances_fts.rowid "
+            "JOIN sessions s ON s.session_id = u.session_id "
+            "WHERE utterances_fts MATCH ?"
+        )
+        params: list = [match]
+        if speaker:
+            sql += " AND u.speaker = ?"
+            params.append(speaker)
+        if company:
+            sql += " AND s.company_name = ?"
+            params.append(company)
+        if since:
+            sql += " AND u.timestamp >= ?"
+            params.append(since)
+        if until:
+            sql += " AND u.timestamp < ?"
+            params.append(until)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+        return [Match(*row) for row in self.conn.execute(sql, params)]
+
+    def session(self, session_id: str) -> List[Utterance]:
+        return [
+            Utterance(*row)
+            for row in self.conn.execute(
+                "SELECT timestamp, speaker, text FROM utterances WHERE session_id = ? ORDER BY seq",
+                (session_id,),
+            )
+        ]
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def _fts_query(query: str) -> str:
+    return " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+
+_index: Optional[TranscriptIndex] = None
+
+
+def get_transcript_index() -> TranscriptIndex:
+    """Process-wide index, stored at TRANSCRIPT_INDEX_DB."""
+    global _index
+    if _index is None:
+        _index = TranscriptIndex(os.environ.get("TRANSCRIPT_INDEX_DB", "transcripts.sqlite3"))
+    return _index
+
+
+def index_finished_session(
+    session_id: str, utterances: List[Utterance], company_name: str = "", owner_name: str = ""
+) -> None:
+    """Queue a finished session for indexing on the background writer thread."""
+    if not utterances:
+        return
+    from background_writer import get_writer
+
+    future = get_writer().submit(
+        get_transcript_index().add_session,
+        session_id,
+        utterances,
+        company_name,
+        owner_name,
+        "live",
+    )
+    future.add_done_callback(
+        lambda f: f.exception() and logger.error(f"Error indexing {session_id}: {f.exception()}")
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=None, help="defaults to TRANSCRIPT_INDEX_DB")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    update = commands.add_parser("update", help="index saved transcript files")
+    update.add_argument("directory", nargs="?", default="data/transcriptions")
+
+    search = commands.add_parser("search", help="search indexed utterances")
+    search.add_argument("query")
+    search.add_argument("--speaker")
+    search.add_argument("--company")
+    search.add_argument("--since", help="ISO date or timestamp, UTC")
+    search.add_argument("--until", help="ISO date or timestamp, UTC")
+    search.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    index = TranscriptIndex(args.db) if args.db else get_transcript_index()
+
+    started = time.perf_counter()
+    if args.command == "update":
+        updated = index.update_from_directory(args.directory)
+        print(f"indexed {updated} new or changed sessions in {time.perf_counter() - started:.2f}s")
+        return 0
+
+    matches = index.search(
+        args.query, args.speaker, args.company, args.since, args.until, args.limit
+    )
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    for match in matches:
+        print(f"{match.session_id} #{match.seq} [{match.timestamp}] {match.speaker}: {match.snippet}")
+    print(f"{len(matches)} matches in {elapsed_ms:.1f}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import datetime
+import logging
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional
+
+if TYPE_CHECKING:
+    from transcript_writer import TranscriptWriter
+
+logger = logging.getLogger("transcript-store")
+
+
+def utc_timestamp(value: Optional[str] = None) -> str:
+    """ISO timestamp in UTC with a "Z" suffix, like the frontend's saved transcripts.
+
+    Without `value` it is the current time. Naive timestamps are taken as
+    local time; strings that don't parse are returned unchanged.
+    """
+    if value is None:
+        moment = datetime.datetime.now(datetime.timezone.utc)
+    else:
+        try:
+            moment = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return value
+        moment = moment.astimezone(datetime.timezone.utc)
+    return moment.isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+class Utterance:
+    """A single recorded speech event. Slotted so long sessions stay compact."""
+
+    __slots__ = ("timestamp", "speaker", "text", "duration")
+
+    def __init__(self, timestamp: str, speaker: str, text: str, duration: Optional[float] = None):
+        self.timestamp = timestamp
+        self.speaker = speaker
+        self.text = text
+        # Seconds of speech, when the source reports it
+        self.duration = duration
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "timestamp": self.timestamp,
+            "speaker": self.speaker,
+            "text": self.text,
+            "duration": self.duration,
+        }
+
+
+class TranscriptStore:
+    """Per-session transcript buffers, keyed by room/session id.
+
+    Each job opens its session when the room connects and releases it on
+    disconnect, so a long-running worker only holds the rooms it is serving.
+    A session can have a TranscriptWriter attached, which receives every
+    utterance as it is recorded. With the thread executor the rooms of a
+    worker share one store, so its dicts are only touched under a lock.
+    """
+
+    def __init__(self):
+        self._sessions: Dict[str, List[Utterance]] = {}
+        self._writers: Dict[str, TranscriptWriter] = {}
+        self._lock = threading.Lock()
+
+    def open(self, session_id: str, writer: Optional[TranscriptWriter] = None) -> None:
+        with self._lock:
+            self._sessions.setdefault(session_id, [])
+            if writer is not None:
+                self._writers[session_id] = writer
+
+    def append(
+        self, session_id: str, speaker: str, text: str, duration: Optional[float] = None
+    ) -> Optional[Utterance]:
+        utterance = Utterance(utc_timestamp(), speaker, text, duration)
+        with self._lock:
+            entries = self._sessions.get(session_id)
+            if entries is None:
+                logger.warning(f"Dropping speech for unknown session: {session_id}")
+                return None
+            entries.append(utterance)
+            writer = self._writers.get(session_id)
+
+        if writer is not None:
+            writer.write(utterance)
+        return utterance
+
+    def get(self, session_id: str) -> List[Utterance]:
+        with self._lock:
+            return list(self._sessions.get(session_id, ()))
+
+    def writer(self, session_id: str) -> Optional[TranscriptWriter]:
+        with self._lock:
+            return self._writers.get(session_id)
+
+    def release(self, session_id: str) -> List[Utterance]:
+        """Drop the session from the store and return whatever it held."""
+        with self._lock:
+            self._writers.pop(session_id, None)
+            return self._sessions.pop(session_id, [])
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._sessions
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            return iter(list(self._sessions))
+
+
+def render_transcript(entries: List[Utterance]) -> str:
+    """Plain-text transcript, one `[timestamp] Speaker: text` line per utterance."""
+    return "\n".join(
+        f"[{entry.timestamp}] {entry.speaker}: {entry.text}" for entry in entries
+    )
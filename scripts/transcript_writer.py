@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import datetime
+import logging
+import os
+import re
+from concurrent.futures import Future
+from typing import Literal, Optional
+
+from background_writer import BackgroundWriter, get_writer
+from transcript_format import TranscriptRow, read_rows, render_rows
+from transcript_store import Utterance
+
+logger = logging.getLogger("transcript-writer")
+
+
+TranscriptFormat = Literal["text", "jsonl"]
+
+
+def transcript_filename(session_id: str, format: TranscriptFormat = "text") -> str:
+    """Default file name for a session transcript."""
+    safe_id = re.sub(r"[^a-zA-Z0-9]", "-", session_id)
+    extension = "jsonl" if format == "jsonl" else "txt"
+    return f"conversation-transcript-{safe_id}-{int(datetime.datetime.now().timestamp()*1000)}.{extension}"
+
+
+class TranscriptWriter:
+    """Append-only transcript file for one session.
+
+    Every utterance is queued on the shared BackgroundWriter as soon as it is
+    recorded, so a crash loses at most the last batch. Closing only appends a
+    footer.
+
+    With `format="jsonl"` each utterance is written as a structured row (see
+    transcript_format) and closing also writes the rendered text view next to
+    it, with a .txt extension.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        session_id: str,
+        writer: Optional[BackgroundWriter] = None,
+        format: TranscriptFormat = "text",
+    ):
+        self.path = path
+        self.session_id = session_id
+        self.format = format
+        self.exchanges = 0
+        self.closed = False
+        self._writer = writer or get_writer()
+        self._last_speaker: Optional[str] = None
+
+    def write(self, utterance: Utterance) -> Future:
+        if self.closed:
+            logger.warning(f"Transcript for {self.session_id} already closed, dropping speech")
+            done: Future = Future()
+            done.set_result(None)
+            return done
+
+        if self.format == "jsonl":
+            row = TranscriptRow(
+                self.session_id,
+                self.exchanges,
+                utterance.timestamp,
+                utterance.speaker,
+                utterance.text,
+                utterance.duration,
+            )
+            self.exchanges += 1
+            return self._writer.append(self.path, row.to_json() + "\n")
+
+        # Add a blank line between exchanges for readability
+        line = f"[{utterance.timestamp}] {utterance.speaker}: {utterance.text}\n"
+        if self._last_speaker is not None and self._last_speaker != utterance.speaker:
+            line = "\n" + line
+        if self.exchanges == 0:
+            line = self._header() + line
+        self._last_speaker = utterance.speaker
+        self.exchanges += 1
+        return self._writer.append(self.path, line)
+
+    def close(self, footer: str = "", rename_to: Optional[str] = None) -> Future:
+        """Write the footer, close the file and optionally move it to `rename_to`."""
+        if self.closed:
+            done: Future = Future()
+            done.set_result(self.path)
+            return done
+
+        self.closed = True
+        if self.format == "jsonl":
+            if self.exchanges == 0:
+                self._writer.append(self.path, "")
+            self._writer.close(self.path)
+            return self._writer.submit(self._finish_structured, footer, rename_to)
+
+        footer = f"\n{footer}" if footer else ""
+        footer += f"\nTotal exchanges: {self.exchanges}\n"
+        if self.exchanges == 0:
+            footer = self._header() + footer
+        self._writer.append(self.path, footer)
+        self._writer.close(self.path)
+        return self._writer.submit(self._moved, rename_to)
+
+    def _header(self) -> str:
+        header = "CONVERSATION TRANSCRIPT\n"
+        header += "=======================\n\n"
+        header += f"Date: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+        header += f"Room: {self.session_id}\n\n"
+        return header
+
+    def _moved(self, rename_to: Optional[str]) -> str:
+        if rename_to:
+            os.replace(self.path, rename_to)
+            self.path = rename_to
+        return self.path
+
+    def _finish_structured(self, footer: str, rename_to: Optional[str]) -> str:
+        path = self._moved(rename_to)
+        view = os.path.splitext(path)[0] + ".txt"
+        if view == path:
+            view = path + ".txt"
+        with open(view, "w", encoding="utf-8") as f:
+            f.write(render_rows(read_rows(path), footer=footer))
+        return path
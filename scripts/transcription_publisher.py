@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from livekit import rtc
+
+logger = logging.getLogger("transcription-publisher")
+
+
+@dataclass
+class SegmentUpdate:
+    participant_identity: str
+    track_sid: str
+    segment_id: str
+    text: str
+    is_final: bool
+
+
+class TranscriptionPublisher:
+    """Per-room publisher that coalesces transcription segment updates.
+
+    Updates are keyed by segment id and only the latest text for each segment
+    is published, so a "…" placeholder that is cleared before it goes out is
+    never sent at all. Pending updates are flushed in batches, one
+    `publish_transcription` call per participant track, and a new batch only
+    starts once the previous one finished, so the last write always wins.
+    """
+
+    def __init__(self, room: rtc.Room, max_in_flight: int = 2):
+        self._room = room
+        self._pending: OrderedDict[str, SegmentUpdate] = OrderedDict()
+        self._wakeup = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+        self.updates = 0
+        self.coalesced = 0
+        self.publishes = 0
+
+    def update(
+        self,
+        participant_identity: str,
+        track_sid: str,
+        segment_id: str,
+        text: str,
+        is_final: bool = True,
+    ) -> None:
+        if self._closed:
+            return
+
+        self.updates += 1
+        if segment_id in self._pending:
+            self.coalesced += 1
+        # Replacing an existing key keeps the segment's original position
+        self._pending[segment_id] = SegmentUpdate(
+            participant_identity, track_sid, segment_id, text, is_final
+        )
+        self._wakeup.set()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def aclose(self) -> None:
+        """Publish whatever is still pending and stop the publisher."""
+        self._closed = True
+        if self._task is None:
+            return
+        self._wakeup.set()
+        await self._task
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            batch, self._pending = self._pending, OrderedDict()
+            if batch:
+                await self._flush(list(batch.values()))
+
+            if self._closed and not self._pending:
+                return
+
+    async def _flush(self, updates: List[SegmentUpdate]) -> None:
+        groups: Dict[Tuple[str, str], List[SegmentUpdate]] = {}
+        for update in updates:
+            groups.setdefault((update.participant_identity, update.track_sid), []).append(update)
+
+        await asyncio.gather(
+            *(self._publish(identity, track_sid, segments)
+              for (identity, track_sid), segments in groups.items())
+        )
+
+    async def _publish(
+        self, participant_identity: str, track_sid: str, updates: List[SegmentUpdate]
+    ) -> None:
+        transcription = rtc.Transcription(
+            participant_identity=participant_identity,
+            track_sid=track_sid,
+            segments=[
+                rtc.TranscriptionSegment(
+                    id=update.segment_id,
+                    text=update.text,
+                    start_time=0,
+                    end_time=0,
+                    language="en",
+                    final=update.is_final,
+                )
+                for update in updates
+            ],
+        )
+        async with self._semaphore:
+            try:
+                await self._room.local_participant.publish_transcription(transcription)
+                self.publishes += 1
+            except Exception as e:
+                logger.error(f"Error publishing transcription: {e}")
@@ -0,0 +1,358 @@
+from __future__ import annotations
+
+import atexit
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from metrics import HistogramSet
+
+logger = logging.getLogger("turn-latency")
+
+# Turn stages, measured from the end of the user's speech unless noted
+STAGES = (
+    "turn.transcription",  # speech stopped -> transcription completed
+    "turn.response_start",  # speech stopped -> response created
+    "turn.first_audio",  # speech stopped -> agent starts speaking
+    "turn.response_done",  # speech stopped -> response done
+    "response.first_audio",  # response created -> agent starts speaking
+    "response.total",  # response created -> response done
+    "session.first_audio",  # participant joined -> agent first starts speaking
+)
+
+
+class LatencyRegistry:
+    """Latency histograms for the whole worker and for each room.
+
+    Every observation goes to the worker-wide histogram of its stage and to
+    the room's own set, so p99 regressions can be traced to specific rooms.
+    Only the `max_rooms` most recently active rooms are kept. Worker-wide
+    event counts (e.g. "prewarm.rejected") are kept next to the histograms.
+    """
+
+    def __init__(self, max_rooms: int = 256):
+        self.max_rooms = max_rooms
+        self.stages = HistogramSet()
+        self.counters: Dict[str, int] = {}
+        self._rooms: OrderedDict[str, HistogramSet] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, room: Optional[str], stage: str, value_ms: float) -> None:
+        self.stages.observe(stage, value_ms)
+        if room:
+            self.room(room).observe(stage, value_ms)
+
+    def room(self, name: str) -> HistogramSet:
+        with self._lock:
+            histograms = self._rooms.get(name)
+            if histograms is None:
+                histograms = self._rooms[name] = HistogramSet()
+                while len(self._rooms) > self.max_rooms:
+                    self._rooms.popitem(last=False)
+            else:
+                self._rooms.move_to_end(name)
+            return histograms
+
+    def rooms(self) -> List[str]:
+        with self._lock:
+            return list(self._rooms)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Raw histogram counts, for `merge` in another process."""
+        with self._lock:
+            rooms = list(self._rooms.items())
+            counters = dict(self.counters)
+        return {
+            "stages": self.stages.to_dict(),
+            "rooms": {name: histograms.to_dict() for name, histograms in rooms},
+            "counters": counters,
+        }
+
+    def merge(self, data: Dict[str, Any]) -> None:
+        self.stages.merge(data["stages"])
+        for name, count in data.get("counters", {}).items():
+            self.increment(name, count)
+        for name, histograms in data["rooms"].items():
+            self.room(name).merge(histograms)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            rooms = list(self._rooms.items())
+            counters = dict(self.counters)
+        return {
+            "stages": self.stages.summary(),
+            "rooms": {name: histograms.summary() for name, histograms in rooms},
+            "counters": counters,
+        }
+
+    def render_prometheus(self) -> str:
+        """Prometheus text format: stage histograms plus per-room percentiles."""
+        lines = [
+            "# HELP agent_latency_ms Latency of realtime turn stages and agent RPCs.",
+            "# TYPE agent_latency_ms histogram",
+        ]
+        for stage, histogram in self.stages.items():
+            buckets, count, sum_ms = histogram.cumulative()
+            for bound, seen in buckets:
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f'agent_latency_ms_bucket{{stage="{stage}",le="{le}"}} {seen}')
+            lines.append(f'agent_latency_ms_sum{{stage="{stage}"}} {sum_ms:.3f}')
+            lines.append(f'agent_latency_ms_count{{stage="{stage}"}} {count}')
+
+        lines.append("# HELP agent_events_total Worker events, such as discarded prewarmed sessions.")
+        lines.append("# TYPE agent_events_total counter")
+        with self._lock:
+            counters = sorted(self.counters.items())
+        for name, count in counters:
+            lines.append(f'agent_events_total{{event="{name}"}} {count}')
+
+        lines.append("# HELP agent_room_latency_ms Upper bound of the latency percentile bucket per room.")
+        lines.append("# TYPE agent_room_latency_ms gauge")
+        with self._lock:
+            rooms = list(self._rooms.items())
+        for name, histograms in rooms:
+            room = name.replace("\\", "\\\\").replace('"', '\\"')
+            for stage, histogram in histograms.items():
+                for quantile in (50, 90, 99):
+                    value = histogram.percentile(quantile)
+                    lines.append(
+                        f'agent_room_latency_ms{{room="{room}",stage="{stage}",quantile="0.{quantile}"}} {value:g}'
+                    )
+        return "\n".join(lines) + "\n"
+
+
+_registry: Optional[LatencyRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_latency_registry() -> LatencyRegistry:
+    global _registry
+    if _registry is None:
+        # Rooms on several threads may get here at once; they must share one registry
+        with _registry_lock:
+            if _registry is None:
+                _registry = LatencyRegistry(max_rooms=int(os.environ.get("AGENT_METRICS_MAX_ROOMS", 256)))
+    return _registry
+
+
+def track_turns(room: str, session: Any, assistant: Any) -> None:
+    """Record the latency breakdown of every turn of a realtime session.
+
+    Hooks the session's speech and response events and the agent's
+    `agent_started_speaking`. Each handler only takes a timestamp, and
+    histograms are updated when a stage completes.
+    """
+    registry = get_latency_registry()
+    turn: Dict[str, float] = {}
+    response: Dict[str, float] = {}
+
+    def observe(stage: str, start: Optional[float], now: float) -> None:
+        if start is not None:
+            registry.observe(room, stage, (now - start) * 1000)
+
+    def unanswered() -> Optional[float]:
+        # Later responses (e.g. after a function call) don't count as the turn's answer
+        return None if "answered" in turn else turn.get("stopped")
+
+    @session.on("input_speech_stopped")
+    def on_input_speech_stopped(*_):
+        turn.clear()
+        turn["stopped"] = time.perf_counter()
+
+    @session.on("input_speech_transcription_completed")
+    def on_transcription_completed(*_):
+        observe("turn.transcription", turn.get("stopped"), time.perf_counter())
+
+    @session.on("response_created")
+    def on_response_created(*_):
+        now = time.perf_counter()
+        response.clear()
+        response["created"] = now
+        observe("turn.response_start", unanswered(), now)
+
+    @assistant.on("agent_started_speaking")
+    def on_agent_started_speaking(*_):
+        if "first_audio" in response:
+            return
+        now = response["first_audio"] = time.perf_counter()
+        observe("response.first_audio", response.get("created"), now)
+        observe("turn.first_audio", unanswered(), now)
+
+    @session.on("response_done")
+    def on_response_done(*_):
+        now = time.perf_counter()
+        observe("response.total", response.get("created"), now)
+        stopped = unanswered()
+        turn["answered"] = now
+        observe("turn.response_done", stopped, now)
+        if stopped is not None and logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f"turn in room {room}: "
+                + ", ".join(
+                    f"{stage} {(response[key] - stopped) * 1000:.0f}ms"
+                    for stage, key in (("response", "created"), ("first audio", "first_audio"))
+                    if key in response
+                )
+                + f", done {(now - stopped) * 1000:.0f}ms"
+            )
+
+
+_export_lock = threading.Lock()
+_export_started = False
+# Histograms of job processes that have exited, kept by the worker
+_retired: Optional[LatencyRegistry] = None
+
+REPORT_SUFFIX = ".metrics.json"
+
+
+def reports_metrics() -> bool:
+    """True in a job process of the process executor, which reports to the worker."""
+    return os.environ.get("AGENT_EXECUTOR", "thread") != "thread" and bool(os.environ.get("AGENT_LOAD_DIR"))
+
+
+def start_metrics_export(collect_from: Optional[str] = None) -> None:
+    """Start the exporters configured in the environment, once per process.
+
+    AGENT_METRICS_PORT serves /metrics (Prometheus text) and /metrics.json on
+    AGENT_METRICS_HOST (default 127.0.0.1). AGENT_METRICS_DUMP writes the
+    JSON summary to that path every AGENT_METRICS_DUMP_INTERVAL seconds
+    (default 60).
+
+    With the process executor, each job process instead writes its histograms
+    to "<pid>.metrics.json" in AGENT_LOAD_DIR every
+    AGENT_METRICS_REPORT_INTERVAL seconds (default 5) and when it exits, and
+    the worker, started with `collect_from` set to that directory, serves and
+    dumps them merged.
+    """
+    global _export_started
+    with _export_lock:
+        if _export_started:
+            return
+        _export_started = True
+
+    if collect_from is None and reports_metrics():
+        path = os.path.join(os.environ["AGENT_LOAD_DIR"], f"{os.getpid()}{REPORT_SUFFIX}")
+        interval = float(os.environ.get("AGENT_METRICS_REPORT_INTERVAL", 5))
+        atexit.register(_write_report, path)
+        threading.Thread(
+            target=_report_periodically, args=(path, interval), name="metrics-report", daemon=True
+        ).start()
+        return
+
+    def source() -> LatencyRegistry:
+        return collect_registry(collect_from) if collect_from else get_latency_registry()
+
+    port = os.environ.get("AGENT_METRICS_PORT")
+    if port:
+        host = os.environ.get("AGENT_METRICS_HOST", "127.0.0.1")
+        try:
+            _serve_metrics(host, int(port), source)
+            logger.info(f"serving latency metrics on {host}:{port}")
+        except (OSError, ValueError) as e:
+            # A missing endpoint must not fail the room
+            logger.warning(f"not serving latency metrics on {host}:{port}: {e}")
+
+    dump_path = os.environ.get("AGENT_METRICS_DUMP")
+    if dump_path:
+        interval = float(os.environ.get("AGENT_METRICS_DUMP_INTERVAL", 60))
+        threading.Thread(
+            target=_dump_periodically, args=(dump_path, interval, source), name="metrics-dump", daemon=True
+        ).start()
+
+
+def collect_registry(directory: str) -> LatencyRegistry:
+    """This process's histograms merged with the reports of the job processes in `directory`.
+
+    Reports of processes that have exited are folded into a retired registry
+    and removed, so the worker's counts never go down.
+    """
+    from worker_load import pid_alive
+
+    global _retired
+    merged = LatencyRegistry(max_rooms=get_latency_registry().max_rooms)
+    merged.merge(get_latency_registry().to_dict())
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        names = []
+    with _export_lock:
+        if _retired is None:
+            _retired = LatencyRegistry(max_rooms=merged.max_rooms)
+        for name in names:
+            pid = name[: -len(REPORT_SUFFIX)]
+            if not name.endswith(REPORT_SUFFIX) or not pid.isdigit():
+                continue
+            path = os.path.join(directory, name)
+            try:
+                with open(path) as f:
+                    report = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if pid_alive(int(pid)):
+                merged.merge(report)
+            else:
+                _retired.merge(report)
+                with contextlib.suppress(OSError):
+                    os.unlink(path)
+        merged.merge(_retired.to_dict())
+    return merged
+
+
+def _write_report(path: str) -> None:
+    try:
+        with open(path + ".tmp", "w") as f:
+            json.dump(get_latency_registry().to_dict(), f)
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        logger.warning(f"can't report latency metrics to {path}: {e}")
+
+
+def _report_periodically(path: str, interval: float) -> None:
+    while True:
+        time.sleep(interval)
+        _write_report(path)
+
+
+def _serve_metrics(host: str, port: int, source: Callable[[], LatencyRegistry]) -> None:
+    # http.server is only imported when the endpoint is enabled
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body = source().render_prometheus().encode("utf-8")
+                content_type = "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body = json.dumps(source().summary()).encode("utf-8")
+                content_type = "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+
+
+def _dump_periodically(path: str, interval: float, source: Callable[[], LatencyRegistry]) -> None:
+    from background_writer import get_writer
+
+    while True:
+        time.sleep(interval)
+        get_writer().write(path, json.dumps(source().summary(), indent=2))
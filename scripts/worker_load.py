@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import asyncio
+import atexit
+import contextlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, Iterator, Optional
+
+if TYPE_CHECKING:
+    from livekit.agents import JobContext, WorkerOptions
+
+logger = logging.getLogger("worker-load")
+
+
+class WorkerLoad:
+    """Load reporting for a worker that hosts several rooms per process.
+
+    Tracks active sessions, pending RPCs and event-loop lag of every job loop
+    and reports the most saturated of them as the worker load, so the LiveKit
+    dispatcher stops sending jobs before a worker falls behind.
+
+    With `report_dir` set (process executor), each job process writes its
+    counters to "<pid>.json" there on every lag probe, and the worker adds
+    them up in `load`. A process whose file stops being refreshed counts the
+    time since as loop lag, since its event loop is not getting to run.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 8,
+        max_pending_rpcs: int = 32,
+        max_loop_lag: float = 0.1,
+        lag_interval: float = 0.5,
+        report_dir: Optional[str] = None,
+    ):
+        self.max_sessions = max_sessions
+        self.max_pending_rpcs = max_pending_rpcs
+        self.max_loop_lag = max_loop_lag
+        self.lag_interval = lag_interval
+        self.report_dir = report_dir
+        self.active_sessions = 0
+        self.pending_rpcs = 0
+        self._loop_lag: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def loop_lag(self) -> float:
+        with self._lock:
+            return max(self._loop_lag.values(), default=0.0)
+
+    def track_session(self, ctx: JobContext) -> None:
+        """Count the job as active until it shuts down and watch its event loop."""
+        with self._lock:
+            self.active_sessions += 1
+        probe = asyncio.create_task(self._probe_lag())
+
+        async def on_shutdown():
+            probe.cancel()
+            with self._lock:
+                self.active_sessions -= 1
+                self._loop_lag.pop(id(probe), None)
+            if self.report_dir and not self.active_sessions:
+                with contextlib.suppress(OSError):
+                    os.unlink(self._report_path(os.getpid()))
+
+        ctx.add_shutdown_callback(on_shutdown)
+
+    @contextlib.contextmanager
+    def rpc(self) -> Iterator[None]:
+        """Count an outgoing RPC as pending while the block runs."""
+        with self._lock:
+            self.pending_rpcs += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.pending_rpcs -= 1
+
+    def load(self, worker: Optional[Any] = None) -> float:
+        """Worker load in [0, 1], used as `WorkerOptions.load_fnc`."""
+        sessions, pending_rpcs, loop_lag = self.active_sessions, self.pending_rpcs, self.loop_lag
+        if self.report_dir:
+            reported = self._read_reports()
+            sessions = max(sessions, reported["active_sessions"])
+            pending_rpcs = max(pending_rpcs, reported["pending_rpcs"])
+            loop_lag = max(loop_lag, reported["loop_lag"])
+        if worker is not None and hasattr(worker, "active_jobs"):
+            # The worker knows every job, including ones still starting up
+            sessions = max(sessions, len(worker.active_jobs))
+
+        load = max(
+            sessions / self.max_sessions,
+            pending_rpcs / self.max_pending_rpcs,
+            loop_lag / self.max_loop_lag,
+        )
+        return min(load, 1.0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active_sessions": self.active_sessions,
+            "pending_rpcs": self.pending_rpcs,
+            "loop_lag_ms": self.loop_lag * 1000,
+            "load": self.load(),
+        }
+
+    async def _probe_lag(self) -> None:
+        key = id(asyncio.current_task())
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.lag_interval)
+            lag = max(time.perf_counter() - started - self.lag_interval, 0.0)
+            with self._lock:
+                self._loop_lag[key] = lag
+            if self.report_dir:
+                self._write_report()
+
+    def _report_path(self, pid: int) -> str:
+        return os.path.join(self.report_dir, f"{pid}.json")
+
+    def _write_report(self) -> None:
+        path = self._report_path(os.getpid())
+        report = {
+            "active_sessions": self.active_sessions,
+            "pending_rpcs": self.pending_rpcs,
+            "loop_lag": self.loop_lag,
+        }
+        try:
+            with open(path + ".tmp", "w") as f:
+                json.dump(report, f)
+            # Replaced in one step so the worker never reads half a file
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            logger.warning(f"can't report load to {self.report_dir}: {e}")
+
+    def _read_reports(self) -> Dict[str, Any]:
+        """Counters of the job processes, summed, with the worst loop lag."""
+        totals: Dict[str, Any] = {"active_sessions": 0, "pending_rpcs": 0, "loop_lag": 0.0}
+        now = time.time()
+        try:
+            names = os.listdir(self.report_dir)
+        except OSError:
+            return totals
+        for name in names:
+            pid, _, suffix = name.partition(".")
+            if suffix != "json" or not pid.isdigit():
+                continue
+            path = self._report_path(int(pid))
+            try:
+                with open(path) as f:
+                    report = json.load(f)
+                age = now - os.stat(path).st_mtime
+            except (OSError, ValueError):
+                continue
+            if not pid_alive(int(pid)):
+                with contextlib.suppress(OSError):
+                    os.unlink(path)
+                continue
+            totals["active_sessions"] += report["active_sessions"]
+            totals["pending_rpcs"] += report["pending_rpcs"]
+            totals["loop_lag"] = max(totals["loop_lag"], report["loop_lag"], age - self.lag_interval)
+        return totals
+
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+_worker_load: Optional[WorkerLoad] = None
+
+
+def get_worker_load() -> WorkerLoad:
+    """Process-wide load tracker shared by every room the worker hosts."""
+    global _worker_load
+    if _worker_load is None:
+        _worker_load = WorkerLoad(
+            max_sessions=int(os.environ.get("AGENT_MAX_SESSIONS", 8)),
+            max_pending_rpcs=int(os.environ.get("AGENT_MAX_PENDING_RPCS", 32)),
+            max_loop_lag=float(os.environ.get("AGENT_MAX_LOOP_LAG_MS", 100)) / 1000,
+            report_dir=os.environ.get("AGENT_LOAD_DIR") or None,
+        )
+    return _worker_load
+
+
+def worker_options(**kwargs: Any) -> WorkerOptions:
+    """WorkerOptions for running several rooms per process, configured from the environment.
+
+    AGENT_EXECUTOR picks "thread" (all rooms share the process) or "process"
+    (one subprocess per room), AGENT_NUM_IDLE_PROCESSES sizes the pool of
+    pre-started job processes and AGENT_LOAD_THRESHOLD is the load above which
+    the dispatcher stops assigning jobs to this worker. With the process
+    executor, job processes report their load and latency metrics through
+    files in AGENT_LOAD_DIR, a temporary directory unless set.
+    """
+    from livekit.agents import JobExecutorType, WorkerOptions, WorkerType
+
+    executor = os.environ.get("AGENT_EXECUTOR", "thread")
+    if executor != "thread" and not os.environ.get("AGENT_LOAD_DIR"):
+        # Set before the job processes start so they inherit it
+        report_dir = tempfile.mkdtemp(prefix="agent-load-")
+        atexit.register(shutil.rmtree, report_dir, ignore_errors=True)
+        os.environ["AGENT_LOAD_DIR"] = report_dir
+    worker_load = get_worker_load()
+    if executor != "thread":
+        worker_load.report_dir = os.environ["AGENT_LOAD_DIR"]
+        # Job processes report their latency histograms; the worker serves them combined
+        from turn_latency import start_metrics_export
+
+        start_metrics_export(collect_from=worker_load.report_dir)
+    options: Dict[str, Any] = dict(
+        worker_type=WorkerType.ROOM,
+        load_fnc=worker_load.load,
+        load_threshold=float(os.environ.get("AGENT_LOAD_THRESHOLD", 0.75)),
+        job_executor_type=JobExecutorType.THREAD
+        if executor == "thread"
+        else JobExecutorType.PROCESS,
+        num_idle_processes=int(
+            os.environ.get("AGENT_NUM_IDLE_PROCESSES", 1 if executor == "thread" else 3)
+        ),
+    )
+    options.update(kwargs)
+    logger.info(
+        f"worker options: executor={executor}, max_sessions={worker_load.max_sessions}, "
+        f"load_threshold={options['load_threshold']}, num_idle_processes={options['num_idle_processes']}"
+    )
+    return WorkerOptions(**options)
@@ -1,66 +1,50 @@
+import asyncio
 import json
-from langgraph_sdk import get_client
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts"))
+
+from designer_client import DesignerClient, DesignRequest
 
 # Replace this with the URL of your own deployed graph
 URL = "http://localhost:8123"
-client = get_client(url=URL)
 
-# Search all hosted graphs
-assistants = await client.assistants.search()
 
-thread = await client.threads.create()
-print(thread['thread_id'])
-input_dict = {"messages": [
-      {
-        "content": "the whole conversation transcript here with speaker and message",
-        "additional_kwargs": {},
-        "response_metadata": {},
-        "type": "human",
-        "name": None,
-        "id": "5cf87a75-3f74-44eb-964d-b3851a5d08ed",
-        "example": False
-      }
-    ]
-    }
+async def main(transcript_path=None):
+    # Saved interviews in data/transcriptions have companyName, ownerName and transcript
+    if transcript_path:
+        with open(transcript_path, encoding="utf-8") as f:
+            saved = json.load(f)
+        request = DesignRequest(saved["companyName"], saved["ownerName"], saved["transcript"])
+    else:
+        request = DesignRequest(
+            "Empresa de Prueba",
+            "Cliente de Prueba",
+            "the whole conversation transcript here with speaker and message",
+        )
 
-async for chunk in client.runs.stream(
-    thread["thread_id"],
-    assistant_id="designer_agent",
-    input=input_dict,
-    stream_mode="updates",):
-    #    continue
-    
-    print(f"Receiving new event of type: {chunk.event}...")
-    print(json.dumps(chunk.data, indent=4))
-    print("\n\n")
+    client = DesignerClient(url=URL, debug=True)
+    erp_design = None
+    async for update in client.stream_design(request):
+        if isinstance(update, str):
+            print(update)
+            continue
+        # Print the design as it is assembled, one batch of new items at a time
+        for key, items in update.added.items():
+            print(f"{update.node}: new {key}: {', '.join(item['name'] for item in items)}")
+        erp_design = update.design
 
-await client.threads.update_state(
-    thread['thread_id'], 
-    {"is_finished": True}, 
-    as_node="interview_user"
-    )
+    print(json.dumps(erp_design, indent=4, ensure_ascii=False))
 
-async for chunk in client.runs.stream(
-    #thread_id=current_state['checkpoint']['thread_id'],
-    #checkpoint_id=current_state['checkpoint']['checkpoint_id'],
-    thread_id=thread['thread_id'],
-    assistant_id="designer_agent",
-    input=None,#{"human_confirmation_message": "yes"},
-    stream_mode="updates",):
-    #    continue
-    
-    print(f"Receiving new event of type: {chunk.event}...")
-    print(json.dumps(chunk.data, indent=4))
-    print("\n\n")
 
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else None))
 
 
-current_state = await client.threads.get_state(thread['thread_id'])
-#current_state.keys()
-#dict_keys(['values', 'next', 'tasks', 'metadata', 'created_at', 'checkpoint', 'parent_checkpoint', 'checkpoint_id', 'parent_checkpoint_id'])
-#current_state['values'].keys()
-#dict_keys(['messages', 'is_finished', 'erp_design'])
-current_state['values']['erp_design']
+# result.erp_design
 """{'modules': [{'name': 'Inventory Management',
    'utility_description': 'Manage and track inventory levels, orders, sales, and deliveries.',
    'usage_description': 'Used to maintain optimal inventory levels, track stock movements, and manage reordering processes.',